@@ -5,69 +5,194 @@
 """
 
 import os
+import random
+import threading
 import time
 import requests
 import json
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
-try:
-    import redis
-    REDIS_AVAILABLE = True
-except ImportError:
-    REDIS_AVAILABLE = False
+import http_session
+from redis_client import REDIS_AVAILABLE, get_redis
+from redis_lock import DistributedLock, LockTimeout
+from token_cache import TieredTokenCache
+
+if not REDIS_AVAILABLE:
     print("警告: Redis不可用，将使用内存缓存")
 
+# 后台提前刷新：在有效期的该比例处续期，并叠加随机抖动，避免多个进程同时刷新
+TOKEN_REFRESH_AHEAD = os.getenv("TOKEN_REFRESH_AHEAD", "0") == "1"
+TOKEN_REFRESH_FRACTION = float(os.getenv("TOKEN_REFRESH_FRACTION", "0.8"))
+TOKEN_REFRESH_JITTER = float(os.getenv("TOKEN_REFRESH_JITTER", "0.1"))
+# 刷新失败或拿到的令牌未续期时的重试间隔（秒）
+TOKEN_REFRESH_RETRY = float(os.getenv("TOKEN_REFRESH_RETRY", "30"))
+# 两次后台刷新之间的最小间隔（秒）
+TOKEN_REFRESH_MIN_INTERVAL = float(os.getenv("TOKEN_REFRESH_MIN_INTERVAL", "60"))
+# 剩余有效期超过该时长时，接口返回同一个令牌而不是签发新令牌（秒）
+TOKEN_REISSUE_WINDOW = 1800
+
+# 令牌类型 -> (接口地址, 响应中的令牌字段)
+TOKEN_ENDPOINTS = {
+    "app": ("https://open.feishu.cn/open-apis/auth/v3/app_access_token", "app_access_token"),
+    "tenant": ("https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal", "tenant_access_token"),
+}
+DEFAULT_TOKEN_TTL = 7200
+
 
 class FeishuAppTokenManager:
-    """飞书App Access Token管理器"""
+    """飞书App Access Token管理器
 
-    def __init__(self, app_id: str, app_secret: str, redis_host: str = "localhost", redis_port: int = 6379):
+    开启提前刷新（refresh_ahead 或 TOKEN_REFRESH_AHEAD=1）后，后台线程在有效期的
+    TOKEN_REFRESH_FRACTION 处续期 app/tenant 令牌，调用方始终直接拿到内存中的令牌
+    """
+
+    def __init__(self, app_id: str, app_secret: str, redis_host: str = "localhost", redis_port: int = 6379,
+                 refresh_ahead: Optional[bool] = None):
         self.app_id = app_id
         self.app_secret = app_secret
         self.buffer_time = 300  # 提前5分钟刷新
 
-        # 初始化Redis客户端（如果可用）
-        self.redis_client = None
-        if REDIS_AVAILABLE:
-            try:
-                self.redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
-                # 测试连接
-                self.redis_client.ping()
-                print(f"✅ Redis连接成功 ({redis_host}:{redis_port})")
-            except Exception as e:
-                print(f"⚠️  Redis连接失败，使用内存缓存: {e}")
-                self.redis_client = None
+        # 初始化Redis客户端（如果可用），与限速器等共用进程级连接池
+        self.redis_client = get_redis(redis_host, redis_port)
+
+        # 分层缓存：进程内 -> Redis -> 加密文件（以 APP_SECRET 派生密钥）
+        self.cache = TieredTokenCache(self.redis_client, secret=app_secret)
+
+        # 提前刷新维护的热令牌: 类型 -> (token, 过期时间, 计划刷新时间)
+        self._hot: Dict[str, Tuple[str, float, float]] = {}
+        self._hot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        if refresh_ahead if refresh_ahead is not None else TOKEN_REFRESH_AHEAD:
+            self.start_refresh_ahead()
 
-        # 内存缓存
-        self._memory_cache = {}
+    def _cache_key(self, kind: str) -> str:
+        return f"feishu_{kind}_access_token:{self.app_id}"
 
     def get_app_access_token(self) -> str:
         """获取有效的App Access Token"""
-        cache_key = f"feishu_app_access_token:{self.app_id}"
+        return self._get_token("app")
+
+    def get_tenant_access_token(self) -> str:
+        """获取有效的Tenant Access Token"""
+        return self._get_token("tenant")
+
+    def _get_token(self, kind: str) -> str:
+        # 提前刷新模式下直接返回内存中的令牌，不产生网络请求
+        hot = self._hot.get(kind)
+        if hot and time.time() < hot[1] - self.buffer_time:
+            return hot[0]
+
+        with self._hot_lock:
+            hot = self._hot.get(kind)
+            if hot and time.time() < hot[1] - self.buffer_time:
+                return hot[0]
+            try:
+                token, expire_time = self._load_or_fetch(kind)
+            except Exception as e:
+                raise Exception(f"获取{kind} Access Token失败: {str(e)}")
+            self._remember(kind, token, expire_time)
+            return token
 
-        # 尝试从缓存获取
-        cached_token = self._get_from_cache(cache_key)
+    def _load_or_fetch(self, kind: str, min_remaining: Optional[float] = None) -> Tuple[str, float]:
+        """优先使用共享缓存中剩余时间足够的令牌，否则重新获取并写回缓存"""
+        min_remaining = self.buffer_time if min_remaining is None else min_remaining
+        cache_key = self._cache_key(kind)
+        cached = self._cached_token(cache_key, min_remaining)
+        if cached:
+            return cached
+
+        # 单飞刷新：多个线程/进程同时发现过期时只有一个调用接口，其余等待后读取它写入的令牌
+        try:
+            with DistributedLock(f"{cache_key}:lock", self.redis_client):
+                # L1 只属于本进程，可能仍是即将过期的旧令牌；加锁后读共享层才能看到其他进程刷新的结果
+                cached = self._cached_token(cache_key, min_remaining, shared_only=True)
+                if cached:
+                    return cached
+                token, expires_in = self._fetch_token(kind)
+                expire_time = int(time.time()) + expires_in
+                self._set_to_cache(cache_key, f"{token}|{expire_time}", expires_in)
+                return token, float(expire_time)
+        except LockTimeout as e:
+            cached = self._cached_token(cache_key, self.buffer_time, shared_only=True)
+            if cached:
+                return cached
+            raise Exception(f"等待其他进程刷新Token超时: {e}")
+
+    def _cached_token(self, cache_key: str, min_remaining: float,
+                      shared_only: bool = False) -> Optional[Tuple[str, float]]:
+        """缓存中剩余有效期超过 min_remaining 的令牌"""
+        cached_token = self._get_from_cache(cache_key, shared_only)
         if cached_token:
             token, expire_time = cached_token.split("|", 1)
-            if int(time.time()) < (int(expire_time) - self.buffer_time):
-                return token
+            if int(time.time()) < (int(expire_time) - min_remaining):
+                return token, float(expire_time)
+        return None
 
-        # 缓存失效，重新获取
+    def _remember(self, kind: str, token: str, expire_time: float) -> None:
+        """记录热令牌，按实际剩余有效期的比例加抖动计算下次刷新时间
+
+        刷新点不晚于过期前 buffer_time，且距现在至少 TOKEN_REFRESH_MIN_INTERVAL，避免剩余时间很短时反复请求
+        """
+        now = time.time()
+        remaining = max(0.0, expire_time - now)
+        jitter = 1 - TOKEN_REFRESH_JITTER * random.random()
+        refresh_at = min(now + remaining * TOKEN_REFRESH_FRACTION * jitter, expire_time - self.buffer_time)
+        self._hot[kind] = (token, expire_time, max(now + TOKEN_REFRESH_MIN_INTERVAL, refresh_at))
+
+    def start_refresh_ahead(self, kinds: Tuple[str, ...] = ("app", "tenant")) -> None:
+        """启动后台刷新线程，先同步获取一次令牌"""
+        if self._refresher and self._refresher.is_alive():
+            return
+        for kind in kinds:
+            self._get_token(kind)
+        self._stop.clear()
+        self._refresher = threading.Thread(
+            target=self._refresh_loop, args=(kinds,), name="feishu-token-refresh", daemon=True
+        )
+        self._refresher.start()
+
+    def stop_refresh_ahead(self) -> None:
+        self._stop.set()
+        if self._refresher:
+            self._refresher.join(timeout=5)
+            self._refresher = None
+
+    def _refresh_loop(self, kinds: Tuple[str, ...]) -> None:
+        while not self._stop.is_set():
+            now = time.time()
+            due = [k for k in kinds if k not in self._hot or self._hot[k][2] <= now]
+            for kind in due:
+                self._refresh_kind(kind)
+            next_at = min((self._hot[k][2] for k in kinds if k in self._hot), default=now + TOKEN_REFRESH_RETRY)
+            self._stop.wait(max(1.0, next_at - time.time()))
+
+    def _refresh_kind(self, kind: str) -> None:
+        """后台续期一种令牌；其他进程已续期（缓存中的令牌比当前的更晚过期）时直接采用，否则重新获取"""
+        now = time.time()
+        hot = self._hot.get(kind)
+        current_remaining = hot[1] - now if hot else self.buffer_time
         try:
-            token, expires_in = self._fetch_app_access_token()
-            expire_time = int(time.time()) + expires_in
-
-            # 保存到缓存
-            cache_value = f"{token}|{expire_time}"
-            self._set_to_cache(cache_key, cache_value, expires_in)
-
-            return token
+            token, expire_time = self._load_or_fetch(kind, min_remaining=current_remaining + 1)
         except Exception as e:
-            raise Exception(f"获取App Access Token失败: {str(e)}")
+            print(f"⚠️  后台刷新{kind} Token失败，{TOKEN_REFRESH_RETRY:.0f}s 后重试: {e}")
+            with self._hot_lock:
+                hot = self._hot.get(kind)
+                if hot:
+                    self._hot[kind] = (hot[0], hot[1], time.time() + TOKEN_REFRESH_RETRY)
+            return
+        with self._hot_lock:
+            if hot and expire_time <= hot[1]:
+                # 剩余有效期较长时接口返回同一个令牌，等到会签发新令牌时再刷新
+                retry_at = max(now + TOKEN_REFRESH_MIN_INTERVAL, expire_time - TOKEN_REISSUE_WINDOW)
+                print(f"⚠️  {kind} Token 过期时间未延长，{retry_at - now:.0f}s 后再刷新")
+                self._hot[kind] = (token, expire_time, retry_at)
+            else:
+                self._remember(kind, token, expire_time)
 
-    def _fetch_app_access_token(self) -> Tuple[str, int]:
-        """从飞书API获取App Access Token"""
-        url = "https://open.feishu.cn/open-apis/auth/v3/app_access_token"
+    def _fetch_token(self, kind: str) -> Tuple[str, int]:
+        """从飞书API获取指定类型的令牌"""
+        url, token_field = TOKEN_ENDPOINTS[kind]
         headers = {"Content-Type": "application/json"}
         data = {
             "app_id": self.app_id,
@@ -75,14 +200,15 @@ class FeishuAppTokenManager:
         }
 
         try:
-            response = requests.post(url, json=data, headers=headers, timeout=10)
+            # 复用进程级连接池，避免每次获取Token都重新握手
+            response = http_session.post(url, json=data, headers=headers, timeout=10)
             response.raise_for_status()
             result = response.json()
 
             if result.get("code") == 0:
-                app_access_token = result["app_access_token"]
-                expires_in = result.get("expires_in", 7200)  # 默认2小时
-                return app_access_token, expires_in
+                access_token = result[token_field]
+                expires_in = result.get("expire", result.get("expires_in", DEFAULT_TOKEN_TTL))  # 默认2小时
+                return access_token, expires_in
             else:
                 raise Exception(f"API返回错误: {result.get('msg')} (错误码: {result.get('code')})")
 
@@ -91,53 +217,38 @@ class FeishuAppTokenManager:
         except json.JSONDecodeError as e:
             raise Exception(f"响应JSON解析失败: {str(e)}")
 
-    def _get_from_cache(self, key: str) -> Optional[str]:
-        """从缓存获取值"""
-        if self.redis_client:
-            try:
-                return self.redis_client.get(key)
-            except Exception:
-                pass
-
-        # 使用内存缓存
-        cache_data = self._memory_cache.get(key)
-        if cache_data:
-            value, expire_time = cache_data
-            if time.time() < expire_time:
-                return value
-            else:
-                # 过期，删除
-                del self._memory_cache[key]
+    def _fetch_app_access_token(self) -> Tuple[str, int]:
+        """从飞书API获取App Access Token"""
+        return self._fetch_token("app")
 
-        return None
+    def _get_from_cache(self, key: str, shared_only: bool = False) -> Optional[str]:
+        """从分层缓存获取值，shared_only 时跳过进程内缓存"""
+        return self.cache.get(key, shared_only)
 
     def _set_to_cache(self, key: str, value: str, expire_seconds: int):
-        """保存值到缓存"""
-        if self.redis_client:
-            try:
-                self.redis_client.setex(key, expire_seconds, value)
-                return
-            except Exception:
-                pass
+        """保存值到所有可用的缓存层"""
+        self.cache.set(key, value, expire_seconds)
 
-        # 使用内存缓存
-        expire_time = time.time() + expire_seconds
-        self._memory_cache[key] = (value, expire_time)
+    def cache_stats(self) -> dict:
+        """各缓存层的命中/未命中次数"""
+        return self.cache.stats()
 
     def get_token_info(self) -> dict:
         """获取当前token信息（用于调试）"""
-        cache_key = f"feishu_app_access_token:{self.app_id}"
-        cached_token = self._get_from_cache(cache_key)
+        cached_token = self._get_from_cache(self._cache_key("app"))
 
         if cached_token:
             token, expire_time = cached_token.split("|", 1)
             remaining_time = int(expire_time) - int(time.time())
-            return {
+            info = {
                 "token": f"{token[:10]}...",
                 "expire_time": expire_time,
                 "remaining_seconds": remaining_time,
                 "is_valid": remaining_time > self.buffer_time
             }
+            if "app" in self._hot:
+                info["next_refresh_seconds"] = int(self._hot["app"][2] - time.time())
+            return info
         else:
             return {"status": "no_cache"}
 
@@ -206,6 +317,7 @@ if __name__ == "__main__":
         # 显示token信息
         info = token_manager.get_token_info()
         print(f"Token信息: {info}")
+        print(f"缓存命中: {token_manager.cache_stats()}")
 
     except Exception as e:
         print(f"❌ 错误: {str(e)}")
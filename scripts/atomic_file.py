@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+原子文件写入
+先写同目录下唯一命名的临时文件再 os.replace 替换，进程中断不会留下半个文件，
+多个进程同时写同一文件也不会互相截断临时文件（后替换者生效）；
+同一进程内对同一文件的读改写通过 file_lock 按路径串行
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+DEFAULT_FILE_MODE = 0o644
+
+_path_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def file_lock(path: str) -> threading.Lock:
+    """返回该路径专用的进程内锁"""
+    key = os.path.abspath(path)
+    with _registry_lock:
+        return _path_locks.setdefault(key, threading.Lock())
+
+
+@contextmanager
+def atomic_path(path: str, file_mode: Optional[int] = None) -> Iterator[str]:
+    """产出临时文件路径，写入完成后原子替换目标文件；写入出错时删除临时文件"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        if file_mode is None:
+            # mkstemp 创建的文件为 0600，沿用目标文件原有权限，新文件使用 0644
+            try:
+                file_mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                file_mode = DEFAULT_FILE_MODE
+        os.chmod(tmp_path, file_mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
@@ -8,6 +8,7 @@ import os
 import sys
 import subprocess
 import json
+import time
 import lark_oapi as lark
 from lark_oapi.api.auth.v3 import *
 
@@ -129,6 +130,28 @@ def run_update() -> bool:
         return False
 
 
+def replay_outbox(since: float) -> bool:
+    """重放发件箱中未落地的分块
+
+    只有本次运行（since 之后）登记的分块存在且全部落地才算成功；
+    仅重放了以前运行遗留的分块时返回 False，由调用方重跑更新
+    """
+    try:
+        from write_outbox import WriteOutbox, replay
+
+        outbox = WriteOutbox()
+        current = {entry.key for entry in outbox.pending(since=since)}
+        if not current:
+            return False
+        print("\n📮 检测到本次运行未落地的写入，使用新Token重放发件箱...")
+        replay(outbox)
+        remaining = {entry.key for entry in outbox.pending(max_attempts=sys.maxsize, since=since)}
+        return not current & remaining
+    except Exception as e:
+        print(f"❌ 重放发件箱失败: {e}")
+        return False
+
+
 def main():
     """主函数：自动获取token并执行更新"""
     print("🚀 启动自动Token刷新和股票价格更新...")
@@ -136,7 +159,8 @@ def main():
     # 加载环境变量
     load_env_file()
 
-    # 首次尝试运行更新
+    # 首次尝试运行更新；记录开始时间以区分本次运行登记的发件箱分块
+    started_at = time.time()
     success = run_update()
 
     # 如果失败，尝试刷新token再运行
@@ -150,8 +174,11 @@ def main():
             os.environ.pop("APP_ACCESS_TOKEN", None)  # 清除旧的
             load_env_file()
 
-            print("\n🔄 使用新Token重新执行更新...")
-            success = run_update()
+            # 行情已抓取、只是写入失败时，重放发件箱即可，无需重跑整个流程
+            success = replay_outbox(started_at)
+            if not success:
+                print("\n🔄 使用新Token重新执行更新...")
+                success = run_update()
 
             if success:
                 print("\n🎉 Token刷新并更新成功！")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+历史日线回填
+按 股票 × 日期窗口 切分任务，限并发并行拉取并写入本地历史存储；
+每完成一个窗口即记录检查点，中断后重新运行会从未完成的窗口继续
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Set, Tuple
+
+import http_session
+from get_stock_price import create_upstream_guard, fetch_stock_history, target_stocks
+from price_store import PriceStore
+from quote_providers import get_provider
+from rate_limiter import RateLimiter
+from resilience import UpstreamGuard
+from trading_calendar import get_calendar
+
+DEFAULT_CHECKPOINT = "data/backfill_checkpoint.jsonl"
+
+Window = Tuple[str, datetime.date, datetime.date]
+
+
+def parse_date(text: str) -> datetime.date:
+    return datetime.datetime.strptime(text.replace("-", ""), "%Y%m%d").date()
+
+
+def split_windows(codes: List[str], start: datetime.date, end: datetime.date, window_days: int) -> List[Window]:
+    """将每只股票的 [start, end] 切分为不超过 window_days 天的窗口"""
+    windows: List[Window] = []
+    for code in codes:
+        cursor = start
+        while cursor <= end:
+            window_end = min(end, cursor + datetime.timedelta(days=window_days - 1))
+            windows.append((code, cursor, window_end))
+            cursor = window_end + datetime.timedelta(days=1)
+    return windows
+
+
+def window_key(window: Window) -> str:
+    code, start, end = window
+    return f"{code}:{start:%Y%m%d}:{end:%Y%m%d}"
+
+
+class Checkpoint:
+    """追加写入的检查点文件，每行记录一个已完成窗口"""
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Set[str]:
+        done: Set[str] = set()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["key"])
+                except (ValueError, KeyError):
+                    # 中断时可能留下半行，忽略即可
+                    continue
+        return done
+
+    def mark_done(self, window: Window, rows: int) -> None:
+        entry = {"key": window_key(window), "rows": rows, "finished_at": datetime.datetime.now().isoformat()}
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def reset(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def backfill_window(window: Window, names: Dict[str, str], store: PriceStore, limiter: RateLimiter,
+                    guard: UpstreamGuard) -> int:
+    """回填单个窗口，只请求本地缺失的区间，返回写入行数"""
+    code, start, end = window
+    name = names.get(code, code)
+    rows = 0
+    # 日历覆盖该窗口时按真实交易日计算缺口，节假日不会被反复请求
+    calendar = get_calendar()
+    trading_days = calendar.trading_days_between(start, end) if calendar.covers(start) and calendar.covers(end) else None
+    for missing_start, missing_end in store.missing_ranges(code, start, end, trading_days):
+        df = fetch_stock_history(
+            name, code,
+            missing_start.strftime("%Y%m%d"), missing_end.strftime("%Y%m%d"),
+            limiter=limiter, raise_errors=True, guard=guard,
+        )
+        if df is not None:
+            rows += store.write(df)
+    return rows
+
+
+def run_backfill(codes: List[str], start: datetime.date, end: datetime.date,
+                 window_days: int = 365, max_workers: int = 4, rate_limit: float = 5,
+                 checkpoint_path: str = DEFAULT_CHECKPOINT, restart: bool = False) -> bool:
+    """执行回填，全部窗口完成时返回 True"""
+    provider = get_provider()
+    watchlist = provider.default_watchlist() or target_stocks
+    names = {code: name for name, code in watchlist.items()}
+    store = PriceStore(provider.store_dir)
+    limiter = RateLimiter(rate_limit)
+    guard = create_upstream_guard(max_workers)
+    checkpoint = Checkpoint(checkpoint_path)
+    if restart:
+        checkpoint.reset()
+
+    windows = split_windows(codes, start, end, window_days)
+    done = checkpoint.load()
+    pending = [w for w in windows if window_key(w) not in done]
+    print(f"📦 回填 {len(codes)} 只股票 {start} ~ {end}: 共 {len(windows)} 个窗口，"
+          f"已完成 {len(windows) - len(pending)}，待处理 {len(pending)} (并发数: {max_workers})")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(backfill_window, w, names, store, limiter, guard): w for w in pending}
+        for future in as_completed(futures):
+            window = futures[future]
+            try:
+                rows = future.result()
+                checkpoint.mark_done(window, rows)
+                print(f"  ✅ {window_key(window)}: {rows} 行")
+            except Exception as e:
+                failed += 1
+                print(f"  ❌ {window_key(window)}: {e}")
+
+    if failed:
+        print(f"\n⚠️  {failed} 个窗口失败，重新运行同一命令即可从断点继续")
+        return False
+    print(f"\n🎉 回填完成，数据位于 {store.root}")
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回填历史日线到本地存储")
+    parser.add_argument("--symbols", help="逗号分隔的股票代码，默认使用数据源的观察列表")
+    parser.add_argument("--start", required=True, help="开始日期 YYYYMMDD")
+    parser.add_argument("--end", help="结束日期 YYYYMMDD，默认最近一个已收盘交易日")
+    parser.add_argument("--window-days", type=int, default=365, help="每个窗口的自然日天数")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("STOCK_FETCH_WORKERS", "4")))
+    parser.add_argument("--rps", type=float, default=float(os.getenv("STOCK_FETCH_RPS", "5")),
+                        help="全局每秒请求上限")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="忽略已有检查点，从头开始")
+    args = parser.parse_args()
+    http_session.install_global_session()
+
+    if args.symbols:
+        codes = [c.strip().zfill(6) for c in args.symbols.split(",") if c.strip()]
+    else:
+        codes = list((get_provider().default_watchlist() or target_stocks).values())
+    if args.end:
+        end = parse_date(args.end)
+    else:
+        end = get_calendar().as_of_date() or datetime.date.today() - datetime.timedelta(days=1)
+    ok = run_backfill(
+        codes, parse_date(args.start), end,
+        window_days=args.window_days, max_workers=args.workers, rate_limit=args.rps,
+        checkpoint_path=args.checkpoint, restart=args.restart,
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
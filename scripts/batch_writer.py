@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+多维表格批量写入模块
+按记录条数与请求体大小自动分块，并在限速内并发提交各分块（batch_update / batch_create），
+返回每个分块的结果及汇总
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from lazy_import import lazy_module
+from rate_limiter import RateLimiter, call_with_backoff, get_api_limiter
+
+lark = lazy_module("lark_oapi")
+bitable = lazy_module("lark_oapi.api.bitable.v1")
+
+# 多维表格单次批量写入最多 500 条记录
+MAX_BATCH_RECORDS = 500
+DEFAULT_BATCH_SIZE = min(MAX_BATCH_RECORDS, int(os.getenv("BITABLE_BATCH_SIZE", str(MAX_BATCH_RECORDS))))
+# 单个请求体的字节上限，留出余量避免触发网关限制
+DEFAULT_MAX_PAYLOAD_BYTES = int(os.getenv("BITABLE_BATCH_MAX_BYTES", str(2 * 1024 * 1024)))
+DEFAULT_WRITE_WORKERS = int(os.getenv("BITABLE_WRITE_WORKERS", "4"))
+Updates = Dict[str, Dict[str, Any]]
+
+
+def _record_size(record_id: str, fields: Dict[str, Any]) -> int:
+    """估算单条记录序列化后的字节数"""
+    payload = {"record_id": record_id, "fields": fields}
+    return len(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def chunk_updates(updates: Updates, batch_size: int = DEFAULT_BATCH_SIZE,
+                  max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES) -> List[Updates]:
+    """按条数与请求体大小切分 {record_id: fields}，保持原有顺序"""
+    batch_size = max(1, min(batch_size, MAX_BATCH_RECORDS))
+    chunks: List[Updates] = []
+    current: Updates = {}
+    current_bytes = 0
+    for record_id, fields in updates.items():
+        size = _record_size(record_id, fields)
+        if current and (len(current) >= batch_size or current_bytes + size > max_payload_bytes):
+            chunks.append(current)
+            current, current_bytes = {}, 0
+        # 单条超过上限时仍单独成块，由服务端决定是否接受
+        current[record_id] = fields
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ChunkResult:
+    """单个分块的写入结果"""
+
+    def __init__(self, index: int, updates: Updates, success: bool, code: Optional[int] = None,
+                 msg: str = "", log_id: Optional[str] = None, elapsed: float = 0.0,
+                 created: Optional[Dict[str, str]] = None):
+        self.index = index
+        self.updates = updates
+        self.success = success
+        self.code = code
+        self.msg = msg
+        self.log_id = log_id
+        self.elapsed = elapsed
+        # batch_create 时为 {分块中的键: 新建的 record_id}
+        self.created = created or {}
+
+    @property
+    def record_ids(self) -> List[str]:
+        return list(self.updates)
+
+    def __repr__(self) -> str:
+        status = "ok" if self.success else f"failed code={self.code}"
+        return f"<ChunkResult #{self.index} {len(self.updates)} records {status}>"
+
+
+class BatchResult:
+    """所有分块结果的汇总"""
+
+    def __init__(self, chunks: List[ChunkResult]):
+        self.chunks = sorted(chunks, key=lambda c: c.index)
+
+    @property
+    def success(self) -> bool:
+        return all(c.success for c in self.chunks)
+
+    @property
+    def succeeded(self) -> Updates:
+        """写入成功的 {record_id: fields}"""
+        written: Updates = {}
+        for c in self.chunks:
+            if c.success:
+                written.update(c.updates)
+        return written
+
+    @property
+    def created(self) -> Dict[str, str]:
+        """batch_create 新建的 {键: record_id}"""
+        created: Dict[str, str] = {}
+        for c in self.chunks:
+            created.update(c.created)
+        return created
+
+    @property
+    def failed(self) -> List[ChunkResult]:
+        return [c for c in self.chunks if not c.success]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self.chunks),
+            "failed_chunks": len(self.failed),
+            "records": sum(len(c.updates) for c in self.chunks),
+            "written": sum(len(c.updates) for c in self.chunks if c.success),
+            "elapsed_max": round(max((c.elapsed for c in self.chunks), default=0.0), 3),
+        }
+
+
+class BatchWriter:
+    """分块并发调用 app_table_record.batch_update / batch_create
+
+    update 分块为 {record_id: fields}；create 分块为 {键: fields}，键仅用于关联新建的 record_id
+    """
+
+    def __init__(self, client, option, app_token: str, table_id: str,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES,
+                 max_workers: int = DEFAULT_WRITE_WORKERS,
+                 rate_limit: Optional[float] = None,
+                 limiter=None):
+        self.client = client
+        self.option = option
+        self.app_token = app_token
+        self.table_id = table_id
+        self.batch_size = batch_size
+        self.max_payload_bytes = max_payload_bytes
+        self.max_workers = max(1, max_workers)
+        # 默认使用按应用与接口跨进程共享的限速器；显式指定 rate_limit 时只在本实例内限速
+        if limiter is None:
+            limiter = RateLimiter(rate_limit) if rate_limit is not None else get_api_limiter("bitable.record.write")
+        self.limiter = limiter
+
+    def _build_request(self, chunk: Updates):
+        records = [
+            bitable.AppTableRecord.builder().record_id(record_id).fields(fields).build()
+            for record_id, fields in chunk.items()
+        ]
+        return (
+            bitable.BatchUpdateAppTableRecordRequest.builder()
+            .app_token(self.app_token)
+            .table_id(self.table_id)
+            .user_id_type("user_id")
+            .request_body(bitable.BatchUpdateAppTableRecordRequestBody.builder().records(records).build())
+            .build()
+        )
+
+    def _build_create_request(self, chunk: Updates, client_token: Optional[str]):
+        records = [bitable.AppTableRecord.builder().fields(fields).build() for fields in chunk.values()]
+        builder = (
+            bitable.BatchCreateAppTableRecordRequest.builder()
+            .app_token(self.app_token)
+            .table_id(self.table_id)
+            .user_id_type("user_id")
+            .request_body(bitable.BatchCreateAppTableRecordRequestBody.builder().records(records).build())
+        )
+        # 相同 client_token 的重复请求由服务端去重，重放时不会重复建行
+        if client_token:
+            builder = builder.client_token(client_token)
+        return builder.build()
+
+    def _submit(self, index: int, chunk: Updates, op: str = "update",
+                client_token: Optional[str] = None) -> ChunkResult:
+        start = time.perf_counter()
+        table_record = self.client.bitable.v1.app_table_record
+        try:
+            if op == "create":
+                req = self._build_create_request(chunk, client_token)
+                send = lambda: table_record.batch_create(req, self.option)
+            else:
+                req = self._build_request(chunk)
+                send = lambda: table_record.batch_update(req, self.option)
+            resp = call_with_backoff(self.limiter, send, label=f"分块 #{index} ")
+        except Exception as e:
+            result = ChunkResult(index, chunk, False, msg=str(e), elapsed=time.perf_counter() - start)
+        else:
+            created = None
+            if op == "create" and resp.success():
+                # 返回的记录与请求顺序一致
+                created = {key: record.record_id for key, record in zip(chunk, resp.data.records or [])}
+            result = ChunkResult(index, chunk, resp.success(), resp.code, resp.msg, resp.get_log_id(),
+                                 time.perf_counter() - start, created)
+        if not result.success:
+            lark.logger.error(
+                f"分块 #{index} 写入失败（{len(chunk)} 条），"
+                f"code={result.code}, msg={result.msg}, log_id={result.log_id}"
+            )
+        return result
+
+    def chunk(self, updates: Updates) -> List[Updates]:
+        return chunk_updates(updates, self.batch_size, self.max_payload_bytes)
+
+    def write(self, updates: Updates, op: str = "update") -> BatchResult:
+        return self.write_chunks(self.chunk(updates), op)
+
+    def write_chunks(self, chunks: List[Updates], op: str = "update",
+                     client_tokens: Optional[List[str]] = None) -> BatchResult:
+        """提交已切分好的分块，ChunkResult.index 与传入顺序一致
+
+        op 为 update 或 create；create 时 client_tokens 与分块一一对应，用于幂等
+        """
+        tokens = client_tokens or [None] * len(chunks)
+        if not chunks:
+            return BatchResult([])
+        if len(chunks) == 1:
+            return BatchResult([self._submit(0, chunks[0], op, tokens[0])])
+
+        results: List[ChunkResult] = []
+        workers = min(self.max_workers, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._submit, i, chunk, op, tokens[i]) for i, chunk in enumerate(chunks)]
+            for future in as_completed(futures):
+                results.append(future.result())
+        return BatchResult(results)
@@ -5,10 +5,11 @@
 
 import os
 import json
-import requests
 import lark_oapi as lark
 from lark_oapi.api.bitable.v1 import *
 
+import http_session
+
 
 def load_env_file(path: str = ".env") -> None:
     if not os.path.exists(path):
@@ -131,7 +132,7 @@ def test_direct_api_call():
     print(f"   Data: {json.dumps(data, indent=2, ensure_ascii=False)}")
 
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = http_session.post(url, headers=headers, json=data, timeout=10)
         print(f"\n📡 响应状态码: {response.status_code}")
 
         try:
@@ -145,6 +146,9 @@ def test_direct_api_call():
 
 
 if __name__ == "__main__":
+    # lark SDK 内部的 requests 调用同样复用共享连接池
+    http_session.install_global_session()
     check_app_info()
     check_table_permissions()
-    test_direct_api_call()
\ No newline at end of file
+    test_direct_api_call()
+    http_session.print_connection_stats("\n")
\ No newline at end of file
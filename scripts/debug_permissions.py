@@ -5,7 +5,8 @@
 
 import os
 import json
-import requests
+
+import http_session
 
 
 def load_env_file(path: str = ".env") -> None:
@@ -61,7 +62,7 @@ def test_different_update_methods():
     params = {"user_id_type": "user_id"}
 
     try:
-        response = requests.post(url, headers=headers, json=data, params=params, timeout=10)
+        response = http_session.post(url, headers=headers, json=data, params=params, timeout=10)
         print(f"   状态码: {response.status_code}")
         print(f"   响应: {response.json()}")
     except Exception as e:
@@ -79,7 +80,7 @@ def test_different_update_methods():
     }
 
     try:
-        response = requests.put(url, headers=headers, json=data, timeout=10)
+        response = http_session.put(url, headers=headers, json=data, timeout=10)
         print(f"   状态码: {response.status_code}")
         print(f"   响应: {response.json()}")
     except Exception as e:
@@ -91,7 +92,7 @@ def test_different_update_methods():
     # 先获取字段信息
     fields_url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/fields"
     try:
-        response = requests.get(fields_url, headers=headers, timeout=10)
+        response = http_session.get(fields_url, headers=headers, timeout=10)
         if response.status_code == 200:
             fields_data = response.json()
             print(f"   可用字段:")
@@ -126,7 +127,7 @@ def test_different_update_methods():
                     }
 
                     url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_update"
-                    response = requests.post(url, headers=headers, json=data, timeout=10)
+                    response = http_session.post(url, headers=headers, json=data, timeout=10)
                     print(f"   使用字段ID - 状态码: {response.status_code}")
                     print(f"   使用字段ID - 响应: {response.json()}")
 
@@ -151,4 +152,5 @@ def check_app_installation():
 
 if __name__ == "__main__":
     test_different_update_methods()
-    check_app_installation()
\ No newline at end of file
+    check_app_installation()
+    http_session.print_connection_stats("\n")
\ No newline at end of file
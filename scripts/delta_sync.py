@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+增量同步模块
+将待写入的 {record_id: {字段: 值}} 与表格的已知状态比较，只保留真正变化的单元格。
+已知状态来自本地快照（上次成功写入的值）或批量读取表格
+"""
+
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from atomic_file import atomic_write_json, file_lock
+from lazy_import import lazy_module
+from rate_limiter import call_with_backoff
+
+lark = lazy_module("lark_oapi")
+bitable = lazy_module("lark_oapi.api.bitable.v1")
+
+DEFAULT_SNAPSHOT_PATH = os.getenv("TABLE_SNAPSHOT_PATH", "data/table_snapshot.json")
+
+# 批量读取接口单次最多 100 条记录
+BATCH_GET_LIMIT = 100
+
+Updates = Dict[str, Dict[str, Any]]
+
+
+def load_tolerances() -> Dict[str, float]:
+    """读取字段容差配置，如 DELTA_FIELD_TOLERANCES='{"Current Price": 0.001}'"""
+    raw = os.getenv("DELTA_FIELD_TOLERANCES")
+    if not raw:
+        return {}
+    try:
+        return {k: float(v) for k, v in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        print(f"⚠️  DELTA_FIELD_TOLERANCES 解析失败，忽略: {e}")
+        return {}
+
+
+def values_equal(new: Any, old: Any, tolerance: float) -> bool:
+    """数值按容差比较，其他类型按值比较"""
+    if isinstance(new, (int, float)) and not isinstance(new, bool):
+        try:
+            old_number = float(old)
+        except (TypeError, ValueError):
+            return False
+        if math.isnan(new) or math.isnan(old_number):
+            return False
+        return abs(float(new) - old_number) <= tolerance
+    return new == old
+
+
+def diff_updates(updates: Updates, known: Updates, tolerances: Optional[Dict[str, float]] = None,
+                 default_tolerance: float = 1e-6) -> Updates:
+    """返回只包含变化单元格的 updates，已无变化的记录整体剔除"""
+    tolerances = tolerances or {}
+    changed: Updates = {}
+    for record_id, fields in updates.items():
+        previous = known.get(record_id, {})
+        delta = {
+            name: value
+            for name, value in fields.items()
+            if name not in previous
+            or not values_equal(value, previous[name], tolerances.get(name, default_tolerance))
+        }
+        if delta:
+            changed[record_id] = delta
+    return changed
+
+
+class TableSnapshot:
+    """本地快照：记录每张表最近一次成功写入的单元格值"""
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self._data: Dict[str, Updates] = self._read()
+        self._dirty = set()
+
+    def _read(self) -> Dict[str, Updates]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  快照文件读取失败，按空快照处理: {e}")
+            return {}
+
+    @staticmethod
+    def _table_key(app_token: str, table_id: str) -> str:
+        return f"{app_token}/{table_id}"
+
+    def get(self, app_token: str, table_id: str) -> Updates:
+        return self._data.get(self._table_key(app_token, table_id), {})
+
+    def apply(self, app_token: str, table_id: str, written: Updates) -> None:
+        key = self._table_key(app_token, table_id)
+        self._dirty.add(key)
+        table = self._data.setdefault(key, {})
+        for record_id, fields in written.items():
+            table.setdefault(record_id, {}).update(fields)
+
+    def invalidate(self, app_token: str, table_id: str, record_ids: Optional[Iterable[str]] = None) -> None:
+        key = self._table_key(app_token, table_id)
+        self._dirty.add(key)
+        if record_ids is None:
+            self._data.pop(key, None)
+            return
+        table = self._data.get(key, {})
+        for record_id in record_ids:
+            table.pop(record_id, None)
+
+    def save(self) -> None:
+        """只写回本实例修改过的表，保留其他目标同时写入的内容"""
+        with file_lock(self.path):
+            data = self._read()
+            for key in self._dirty:
+                if key in self._data:
+                    data[key] = self._data[key]
+                else:
+                    data.pop(key, None)
+            atomic_write_json(self.path, data)
+            self._dirty.clear()
+
+
+def fetch_remote_state(client, option, app_token: str, table_id: str,
+                       record_ids: List[str]) -> Optional[Updates]:
+    """批量读取指定记录的当前字段值，失败时返回 None"""
+    state: Updates = {}
+    for i in range(0, len(record_ids), BATCH_GET_LIMIT):
+        chunk = record_ids[i:i + BATCH_GET_LIMIT]
+        req = (
+            bitable.BatchGetAppTableRecordRequest.builder()
+            .app_token(app_token)
+            .table_id(table_id)
+            .request_body(bitable.BatchGetAppTableRecordRequestBody.builder().record_ids(chunk).build())
+            .build()
+        )
+        resp = call_with_backoff(
+            "bitable.record.read", lambda: client.bitable.v1.app_table_record.batch_get(req, option)
+        )
+        if not resp.success():
+            lark.logger.warning(f"批量读取记录失败，code={resp.code}, msg={resp.msg}, log_id={resp.get_log_id()}")
+            return None
+        for record in resp.data.records or []:
+            state[record.record_id] = record.fields or {}
+    return state
@@ -1,13 +1,28 @@
+import json
 import time
-import redis
-import requests
+
+import http_session
+from redis_client import get_redis
+from redis_lock import DistributedLock, LockTimeout
+from token_cache import TieredTokenCache
+
+# 刷新接口的连接/读取超时（秒）；锁的有效期须明显长于整次请求，
+# 否则慢请求成功时锁已过期，guarded_set 会拒绝写入轮换后的 refresh_token
+REFRESH_REQUEST_TIMEOUT = 5
+REFRESH_LOCK_TTL = 30
+# 本地缓存中轮换后 Token 的保留时间，与 refresh_token 的有效期（30 天）一致
+LOCAL_TOKEN_TTL = 30 * 24 * 3600
 
 class FeishuUserTokenManager:
     def __init__(self, app_id, app_secret, redis_host="localhost", redis_port=6379):
         self.app_id = app_id
         self.app_secret = app_secret
-        self.redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+        self.redis_client = get_redis(redis_host, redis_port)
+        if self.redis_client is None:
+            raise Exception("User Token需要Redis保存refresh_token，请确认Redis服务可用")
         self.buffer_time = 300  # 提前5分钟刷新，避免过期
+        # 轮换后的Token先写入本地（进程内 + 加密文件），Redis写入被拒绝或失败时仍可继续使用
+        self.local_cache = TieredTokenCache(secret=app_secret)
         
     def _get_keys(self, user_id):
         """获取用户相关的Redis键名"""
@@ -23,40 +38,76 @@ class FeishuUserTokenManager:
         keys = self._get_keys(user_id)
         
         # 尝试从缓存获取
+        access_token = self._cached_access_token(keys) or self._local_access_token(user_id)
+        if access_token:
+            return access_token
+
+        # Token无效，需要刷新：同一时刻只有一个进程调用刷新接口，其余等待后读取其结果
+        try:
+            with self._redis_lock(keys["lock"]) as lock:
+                # 双重检查：等待期间其他进程可能已经刷新
+                access_token = self._cached_access_token(keys)
+                if access_token:
+                    return access_token
+
+                refresh_token = self.redis_client.get(keys["refresh_token"]) or self._local_refresh_token(user_id)
+                if refresh_token:
+                    try:
+                        new_access_token, new_refresh_token, new_expire = self._refresh_user_token(refresh_token)
+                    except Exception as e:
+                        print(f"刷新Token失败: {str(e)}")
+                    else:
+                        # 刷新接口已作废旧的refresh_token，先落到本地，写入Redis失败也不会丢失
+                        self._save_local(user_id, new_access_token, new_refresh_token, new_expire)
+                        # 锁已过期并被他人取得时不覆盖对方写入的 refresh_token
+                        if not lock.guarded_set({
+                            keys["access_token"]: new_access_token,
+                            keys["refresh_token"]: new_refresh_token,
+                            keys["expire_time"]: new_expire,
+                        }):
+                            print("⚠️  新Token未写入Redis（锁已失效或Redis不可用），保留在本地缓存中使用")
+                        return new_access_token
+        except LockTimeout as e:
+            print(f"等待Token刷新超时: {e}")
+
+        access_token = self._cached_access_token(keys) or self._local_access_token(user_id)
+        if access_token:
+            return access_token
+        # 如果刷新失败，可能需要重新授权
+        raise Exception(f"用户 {user_id} 的Token已过期且无法刷新，请重新授权")
+
+    def _cached_access_token(self, keys):
+        """缓存中仍在有效期内的Access Token，没有时返回None"""
         access_token = self.redis_client.get(keys["access_token"])
         refresh_token = self.redis_client.get(keys["refresh_token"])
         expire_time = self.redis_client.get(keys["expire_time"])
-        
-        # 检查Token是否有效
         if access_token and refresh_token and expire_time:
             if int(time.time()) < (int(expire_time) - self.buffer_time):
                 return access_token
-        
-        # Token无效，需要刷新
-        with self._redis_lock(keys["lock"], timeout=10):
-            # 双重检查，避免并发问题
-            access_token = self.redis_client.get(keys["access_token"])
-            refresh_token = self.redis_client.get(keys["refresh_token"])
-            expire_time = self.redis_client.get(keys["expire_time"])
-            
-            if access_token and refresh_token and expire_time:
-                if int(time.time()) < (int(expire_time) - self.buffer_time):
-                    return access_token
-            
-            # 尝试刷新Token
-            if refresh_token:
-                try:
-                    new_access_token, new_refresh_token, new_expire = self._refresh_user_token(refresh_token)
-                    self.redis_client.set(keys["access_token"], new_access_token)
-                    self.redis_client.set(keys["refresh_token"], new_refresh_token)
-                    self.redis_client.set(keys["expire_time"], new_expire)
-                    return new_access_token
-                except Exception as e:
-                    print(f"刷新Token失败: {str(e)}")
-            
-            # 如果刷新失败，可能需要重新授权
-            raise Exception(f"用户 {user_id} 的Token已过期且无法刷新，请重新授权")
-    
+        return None
+
+    def _local_key(self, user_id):
+        return f"feishu_user_tokens:{self.app_id}:{user_id}"
+
+    def _save_local(self, user_id, access_token, refresh_token, expire_time):
+        self.local_cache.set(self._local_key(user_id), json.dumps([access_token, refresh_token, int(expire_time)]),
+                             LOCAL_TOKEN_TTL)
+
+    def _local_entry(self, user_id):
+        raw = self.local_cache.get(self._local_key(user_id))
+        return json.loads(raw) if raw else None
+
+    def _local_access_token(self, user_id):
+        """本地缓存中仍在有效期内的Access Token，没有时返回None"""
+        entry = self._local_entry(user_id)
+        if entry and int(time.time()) < (int(entry[2]) - self.buffer_time):
+            return entry[0]
+        return None
+
+    def _local_refresh_token(self, user_id):
+        entry = self._local_entry(user_id)
+        return entry[1] if entry else None
+
     def save_initial_tokens(self, user_id, access_token, refresh_token, expires_in):
         """保存初始获取的Tokens（从授权流程获得）"""
         keys = self._get_keys(user_id)
@@ -77,7 +128,7 @@ class FeishuUserTokenManager:
         }
         
         try:
-            response = requests.post(url, json=data, headers=headers)
+            response = http_session.post(url, json=data, headers=headers, timeout=REFRESH_REQUEST_TIMEOUT)
             response.raise_for_status()
             result = response.json()
             
@@ -92,30 +143,9 @@ class FeishuUserTokenManager:
         except Exception as e:
             raise Exception(f"调用刷新接口失败: {str(e)}")
     
-    def _redis_lock(self, lock_key, timeout=10):
-        """Redis分布式锁，避免并发刷新"""
-        return RedisLock(self.redis_client, lock_key, timeout)
-
-
-class RedisLock:
-    """简单的Redis分布式锁实现"""
-    def __init__(self, redis_client, lock_key, timeout):
-        self.redis_client = redis_client
-        self.lock_key = lock_key
-        self.timeout = timeout
-        self.locked = False
-
-    def __enter__(self):
-        # 尝试获取锁，设置过期时间避免死锁
-        self.locked = self.redis_client.set(
-            self.lock_key, "1", ex=self.timeout, nx=True
-        )
-        return self.locked
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.locked:
-            self.redis_client.delete(self.lock_key)
-        return False
+    def _redis_lock(self, lock_key, timeout=REFRESH_LOCK_TTL):
+        """Redis分布式锁，避免并发刷新；拿不到锁时等待而不是直接刷新"""
+        return DistributedLock(lock_key, self.redis_client, ttl=timeout, wait_timeout=timeout + 5)
 
 
 def load_env_file(path: str = ".env") -> None:
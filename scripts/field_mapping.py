@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+行情列 -> 多维表格字段 映射
+通过 FIELD_MAPPING 声明要写入的列及目标字段，按字段类型转换取值，
+所有列在同一批请求中写入。示例：
+FIELD_MAPPING='{"收盘": "Current Price", "涨跌幅": {"field": "Change", "type": "percent"}, "成交额": "fldXXXX"}'
+目标字段可以是字段名或字段 ID（fld 开头），未指定 type 时根据表格字段类型推断
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# 可写入的行情列
+QUOTE_FIELDS = ["开盘", "收盘", "最高", "最低", "成交量", "成交额", "振幅", "涨跌幅", "涨跌额", "换手率", "日期"]
+KEY_COLUMN = "股票名称"
+
+# 未指定类型时各列的默认转换方式
+COLUMN_KINDS = {
+    "成交量": "integer",
+    "涨跌幅": "percent",
+    "振幅": "percent",
+    "换手率": "percent",
+    "日期": "datetime",
+}
+
+# 多维表格字段类型编号：1 文本，2 数字，5 日期
+FIELD_TYPE_TEXT = 1
+FIELD_TYPE_NUMBER = 2
+FIELD_TYPE_DATETIME = 5
+
+
+class FieldMapping:
+    """单个 行情列 -> 表格字段 的映射"""
+
+    def __init__(self, column: str, field: str, kind: Optional[str] = None):
+        self.column = column
+        self.field = field
+        self.kind = kind
+
+    def __repr__(self) -> str:
+        return f"<FieldMapping {self.column} -> {self.field} ({self.kind or 'auto'})>"
+
+
+def load_field_mapping(default_field: str, spec: Optional[Dict[str, Any]] = None) -> List[FieldMapping]:
+    """解析字段映射，spec 未提供时读取 FIELD_MAPPING；均未配置时只写入 收盘 -> default_field"""
+    if spec is None:
+        raw = os.getenv("FIELD_MAPPING")
+        if not raw:
+            return [FieldMapping("收盘", default_field, "number")]
+        try:
+            spec = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"FIELD_MAPPING 不是合法的 JSON: {e}")
+
+    mappings = []
+    for column, target in spec.items():
+        if isinstance(target, dict):
+            mappings.append(FieldMapping(column, target["field"], target.get("type")))
+        else:
+            mappings.append(FieldMapping(column, str(target)))
+    return mappings
+
+
+def kind_from_schema(field: Dict[str, Any]) -> Optional[str]:
+    """根据字段元数据推断转换方式"""
+    field_type = field.get("type")
+    if field_type == FIELD_TYPE_TEXT:
+        return "text"
+    if field_type == FIELD_TYPE_DATETIME:
+        return "datetime"
+    if field_type == FIELD_TYPE_NUMBER:
+        if field.get("ui_type") == "Currency":
+            return "currency"
+        if "%" in (field.get("formatter") or ""):
+            return "percent"
+        return "number"
+    return None
+
+
+def resolve_mapping(mappings: List[FieldMapping], schema=None) -> List[FieldMapping]:
+    """将字段 ID 解析为字段名并补全转换方式，无法解析的映射被丢弃"""
+    fields: List[Dict[str, Any]] = []
+    ids = [m.field for m in mappings if m.field.startswith("fld")]
+    # 类型均已声明且没有字段 ID 时无需读取字段结构
+    if schema is not None and (ids or any(m.kind is None for m in mappings)):
+        try:
+            if ids:
+                # 存在未知字段 ID 时 resolve_many 会刷新一次缓存
+                schema.resolve_many(ids)
+            fields = schema.fields()
+        except Exception as e:
+            print(f"⚠️  读取字段结构失败，按列默认类型转换: {e}")
+    by_id = {f["field_id"]: f for f in fields}
+    by_name = {f["field_name"]: f for f in fields}
+
+    resolved = []
+    for m in mappings:
+        field = by_id.get(m.field) if m.field.startswith("fld") else by_name.get(m.field)
+        if m.field.startswith("fld") and field is None:
+            print(f"⚠️  未找到字段ID {m.field}，跳过列 {m.column}")
+            continue
+        name = field["field_name"] if field else m.field
+        kind = m.kind or (kind_from_schema(field) if field else None) or COLUMN_KINDS.get(m.column, "number")
+        resolved.append(FieldMapping(m.column, name, kind))
+    return resolved
+
+
+def coerce(value: Any, kind: str) -> Any:
+    """按字段类型转换取值，无法转换或为空时返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    if kind == "text":
+        return str(value)
+    if kind == "datetime":
+        # 日期字段取毫秒时间戳
+        if hasattr(value, "timestamp"):
+            return int(value.timestamp() * 1000)
+        try:
+            return int(datetime.fromisoformat(str(value)[:10]).timestamp() * 1000)
+        except ValueError:
+            return None
+
+    try:
+        number = float(str(value).rstrip("%")) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(number) or math.isinf(number):
+        return None
+    if kind == "percent":
+        # 行情中的百分比为 2.35 表示 2.35%，百分比字段存储 0.0235
+        return round(number / 100, 6)
+    if kind == "currency":
+        return round(number, 2)
+    if kind == "integer":
+        return int(round(number))
+    return number
+
+
+def build_cells(row: Dict[str, Any], mappings: List[FieldMapping]) -> Dict[str, Any]:
+    """将一行行情转换为 {字段名: 值}，跳过缺失或无效的列"""
+    cells = {}
+    for m in mappings:
+        value = coerce(row.get(m.column), m.kind or "number")
+        if value is not None:
+            cells[m.field] = value
+    return cells
+
+
+def load_quote_rows_from_frame(df, columns: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """从行情表读取 {股票名称: {列: 值}}"""
+    if df is None or df.empty:
+        return {}
+    columns = [c for c in dict.fromkeys(columns) if c in df.columns and c != KEY_COLUMN]
+    frame = df.loc[df[KEY_COLUMN].notna(), [KEY_COLUMN] + columns]
+    frame = frame.drop_duplicates(KEY_COLUMN, keep="last").set_index(KEY_COLUMN)
+    return frame.to_dict("index")
+
+
+def load_quote_rows_from_csv(csv_path: str, columns: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """从 CSV 读取 {股票名称: {列: 值}}，取值保持字符串，由 coerce 转换"""
+    import csv
+
+    columns = list(columns)
+    rows: Dict[str, Dict[str, Any]] = {}
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            name = row.get(KEY_COLUMN)
+            if name:
+                rows[name] = {c: row.get(c) for c in columns}
+    return rows
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+多维表格字段元数据缓存
+按 (app_token, table_id) 缓存字段 ID、名称与类型，依次查找 内存 -> Redis（可选） -> 本地文件，
+均未命中或已过期时才调用字段列表接口。写入返回字段不匹配类错误时应调用 invalidate()
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from atomic_file import atomic_write_json, file_lock
+from lazy_import import lazy_module
+from rate_limiter import call_with_backoff
+from redis_client import get_redis
+
+lark = lazy_module("lark_oapi")
+bitable = lazy_module("lark_oapi.api.bitable.v1")
+
+DEFAULT_SCHEMA_PATH = os.getenv("FIELD_SCHEMA_PATH", "data/field_schema.json")
+# 字段结构很少变化，默认缓存 7 天
+DEFAULT_SCHEMA_TTL = float(os.getenv("FIELD_SCHEMA_TTL", str(7 * 24 * 3600)))
+REDIS_KEY_PREFIX = "feishu_field_schema"
+
+# 表示字段不存在或值与字段类型不匹配的错误码，出现时说明缓存的字段结构已过时
+SCHEMA_ERROR_CODES = {
+    1254045,  # FieldNameNotFound
+    1254060,  # TextFieldConvFail
+    1254061,  # NumberFieldConvFail
+    1254062,  # SingleSelectFieldConvFail
+    1254063,  # MultiSelectFieldConvFail
+    1254064,  # DatetimeFieldConvFail
+    1254065,  # CheckboxFieldConvFail
+    1254066,  # UserFieldConvFail
+    1254067,  # LinkFieldConvFail
+}
+
+FieldInfo = Dict[str, Any]
+
+
+def is_schema_error(code: Optional[int]) -> bool:
+    return code in SCHEMA_ERROR_CODES
+
+
+def _redis_client():
+    """FIELD_SCHEMA_REDIS=1 且 Redis 可用时返回共享客户端，否则返回 None"""
+    if os.getenv("FIELD_SCHEMA_REDIS", "0") != "1":
+        return None
+    return get_redis()
+
+
+class FieldSchemaCache:
+    """单张数据表的字段元数据缓存"""
+
+    def __init__(self, client, option, app_token: str, table_id: str,
+                 path: str = DEFAULT_SCHEMA_PATH, ttl: float = DEFAULT_SCHEMA_TTL, redis_client=None):
+        self.client = client
+        self.option = option
+        self.app_token = app_token
+        self.table_id = table_id
+        self.path = path
+        self.ttl = ttl
+        self.redis_client = redis_client if redis_client is not None else _redis_client()
+        self._fields: Optional[List[FieldInfo]] = None
+
+    @property
+    def _cache_key(self) -> str:
+        return f"{self.app_token}/{self.table_id}"
+
+    # ---- 存储层 ----
+
+    def _read_file(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  字段缓存文件读取失败，忽略: {e}")
+            return {}
+
+    def _redis_get(self) -> Optional[Dict[str, Any]]:
+        if not self.redis_client:
+            return None
+        try:
+            raw = self.redis_client.get(f"{REDIS_KEY_PREFIX}:{self._cache_key}")
+            return json.loads(raw) if raw else None
+        except Exception:
+            return None
+
+    def _redis_set(self, entry: Dict[str, Any]) -> None:
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.setex(f"{REDIS_KEY_PREFIX}:{self._cache_key}", int(self.ttl),
+                                    json.dumps(entry, ensure_ascii=False))
+        except Exception:
+            pass
+
+    def _fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return bool(entry) and time.time() - entry.get("fetched_at", 0) <= self.ttl
+
+    # ---- 读取 ----
+
+    def fetch(self) -> List[FieldInfo]:
+        """分页调用字段列表接口"""
+        fields: List[FieldInfo] = []
+        page_token = None
+        while True:
+            builder = (
+                bitable.ListAppTableFieldRequest.builder()
+                .app_token(self.app_token)
+                .table_id(self.table_id)
+                .page_size(100)
+            )
+            if page_token:
+                builder = builder.page_token(page_token)
+            req = builder.build()
+            resp = call_with_backoff(
+                "bitable.meta.read", lambda: self.client.bitable.v1.app_table_field.list(req, self.option)
+            )
+            if not resp.success():
+                raise RuntimeError(f"获取字段列表失败，code={resp.code}, msg={resp.msg}, log_id={resp.get_log_id()}")
+            for item in resp.data.items or []:
+                fields.append({
+                    "field_id": item.field_id,
+                    "field_name": item.field_name,
+                    "type": item.type,
+                    "ui_type": item.ui_type,
+                    "formatter": item.property.formatter if item.property else None,
+                })
+            if not resp.data.has_more:
+                return fields
+            page_token = resp.data.page_token
+
+    def fields(self, refresh: bool = False) -> List[FieldInfo]:
+        """返回字段列表，refresh=True 时跳过缓存"""
+        if self._fields is not None and not refresh:
+            return self._fields
+
+        if not refresh:
+            entry = self._redis_get()
+            if not self._fresh(entry):
+                entry = self._read_file().get(self._cache_key)
+                if self._fresh(entry):
+                    self._redis_set(entry)
+            if self._fresh(entry):
+                self._fields = entry["fields"]
+                return self._fields
+
+        entry = {"fetched_at": time.time(), "fields": self.fetch()}
+        self._redis_set(entry)
+        with file_lock(self.path):
+            data = self._read_file()
+            data[self._cache_key] = entry
+            atomic_write_json(self.path, data)
+        self._fields = entry["fields"]
+        return self._fields
+
+    def resolve_many(self, field_ids: Iterable[str]) -> Dict[str, str]:
+        """批量将字段 ID 解析为字段名；存在未知 ID 时刷新一次缓存后重试"""
+        field_ids = list(field_ids)
+        by_id = {f["field_id"]: f["field_name"] for f in self.fields()}
+        if any(fid not in by_id for fid in field_ids):
+            by_id = {f["field_id"]: f["field_name"] for f in self.fields(refresh=True)}
+        return {fid: by_id[fid] for fid in field_ids if fid in by_id}
+
+    def resolve(self, field_id: str) -> Optional[str]:
+        return self.resolve_many([field_id]).get(field_id)
+
+    def field_types(self) -> Dict[str, int]:
+        """{字段名: 字段类型}"""
+        return {f["field_name"]: f["type"] for f in self.fields()}
+
+    def invalidate(self) -> None:
+        """清除所有层级的缓存，下次访问时重新拉取"""
+        self._fields = None
+        if self.redis_client:
+            try:
+                self.redis_client.delete(f"{REDIS_KEY_PREFIX}:{self._cache_key}")
+            except Exception:
+                pass
+        with file_lock(self.path):
+            data = self._read_file()
+            if data.pop(self._cache_key, None) is not None:
+                atomic_write_json(self.path, data)
@@ -1,6 +1,18 @@
-import akshare as ak
-import datetime
-import pandas as pd
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Tuple
+
+import http_session
+from lazy_import import lazy_module
+from price_store import PriceStore
+from quote_providers import QUOTE_COLUMNS, QuoteProvider, get_provider
+from rate_limiter import RateLimiter
+from resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, UpstreamGuard
+from trading_calendar import get_calendar
+
+pd = lazy_module("pandas")
 
 # 目标股票映射：股票名称 -> 股票代码
 target_stocks = {
@@ -14,51 +26,202 @@ target_stocks = {
     "科大国创": "300520"
 }
 
-def get_stock_prices():
-    """获取目标股票的前一天收盘价"""
-    # 获取前一天日期
-    today = datetime.date.today()
-    yesterday = today - datetime.timedelta(days=1)
-    date_str = yesterday.strftime("%Y%m%d")
-
-    print(f"获取 {date_str} 的股票价格数据...")
-
-    all_data = []
-
-    for stock_name, stock_code in target_stocks.items():
-        try:
-            print(f"正在获取 {stock_name} ({stock_code}) 的价格...")
-
-            # 获取股票历史数据
-            df = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="daily",
-                start_date=date_str,
-                end_date=date_str,
-                adjust=""
-            )
-
-            if not df.empty:
-                # 添加股票名称列
-                df['股票名称'] = stock_name
-                df['股票代码'] = stock_code
-                all_data.append(df)
-                print(f"  ✅ {stock_name}: {df.iloc[0]['收盘']}")
-            else:
-                print(f"  ❌ {stock_name}: 无数据")
-
-        except Exception as e:
-            print(f"  ❌ {stock_name}: 获取失败 - {e}")
+# 并发抓取配置：工作线程数与全局每秒请求上限（<=0 表示不限速）
+DEFAULT_MAX_WORKERS = int(os.getenv("STOCK_FETCH_WORKERS", "8"))
+DEFAULT_RATE_LIMIT = float(os.getenv("STOCK_FETCH_RPS", "5"))
+
+# 抓取模式：hist 逐只拉取日线；snapshot 一次拉取全市场实时行情再按观察列表过滤
+DEFAULT_FETCH_MODE = os.getenv("STOCK_FETCH_MODE", "hist")
+
+# 是否启用本地历史存储（快照数据为盘中价格，不写入历史存储）
+DEFAULT_USE_STORE = os.getenv("PRICE_STORE_ENABLED", "1") == "1"
+
+# 上游保护配置：重试次数、退避参数、延迟目标（秒）与熔断阈值
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+UPSTREAM_LATENCY_TARGET = float(os.getenv("UPSTREAM_LATENCY_TARGET", "3"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+
+# 输出文件路径（离线压测时可指向其他文件，避免覆盖线上数据）
+OUTPUT_PATH = os.getenv("STOCK_OUTPUT_PATH", "data/'all_stock.csv")
+
+# 输出列顺序，与 stock_zh_a_hist 保持一致，供更新阶段直接使用
+OUTPUT_COLUMNS = QUOTE_COLUMNS + ["股票名称"]
+
+
+def create_upstream_guard(max_workers: int = DEFAULT_MAX_WORKERS) -> UpstreamGuard:
+    """创建一次抓取任务共用的上游保护：熔断 + AIMD 并发（上限为线程数）+ 退避重试"""
+    return UpstreamGuard(
+        breaker=CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_SECONDS),
+        concurrency=AdaptiveConcurrencyLimiter(
+            initial_limit=max(1, max_workers), max_limit=max(1, max_workers),
+            latency_target=UPSTREAM_LATENCY_TARGET,
+        ),
+        retries=UPSTREAM_RETRIES,
+        base_delay=UPSTREAM_BACKOFF_BASE,
+        max_delay=UPSTREAM_BACKOFF_MAX,
+    )
+
+
+def fetch_stock_history(stock_name: str, stock_code: str, start_date: str, end_date: Optional[str] = None,
+                        limiter: Optional[RateLimiter] = None,
+                        raise_errors: bool = False,
+                        provider: Optional[QuoteProvider] = None,
+                        guard: Optional[UpstreamGuard] = None) -> Optional[pd.DataFrame]:
+    """获取单只股票 [start_date, end_date] 的日线行情，失败或无数据时返回 None
+
+    raise_errors=True 时请求异常会继续抛出，便于调用方区分“无数据”与“失败”
+    """
+    end_date = end_date or start_date
+    provider = provider or get_provider()
+    guard = guard or create_upstream_guard(1)
+    try:
+        # 获取股票历史数据（熔断、并发、限速与重试由 guard 统一控制）
+        df = guard.call(provider.fetch_history, stock_code, start_date, end_date, rate_limiter=limiter)
+
+        if not df.empty:
+            # 添加股票名称列
+            df['股票名称'] = stock_name
+            print(f"  ✅ {stock_name}: {df.iloc[-1]['收盘']}")
+            return df
+
+        print(f"  ❌ {stock_name}: 无数据")
+    except Exception as e:
+        print(f"  ❌ {stock_name}: 获取失败 - {e}")
+        if raise_errors:
+            raise
+    return None
+
+
+def fetch_with_store(stock_name: str, stock_code: str, date_str: str,
+                     limiter: Optional[RateLimiter] = None,
+                     store: Optional[PriceStore] = None,
+                     guard: Optional[UpstreamGuard] = None) -> Optional[pd.DataFrame]:
+    """优先读取本地历史存储，只对缺失的日期区间发起网络请求"""
+    if store is None:
+        return fetch_stock_history(stock_name, stock_code, date_str, limiter=limiter, guard=guard)
+
+    missing = store.missing_ranges(stock_code, date_str, date_str)
+    for start, end in missing:
+        df = fetch_stock_history(stock_name, stock_code, start.strftime("%Y%m%d"), end.strftime("%Y%m%d"),
+                                 limiter, guard=guard)
+        if df is not None:
+            store.write(df)
+
+    df = store.read(stock_code, date_str, date_str)
+    if df.empty:
+        return None
+    df['股票名称'] = stock_name
+    if not missing:
+        print(f"  ✅ {stock_name}: {df.iloc[-1]['收盘']} (本地缓存)")
+    return df
+
+
+def fetch_history_concurrently(stocks: Dict[str, str], date_str: str,
+                               max_workers: int = DEFAULT_MAX_WORKERS,
+                               rate_limit: float = DEFAULT_RATE_LIMIT,
+                               store: Optional[PriceStore] = None) -> Dict[str, pd.DataFrame]:
+    """并发逐只拉取日线，返回 {股票名称: DataFrame}"""
+    print(f"获取 {date_str} 的股票价格数据... (并发数: {max_workers}, 限速: {rate_limit}/s)")
+
+    limiter = RateLimiter(rate_limit)
+    guard = create_upstream_guard(max_workers)
+    results: Dict[str, pd.DataFrame] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(fetch_with_store, stock_name, stock_code, date_str, limiter, store, guard): stock_name
+            for stock_name, stock_code in stocks.items()
+        }
+        for future in as_completed(futures):
+            df = future.result()
+            if df is not None:
+                results[futures[future]] = df
+    return results
+
+
+def fetch_snapshot(stocks: Dict[str, str]) -> Tuple[Optional[pd.DataFrame], Dict[str, str]]:
+    """一次拉取全市场实时行情并过滤到观察列表
+
+    返回 (命中的行情, 快照中缺失的 {股票名称: 股票代码})
+    """
+    print(f"获取全市场实时快照... (观察列表: {len(stocks)} 只)")
+    try:
+        # 单次全市场请求同样经过熔断与退避重试
+        spot = create_upstream_guard(1).call(get_provider().fetch_snapshot, list(stocks.values()))
+    except Exception as e:
+        print(f"  ❌ 快照获取失败，全部回退到逐只拉取 - {e}")
+        return None, dict(stocks)
+
+    # 以观察列表为左表做一次向量化连接，名称沿用观察列表
+    watchlist = pd.DataFrame({"股票名称": list(stocks.keys()), "股票代码": list(stocks.values())})
+    merged = watchlist.merge(spot.drop_duplicates("股票代码"), on="股票代码", how="left")
+
+    hit = merged["收盘"].notna()
+    missing = dict(zip(merged.loc[~hit, "股票名称"], merged.loc[~hit, "股票代码"]))
+    matched = merged.loc[hit].copy()
+    if matched.empty:
+        return None, missing
+
+    matched = matched.reindex(columns=OUTPUT_COLUMNS)
+    for row in matched.itertuples(index=False):
+        print(f"  ✅ {row.股票名称}: {row.收盘}")
+    return matched.reset_index(drop=True), missing
+
+
+def get_stock_prices(stocks: Optional[Dict[str, str]] = None,
+                     max_workers: int = DEFAULT_MAX_WORKERS,
+                     rate_limit: float = DEFAULT_RATE_LIMIT,
+                     mode: str = DEFAULT_FETCH_MODE,
+                     use_store: bool = DEFAULT_USE_STORE,
+                     output_path: Optional[str] = OUTPUT_PATH):
+    """获取目标股票价格
+
+    hist 模式获取最近一个已收盘交易日的收盘价（并发抓取，全局限速）；
+    snapshot 模式使用全市场实时快照，快照缺失的股票回退到逐只拉取。
+    逐只拉取的日线会写入本地历史存储，已存在的日期不再请求网络。
+    output_path 为 None 时不落盘 CSV（进程内流水线直接使用返回的 DataFrame）。
+    """
+    provider = get_provider()
+    stocks = stocks or provider.default_watchlist() or target_stocks
+    store = PriceStore(provider.store_dir) if use_store else None
+
+    # 按交易日历取最近一个已收盘的交易日，避免请求周末和节假日
+    as_of = get_calendar().as_of_date()
+    if as_of is None:
+        print("❌ 交易日历中没有已收盘的交易日，无法确定行情日期")
+        return None
+    date_str = as_of.strftime("%Y%m%d")
+
+    results: Dict[str, pd.DataFrame] = {}
+    pending = dict(stocks)
+
+    if mode == "snapshot":
+        snapshot_df, pending = fetch_snapshot(stocks)
+        if snapshot_df is not None:
+            for name, group in snapshot_df.groupby("股票名称", sort=False):
+                results[name] = group
+        if pending:
+            print(f"快照中缺失 {len(pending)} 只股票，回退到逐只拉取: {', '.join(pending)}")
+
+    if pending:
+        results.update(fetch_history_concurrently(pending, date_str, max_workers, rate_limit, store))
+
+    # 按观察列表顺序合并，保持输出稳定
+    all_data = [results[name] for name in stocks if name in results]
 
     if all_data:
         # 合并所有数据
         combined_df = pd.concat(all_data, ignore_index=True)
 
         # 保存到CSV文件
-        output_path = "data/'all_stock.csv"
-        combined_df.to_csv(output_path, index=False, encoding='utf-8')
-        print(f"\n✅ 数据已保存到 {output_path}")
+        if output_path:
+            combined_df.to_csv(output_path, index=False, encoding='utf-8')
+            print(f"\n✅ 数据已保存到 {output_path}")
         print(f"共获取 {len(combined_df)} 条记录")
+        http_session.print_connection_stats()
 
         return combined_df
     else:
@@ -66,4 +229,6 @@ def get_stock_prices():
         return None
 
 if __name__ == "__main__":
-    get_stock_prices()
\ No newline at end of file
+    # akshare 内部直接调用 requests 模块级函数，接入共享连接池以复用 keep-alive 连接
+    http_session.install_global_session()
+    get_stock_prices()
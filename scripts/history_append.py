@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+历史行情表追加写入
+每只股票每个交易日一行，按 (股票代码, 日期) 去重。已写入的键记录在本地 SQLite 索引中，
+无需整表拉取即可跳过已存在的行；新行通过分块 batch_create 在限速内并发写入
+
+用法:
+    python scripts/history_append.py daily                       # 追加最新一日行情（抓取或读取 --csv）
+    python scripts/history_append.py backfill --start 2020-01-01 # 从本地日线存储批量导入
+    python scripts/history_append.py sync-index                  # 从表格重建本地索引（一次性）
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from batch_writer import BatchWriter
+from field_mapping import build_cells, load_field_mapping, resolve_mapping
+from field_schema import FieldSchemaCache, is_schema_error
+from lazy_import import lazy_module
+from rate_limiter import call_with_backoff
+from record_index import cell_text
+
+pd = lazy_module("pandas")
+lark = lazy_module("lark_oapi")
+bitable = lazy_module("lark_oapi.api.bitable.v1")
+
+DEFAULT_INDEX_PATH = os.getenv("HISTORY_INDEX_PATH", "data/history_index.sqlite3")
+# 历史表默认字段映射：行情列 -> 表格字段
+DEFAULT_HISTORY_MAPPING = {
+    "股票代码": {"field": "代码", "type": "text"},
+    "股票名称": {"field": "名称", "type": "text"},
+    "日期": {"field": "日期", "type": "datetime"},
+    "开盘": "开盘",
+    "收盘": "收盘",
+    "最高": "最高",
+    "最低": "最低",
+    "成交量": "成交量",
+    "成交额": "成交额",
+    "涨跌幅": "涨跌幅",
+    "换手率": "换手率",
+}
+# 回填时每累计这么多行提交一次，控制内存占用
+FLUSH_ROWS = int(os.getenv("HISTORY_FLUSH_ROWS", "5000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS appended (
+    app_token TEXT NOT NULL,
+    table_id TEXT NOT NULL,
+    code TEXT NOT NULL,
+    date TEXT NOT NULL,
+    record_id TEXT,
+    PRIMARY KEY (app_token, table_id, code, date)
+);
+"""
+
+
+def row_key(code: str, date: str) -> str:
+    return f"{code}|{date}"
+
+
+class HistoryIndex:
+    """已写入历史表的 (股票代码, 日期) 本地索引"""
+
+    def __init__(self, app_token: str, table_id: str, path: str = DEFAULT_INDEX_PATH):
+        self.app_token = app_token
+        self.table_id = table_id
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def existing(self, codes: Iterable[str], start: Optional[str] = None, end: Optional[str] = None) -> Set[str]:
+        """返回指定股票（及日期范围内）已写入的键集合"""
+        codes = list(codes)
+        sql = "SELECT code, date FROM appended WHERE app_token = ? AND table_id = ?"
+        params: List[Any] = [self.app_token, self.table_id]
+        if codes:
+            sql += f" AND code IN ({','.join('?' * len(codes))})"
+            params += codes
+        if start:
+            sql += " AND date >= ?"
+            params.append(start)
+        if end:
+            sql += " AND date <= ?"
+            params.append(end)
+        with self._connect() as conn:
+            return {row_key(code, date) for code, date in conn.execute(sql, params)}
+
+    def add(self, created: Dict[str, Optional[str]]) -> None:
+        """登记 {代码|日期: record_id}"""
+        rows = []
+        for key, record_id in created.items():
+            code, date = key.split("|", 1)
+            rows.append((self.app_token, self.table_id, code, date, record_id))
+        with self._lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO appended VALUES (?, ?, ?, ?, ?)", rows)
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM appended WHERE app_token = ? AND table_id = ?",
+                (self.app_token, self.table_id),
+            ).fetchone()[0]
+
+
+class HistoryAppender:
+    """将日线行情追加到历史表"""
+
+    def __init__(self, client, option, app_token: str, table_id: str,
+                 mapping_spec: Optional[Dict[str, Any]] = None, index: Optional[HistoryIndex] = None):
+        self.app_token = app_token
+        self.table_id = table_id
+        self.index = index or HistoryIndex(app_token, table_id)
+        self.schema = FieldSchemaCache(client, option, app_token, table_id)
+        self.mappings = resolve_mapping(load_field_mapping("", mapping_spec or DEFAULT_HISTORY_MAPPING),
+                                        self.schema)
+        self.writer = BatchWriter(client, option, app_token, table_id)
+        self.client = client
+        self.option = option
+
+    def build_creates(self, df) -> Dict[str, Dict[str, Any]]:
+        """行情表 -> {代码|日期: 新行字段}，同一键只保留最后一行"""
+        frame = df.dropna(subset=["股票代码", "日期"]).copy()
+        frame["股票代码"] = frame["股票代码"].astype(str).str.zfill(6)
+        frame["日期"] = pd.to_datetime(frame["日期"]).dt.strftime("%Y-%m-%d")
+        frame = frame.drop_duplicates(["股票代码", "日期"], keep="last")
+        keys = (frame["股票代码"] + "|" + frame["日期"]).tolist()
+        return {key: build_cells(row, self.mappings) for key, row in zip(keys, frame.to_dict("records"))}
+
+    def append(self, df) -> Tuple[int, int, int]:
+        """追加行情表中尚未写入的行，返回 (新建行数, 跳过行数, 失败行数)"""
+        from update_all import send_chunks
+        from write_outbox import OWNER_HISTORY, WriteOutbox
+
+        if df is None or df.empty:
+            return 0, 0, 0
+        creates = self.build_creates(df)
+        if not creates:
+            return 0, 0, 0
+        codes = sorted({key.split("|", 1)[0] for key in creates})
+        dates = sorted(key.split("|", 1)[1] for key in creates)
+        existing = self.index.existing(codes, dates[0], dates[-1])
+        new_rows = {key: cells for key, cells in creates.items() if key not in existing and cells}
+        skipped = len(creates) - len(new_rows)
+        if not new_rows:
+            return 0, skipped, 0
+
+        outbox = WriteOutbox() if os.getenv("OUTBOX_ENABLED", "1") == "1" else None
+        result = send_chunks(self.writer, outbox, "create", new_rows, OWNER_HISTORY)
+        if result.created:
+            self.index.add(result.created)
+        failed = sum(len(c.updates) for c in result.failed)
+        if any(is_schema_error(c.code) for c in result.failed):
+            self.schema.invalidate()
+        return len(result.created), skipped, failed
+
+    def sync_index(self, code_field: str = "代码", date_field: str = "日期") -> int:
+        """分页读取整张历史表重建本地索引，仅在索引丢失时使用"""
+        found: Dict[str, Optional[str]] = {}
+        page_token = None
+        while True:
+            builder = (
+                bitable.ListAppTableRecordRequest.builder()
+                .app_token(self.app_token)
+                .table_id(self.table_id)
+                .field_names(json.dumps([code_field, date_field], ensure_ascii=False))
+                .page_size(500)
+            )
+            if page_token:
+                builder = builder.page_token(page_token)
+            req = builder.build()
+            resp = call_with_backoff(
+                "bitable.record.read", lambda: self.client.bitable.v1.app_table_record.list(req, self.option)
+            )
+            if not resp.success():
+                raise RuntimeError(f"读取历史表失败，code={resp.code}, msg={resp.msg}")
+            for record in resp.data.items or []:
+                fields = record.fields or {}
+                code = cell_text(fields.get(code_field))
+                stamp = fields.get(date_field)
+                if not code or not isinstance(stamp, (int, float)):
+                    continue
+                date = datetime.datetime.fromtimestamp(stamp / 1000).strftime("%Y-%m-%d")
+                found[row_key(code.zfill(6), date)] = record.record_id
+            if not resp.data.has_more:
+                break
+            page_token = resp.data.page_token
+        self.index.add(found)
+        return len(found)
+
+
+def history_target() -> Tuple[str, str]:
+    app_token = os.getenv("HISTORY_APP_TOKEN") or os.getenv("APP_TOKEN", "U3iYbe8cGaBrLEso6jMctMVgnVb")
+    table_id = os.getenv("HISTORY_TABLE_ID")
+    if not table_id:
+        raise ValueError("未配置 HISTORY_TABLE_ID")
+    return app_token, table_id
+
+
+def load_history_mapping() -> Optional[Dict[str, Any]]:
+    raw = os.getenv("HISTORY_FIELD_MAPPING")
+    return json.loads(raw) if raw else None
+
+
+def create_appender(client=None, option=None) -> HistoryAppender:
+    if client is None:
+        from update_all import build_client_option
+
+        client, option = build_client_option()
+    app_token, table_id = history_target()
+    return HistoryAppender(client, option, app_token, table_id, load_history_mapping())
+
+
+def closed_bars(df, as_of: Optional[datetime.date] = None):
+    """只保留已收盘交易日的行情
+
+    盘中的实时快照以当天为日期，若先写入历史表，收盘后的真实收盘价会因 (代码, 日期) 已存在而被跳过
+    """
+    if df is None or df.empty:
+        return df
+    if as_of is None:
+        from trading_calendar import get_calendar
+
+        as_of = get_calendar().as_of_date()
+    if as_of is None:
+        return df.iloc[0:0]
+    dates = pd.to_datetime(df["日期"]).dt.date
+    return df[dates <= as_of]
+
+
+def append_daily(df, appender: Optional[HistoryAppender] = None) -> bool:
+    """追加一日行情（仅已收盘的日线），全部成功返回 True"""
+    bars = closed_bars(df)
+    pending = 0 if df is None else len(df) - len(bars)
+    if pending:
+        print(f"🗓️  {pending} 行行情所在交易日尚未收盘，暂不写入历史表")
+    if bars is None or bars.empty:
+        return True
+    appender = appender or create_appender()
+    created, skipped, failed = appender.append(bars)
+    print(f"🗓️  历史表追加: 新建 {created} 行，已存在跳过 {skipped} 行，失败 {failed} 行")
+    return failed == 0
+
+
+def backfill_history(codes: List[str], start: datetime.date, end: datetime.date,
+                     appender: Optional[HistoryAppender] = None) -> bool:
+    """从本地日线存储批量导入历史表，按 FLUSH_ROWS 分批提交"""
+    from get_stock_price import target_stocks
+    from price_store import PriceStore
+    from quote_providers import get_provider
+
+    provider = get_provider()
+    names = {code: name for name, code in (provider.default_watchlist() or target_stocks).items()}
+    store = PriceStore(provider.store_dir)
+    appender = appender or create_appender()
+
+    totals = [0, 0, 0]
+    buffer: List[Any] = []
+    buffered = 0
+    start_time = time.perf_counter()
+
+    def flush() -> None:
+        nonlocal buffer, buffered
+        if not buffer:
+            return
+        result = appender.append(pd.concat(buffer, ignore_index=True))
+        for i, value in enumerate(result):
+            totals[i] += value
+        buffer, buffered = [], 0
+
+    for code in codes:
+        df = store.read(code, start, end)
+        if df.empty:
+            print(f"  ⚠️  {code}: 本地存储无数据，请先运行 backfill.py")
+            continue
+        df = df.assign(股票名称=names.get(code, ""))
+        buffer.append(df)
+        buffered += len(df)
+        if buffered >= FLUSH_ROWS:
+            flush()
+    flush()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\n🗓️  历史表回填完成: 新建 {totals[0]} 行，跳过 {totals[1]} 行，失败 {totals[2]} 行，"
+          f"耗时 {elapsed:.1f}s ({totals[0] / elapsed if elapsed else 0:.0f} 行/秒)")
+    return totals[2] == 0
+
+
+def main() -> None:
+    from backfill import parse_date
+
+    parser = argparse.ArgumentParser(description="历史行情表追加写入")
+    sub = parser.add_subparsers(dest="command", required=True)
+    daily_parser = sub.add_parser("daily", help="追加行情 CSV 中的最新行情")
+    daily_parser.add_argument("--csv", default=None, help="行情 CSV 路径，默认直接抓取当前行情")
+    backfill_parser = sub.add_parser("backfill", help="从本地日线存储批量导入")
+    backfill_parser.add_argument("--symbols", help="逗号分隔的股票代码，默认使用观察列表")
+    backfill_parser.add_argument("--start", required=True, type=parse_date)
+    backfill_parser.add_argument("--end", type=parse_date, default=datetime.date.today())
+    sub.add_parser("sync-index", help="从表格重建本地 (代码, 日期) 索引")
+    args = parser.parse_args()
+
+    from update_all import load_env_file
+    import http_session
+
+    load_env_file()
+    http_session.install_global_session()
+
+    if args.command == "daily":
+        if args.csv:
+            df = pd.read_csv(args.csv, dtype={"股票代码": str})
+        else:
+            from get_stock_price import get_stock_prices
+
+            # 流水线默认不落盘 CSV，直接抓取当前行情
+            df = get_stock_prices(output_path=None)
+        ok = df is not None and append_daily(df)
+    elif args.command == "backfill":
+        from get_stock_price import target_stocks
+        from quote_providers import get_provider
+
+        watchlist = get_provider().default_watchlist() or target_stocks
+        if args.symbols:
+            codes = [c.strip().zfill(6) for c in args.symbols.split(",") if c.strip()]
+        else:
+            codes = list(watchlist.values())
+        ok = backfill_history(codes, args.start, args.end)
+    else:
+        appender = create_appender()
+        print(f"📇 已从历史表同步 {appender.sync_index()} 个键，本地索引共 {appender.index.count()} 个")
+        ok = True
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+进程级共享 HTTP 连接池
+所有出站请求复用同一个 requests.Session（keep-alive），避免重复 TCP/TLS 握手，
+并统计连接复用情况
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 连接池配置：缓存的主机数与每个主机的最大连接数
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "16"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "connections": 0}
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count("connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count("connections")
+        return super()._new_conn()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """记录新建连接数的 HTTPAdapter（重试交给调用方的退避逻辑处理）"""
+
+    def __init__(self, pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE):
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """获取进程级共享 Session（线程安全的懒加载）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = PooledHTTPAdapter()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.hooks["response"].append(lambda resp, *args, **kwargs: _count("requests"))
+                _session = session
+    return _session
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """通过共享 Session 发起请求，未指定超时时使用默认超时"""
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().request(method=method, url=url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
+
+
+def _pooled_request(method, url, **kwargs):
+    # lark_oapi 未配置超时时显式传入 timeout=None，同样改用默认超时，避免请求无限挂起
+    if kwargs.get("timeout") is None:
+        kwargs["timeout"] = DEFAULT_TIMEOUT
+    return get_session().request(method=method, url=url, **kwargs)
+
+
+def install_global_session() -> None:
+    """替换进程内的 requests.api.request / requests.request，使模块级调用也走共享连接池
+
+    akshare 与 lark_oapi 不接受外部传入的 Session，只能在进程范围内替换；
+    该替换影响整个进程，只应在命令行入口调用，库代码应直接使用本模块的 request/get/post
+    """
+    if os.getenv("HTTP_GLOBAL_SESSION", "1") != "1":
+        return
+    requests.api.request = _pooled_request
+    requests.request = _pooled_request
+
+
+def connection_stats() -> Dict[str, float]:
+    """返回请求数、新建连接数与复用率"""
+    with _stats_lock:
+        total, created = _stats["requests"], _stats["connections"]
+    reused = max(0, total - created)
+    return {
+        "requests": total,
+        "connections": created,
+        "reused": reused,
+        "reuse_ratio": round(reused / total, 3) if total else 0.0,
+    }
+
+
+def print_connection_stats(prefix: str = "") -> None:
+    stats = connection_stats()
+    if not stats["requests"]:
+        return
+    print(f"{prefix}🔗 HTTP 连接复用: 请求 {stats['requests']} 次，新建连接 {stats['connections']} 个，"
+          f"复用率 {stats['reuse_ratio']:.0%}")
@@ -1,14 +1,8 @@
+import datetime
 import os
-import subprocess
-import sys
 from pathlib import Path
 
-
-def run(cmd: list[str]) -> None:
-    print(f"[main] Running: {' '.join(cmd)}")
-    res = subprocess.run(cmd, stdout=sys.stdout, stderr=sys.stderr)
-    if res.returncode != 0:
-        raise SystemExit(res.returncode)
+from pipeline import PipelineError, run_pipeline
 
 
 def ensure_dirs() -> None:
@@ -16,14 +10,35 @@ def ensure_dirs() -> None:
     data_dir.mkdir(parents=True, exist_ok=True)
 
 
+def is_trading_day_today() -> bool:
+    # trading_calendar / quote_providers 在导入时读取 TRADE_CALENDAR_PATH、QUOTE_PROVIDER，需在加载 .env 之后导入
+    from trading_calendar import get_calendar
+
+    # FORCE_RUN=1 时忽略交易日历（手动补跑）
+    if os.getenv("FORCE_RUN") == "1":
+        return True
+    today = datetime.date.today()
+    if get_calendar().is_trading_day(today):
+        return True
+    print(f"[main] {today} 非交易日，跳过本次更新")
+    return False
+
+
 def main() -> None:
+    from update_all import load_env_file
+
+    # 先加载 .env，交易日历判断与数据源选择才能读到其中的配置
+    load_env_file()
     ensure_dirs()
-    # Use current interpreter to avoid env mismatch
-    py = sys.executable
-    run([py, "scripts/get_stock_price.py"])
-    run([py, "scripts/update_all.py"])
+    if not is_trading_day_today():
+        return
+    # 抓取与写入在同一进程内完成，行情数据在内存中传递
+    try:
+        run_pipeline()
+    except PipelineError as e:
+        print(f"[main] 流水线失败: {e}")
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
     main()
-
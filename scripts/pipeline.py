@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+进程内流水线
+在同一个解释器中依次执行 抓取 -> 转换 -> 写入 三个阶段，行情表在内存中传递，
+各阶段前后可挂载钩子（计时、落盘、校验等）
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Stage = Callable[["PipelineContext"], None]
+Hook = Callable[["PipelineContext", str], None]
+
+
+class PipelineError(Exception):
+    """某个阶段执行失败"""
+
+
+class PipelineContext:
+    """阶段间共享的运行状态"""
+
+    def __init__(self, **values: Any):
+        self.frame = None
+        self.name_to_price: Dict[str, float] = {}
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+        for key, value in values.items():
+            setattr(self, key, value)
+
+
+class Pipeline:
+    """按顺序执行的阶段列表，支持 before/after 钩子"""
+
+    def __init__(self, stages: Optional[List[Tuple[str, Stage]]] = None):
+        self.stages: List[Tuple[str, Stage]] = list(stages or [])
+        self._hooks: Dict[str, List[Tuple[str, Hook]]] = {"before": [], "after": []}
+
+    def add_stage(self, name: str, stage: Stage) -> "Pipeline":
+        self.stages.append((name, stage))
+        return self
+
+    def add_hook(self, when: str, hook: Hook, stage: str = "*") -> "Pipeline":
+        """注册钩子，when 为 before/after，stage 为阶段名或 * 表示所有阶段"""
+        if when not in self._hooks:
+            raise ValueError(f"未知的钩子时机: {when}")
+        self._hooks[when].append((stage, hook))
+        return self
+
+    def _run_hooks(self, when: str, name: str, ctx: PipelineContext) -> None:
+        for stage, hook in self._hooks[when]:
+            if stage in ("*", name):
+                hook(ctx, name)
+
+    def run(self, ctx: Optional[PipelineContext] = None) -> PipelineContext:
+        ctx = ctx or PipelineContext()
+        for name, stage in self.stages:
+            self._run_hooks("before", name, ctx)
+            start = time.perf_counter()
+            try:
+                stage(ctx)
+            finally:
+                ctx.timings[name] = time.perf_counter() - start
+            self._run_hooks("after", name, ctx)
+        return ctx
+
+
+def fetch_stage(ctx: PipelineContext) -> None:
+    from get_stock_price import get_stock_prices
+
+    # 行情表直接留在内存中，是否落盘由 save_csv_hook 决定
+    ctx.frame = get_stock_prices(output_path=None)
+    if ctx.frame is None or ctx.frame.empty:
+        raise PipelineError("未获取到任何股票数据")
+
+
+def transform_stage(ctx: PipelineContext) -> None:
+    from field_mapping import QUOTE_FIELDS, load_quote_rows_from_frame
+    from update_all import load_name_price_from_frame
+
+    ctx.name_to_price = load_name_price_from_frame(ctx.frame)
+    ctx.rows = load_quote_rows_from_frame(ctx.frame, QUOTE_FIELDS)
+    if not ctx.name_to_price:
+        raise PipelineError("行情表中没有可用的价格数据")
+
+
+def write_stage(ctx: PipelineContext) -> None:
+    from update_all import update_tables
+
+    # 一次抓取的行情并发写入所有目标，单个目标失败不影响其他目标
+    ctx.results["targets"] = update_tables(ctx.name_to_price, ctx.rows)
+    ctx.results["write"] = all(r["success"] for r in ctx.results["targets"].values())
+    if not ctx.results["write"]:
+        failed = [name for name, r in ctx.results["targets"].items() if not r["success"]]
+        raise PipelineError(f"写入多维表格失败: {', '.join(failed)}")
+
+
+def timing_hook(ctx: PipelineContext, stage: str) -> None:
+    print(f"[pipeline] {stage} 完成，耗时 {ctx.timings[stage]:.2f}s")
+
+
+def save_csv_hook(ctx: PipelineContext, stage: str) -> None:
+    """将抓取结果另存为 CSV，便于排查与兼容旧的独立脚本"""
+    from get_stock_price import OUTPUT_PATH
+
+    ctx.frame.to_csv(OUTPUT_PATH, index=False, encoding="utf-8")
+    print(f"[pipeline] 行情已另存到 {OUTPUT_PATH}")
+
+
+def history_hook(ctx: PipelineContext, stage: str) -> None:
+    """将本次行情追加到历史表，失败不影响主流程的结果"""
+    from history_append import append_daily
+
+    try:
+        ctx.results["history"] = append_daily(ctx.frame)
+    except Exception as e:
+        ctx.results["history"] = False
+        print(f"[pipeline] 历史表追加失败: {e}")
+
+
+def build_default_pipeline() -> Pipeline:
+    pipeline = Pipeline([
+        ("fetch", fetch_stage),
+        ("transform", transform_stage),
+        ("write", write_stage),
+    ])
+    pipeline.add_hook("after", timing_hook)
+    if os.getenv("PIPELINE_WRITE_CSV", "0") == "1":
+        pipeline.add_hook("after", save_csv_hook, stage="fetch")
+    if os.getenv("HISTORY_TABLE_ID"):
+        pipeline.add_hook("after", history_hook, stage="write")
+    return pipeline
+
+
+def run_pipeline() -> PipelineContext:
+    from update_all import load_env_file
+    import http_session
+
+    load_env_file()
+    http_session.install_global_session()
+    return build_default_pipeline().run()
+
+
+if __name__ == "__main__":
+    run_pipeline()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+本地行情历史存储模块
+按 股票代码/年份 分区保存 stock_zh_a_hist 返回的日线数据，
+优先使用 Parquet 列式格式，不可用时退回 CSV
+"""
+
+from __future__ import annotations
+
+import datetime
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from atomic_file import atomic_path, file_lock
+from lazy_import import lazy_module, module_available
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+PARQUET_AVAILABLE = module_available("pyarrow")
+_fallback_warned = False
+
+DEFAULT_STORE_DIR = os.getenv("PRICE_STORE_DIR", "data/history")
+
+# 日线主键列
+DATE_COLUMN = "日期"
+CODE_COLUMN = "股票代码"
+
+
+def _to_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return pd.Timestamp(str(value)).date()
+
+
+def _warn_csv_fallback() -> None:
+    global _fallback_warned
+    if not _fallback_warned:
+        _fallback_warned = True
+        print("⚠️  未安装 pyarrow，行情存储退回 CSV，每次写入会重写整个年度分区")
+
+
+class PriceStore:
+    """按 股票代码/年份 分区的日线存储"""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR, use_parquet: Optional[bool] = None):
+        self.root = root
+        self.use_parquet = PARQUET_AVAILABLE if use_parquet is None else use_parquet
+        if use_parquet is None and not PARQUET_AVAILABLE:
+            _warn_csv_fallback()
+        self.suffix = ".parquet" if self.use_parquet else ".csv"
+
+    def _partition_path(self, code: str, year: int, suffix: Optional[str] = None) -> str:
+        return os.path.join(self.root, str(code), f"{year}{suffix or self.suffix}")
+
+    def _read_partition(self, code: str, year: int) -> Optional[pd.DataFrame]:
+        # 兼容两种格式，便于切换存储格式后继续读取旧数据
+        for suffix in (self.suffix, ".csv" if self.use_parquet else ".parquet"):
+            path = self._partition_path(code, year, suffix)
+            if not os.path.exists(path):
+                continue
+            if suffix == ".parquet":
+                if not PARQUET_AVAILABLE:
+                    continue
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_csv(path, dtype={CODE_COLUMN: str}, encoding="utf-8")
+            df[DATE_COLUMN] = df[DATE_COLUMN].astype(str)
+            return df
+        return None
+
+    def _write_partition(self, code: str, year: int, df: pd.DataFrame) -> None:
+        # 原子替换，中途中断不会留下半个分区文件
+        with atomic_path(self._partition_path(code, year)) as tmp_path:
+            if self.use_parquet:
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.to_csv(tmp_path, index=False, encoding="utf-8")
+
+    def write(self, df: pd.DataFrame) -> int:
+        """写入日线数据（按 日期 去重，新数据覆盖旧数据），返回写入行数"""
+        if df is None or df.empty:
+            return 0
+
+        df = df.copy()
+        df[CODE_COLUMN] = df[CODE_COLUMN].astype(str).str.zfill(6)
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN]).dt.strftime("%Y-%m-%d")
+        years = df[DATE_COLUMN].str.slice(0, 4).astype(int)
+
+        written = 0
+        for (code, year), part in df.groupby([df[CODE_COLUMN], years]):
+            written += len(part)
+            path = self._partition_path(code, year)
+            # 同一分区的读改写需要串行，避免并发回填时互相覆盖
+            with file_lock(path):
+                existing = self._read_partition(code, year)
+                if existing is not None:
+                    part = pd.concat([existing, part], ignore_index=True)
+                part = (
+                    part.drop_duplicates(subset=[DATE_COLUMN], keep="last")
+                    .sort_values(DATE_COLUMN)
+                    .reset_index(drop=True)
+                )
+                self._write_partition(code, year, part)
+        return written
+
+    def read(self, code: str, start=None, end=None) -> pd.DataFrame:
+        """读取某只股票 [start, end] 区间的日线，无数据时返回空表"""
+        code = str(code).zfill(6)
+        code_dir = os.path.join(self.root, code)
+        if not os.path.isdir(code_dir):
+            return pd.DataFrame()
+
+        start_date = _to_date(start) if start is not None else None
+        end_date = _to_date(end) if end is not None else None
+        years = sorted({int(name.split(".")[0]) for name in os.listdir(code_dir) if name.split(".")[0].isdigit()})
+        if start_date:
+            years = [y for y in years if y >= start_date.year]
+        if end_date:
+            years = [y for y in years if y <= end_date.year]
+
+        parts = [p for p in (self._read_partition(code, y) for y in years) if p is not None]
+        if not parts:
+            return pd.DataFrame()
+
+        df = pd.concat(parts, ignore_index=True)
+        if start_date:
+            df = df[df[DATE_COLUMN] >= start_date.isoformat()]
+        if end_date:
+            df = df[df[DATE_COLUMN] <= end_date.isoformat()]
+        return df.reset_index(drop=True)
+
+    def existing_dates(self, code: str, start=None, end=None) -> set:
+        df = self.read(code, start, end)
+        if df.empty:
+            return set()
+        return set(df[DATE_COLUMN].tolist())
+
+    def missing_ranges(self, code: str, start, end,
+                       trading_days: Optional[Iterable] = None) -> List[Tuple[datetime.date, datetime.date]]:
+        """计算 [start, end] 内本地缺失的连续日期区间
+
+        trading_days 为候选交易日，缺省时按工作日估算
+        """
+        start_date, end_date = _to_date(start), _to_date(end)
+        if trading_days is None:
+            days = np.arange(np.datetime64(start_date), np.datetime64(end_date) + 1, dtype="datetime64[D]")
+            candidates = [d.astype(datetime.date) for d in days[np.is_busday(days)]]
+        else:
+            candidates = sorted(d for d in (_to_date(x) for x in trading_days) if start_date <= d <= end_date)
+
+        present = self.existing_dates(code, start_date, end_date)
+        ranges: List[Tuple[datetime.date, datetime.date]] = []
+        run_start = run_end = None
+        for day in candidates:
+            if day.isoformat() in present:
+                if run_start is not None:
+                    ranges.append((run_start, run_end))
+                    run_start = run_end = None
+                continue
+            if run_start is None:
+                run_start = day
+            run_end = day
+        if run_start is not None:
+            ranges.append((run_start, run_end))
+        return ranges
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+行情数据源抽象
+统一 “股票代码 + 日期区间 -> 标准化行情表” 接口：
+- akshare: 线上数据源
+- fixture: 确定性的本地合成/回放数据源，可离线生成数千只股票用于压测
+"""
+
+from __future__ import annotations
+
+import datetime
+import os
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+# 标准化行情列，与 stock_zh_a_hist 保持一致（股票名称由调用方补充）
+QUOTE_COLUMNS = ["日期", "股票代码", "开盘", "收盘", "最高", "最低", "成交量", "成交额",
+                 "振幅", "涨跌幅", "涨跌额", "换手率"]
+
+# 全市场快照（stock_zh_a_spot_em）列名 -> 日线列名
+SNAPSHOT_COLUMN_MAP = {
+    "代码": "股票代码",
+    "最新价": "收盘",
+    "今开": "开盘",
+}
+
+DEFAULT_PROVIDER = os.getenv("QUOTE_PROVIDER", "akshare")
+
+
+def snapshot_date() -> datetime.date:
+    """快照行情的日期：按交易日历取价格所属交易日，非交易日不会标成当天"""
+    from trading_calendar import get_calendar
+
+    return get_calendar().quote_date() or datetime.date.today()
+
+
+def normalize_quote_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """统一列顺序与类型：股票代码补齐 6 位，日期为 YYYY-MM-DD 字符串"""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=QUOTE_COLUMNS)
+    df = df.copy()
+    df["股票代码"] = df["股票代码"].astype(str).str.zfill(6)
+    df["日期"] = pd.to_datetime(df["日期"]).dt.strftime("%Y-%m-%d")
+    extra = [c for c in df.columns if c not in QUOTE_COLUMNS]
+    return df.reindex(columns=QUOTE_COLUMNS + extra)
+
+
+class QuoteProvider:
+    """行情数据源基类"""
+
+    name = "base"
+    # 本地历史存储目录，不同数据源互相隔离
+    store_dir = "data/history"
+
+    def fetch_history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """获取 [start_date, end_date]（YYYYMMDD）的日线，返回标准化行情表"""
+        raise NotImplementedError
+
+    def fetch_snapshot(self, symbols: Iterable[str]) -> pd.DataFrame:
+        """获取实时快照，返回标准化行情表（可包含 symbols 以外的股票）"""
+        raise NotImplementedError
+
+    def fetch_trading_days(self) -> List[datetime.date]:
+        raise NotImplementedError
+
+    def default_watchlist(self) -> Optional[Dict[str, str]]:
+        """数据源自带的观察列表，None 表示使用默认观察列表"""
+        return None
+
+
+class AkshareProvider(QuoteProvider):
+    """基于 akshare 的线上数据源"""
+
+    name = "akshare"
+
+    def __init__(self):
+        import akshare as ak
+
+        self.ak = ak
+
+    def fetch_history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        df = self.ak.stock_zh_a_hist(
+            symbol=symbol,
+            period="daily",
+            start_date=start_date,
+            end_date=end_date,
+            adjust=""
+        )
+        if df.empty:
+            return normalize_quote_frame(df)
+        df["股票代码"] = symbol
+        return normalize_quote_frame(df)
+
+    def fetch_snapshot(self, symbols: Iterable[str]) -> pd.DataFrame:
+        spot = self.ak.stock_zh_a_spot_em().rename(columns=SNAPSHOT_COLUMN_MAP)
+        spot["日期"] = snapshot_date().isoformat()
+        return normalize_quote_frame(spot)[QUOTE_COLUMNS]
+
+    def fetch_trading_days(self) -> List[datetime.date]:
+        # 新浪交易日历接口，含当年已公布的未来交易日
+        df = self.ak.tool_trade_date_hist_sina()
+        return [pd.Timestamp(d).date() for d in df["trade_date"].tolist()]
+
+
+class FixtureProvider(QuoteProvider):
+    """确定性的离线数据源
+
+    同一 (股票代码, 日期) 始终生成相同的行情，且只生成请求的日期窗口，内存占用与股票数量无关；
+    若 fixture_dir 下存在 <代码>.csv 则优先回放该文件，便于用录制的真实数据做回归
+    """
+
+    name = "fixture"
+    store_dir = "data/fixture/history"
+    origin = datetime.date(2015, 1, 1)
+    # 最多缓存的回放文件数
+    replay_cache_size = 64
+
+    def __init__(self, fixture_dir: Optional[str] = None, n_symbols: int = 0):
+        self.fixture_dir = fixture_dir
+        self.n_symbols = n_symbols
+        self._replays: "OrderedDict[str, Optional[pd.DataFrame]]" = OrderedDict()
+        self._days: Optional[np.ndarray] = None
+
+    def _last_day(self) -> datetime.date:
+        return datetime.date(datetime.date.today().year, 12, 31)
+
+    def _business_days(self) -> np.ndarray:
+        """origin 到今年年底的工作日（YYYY-MM-DD 字符串），所有股票共用一份"""
+        if self._days is None:
+            end = self._last_day() + datetime.timedelta(days=1)
+            days = np.arange(np.datetime64(self.origin), np.datetime64(end), dtype="datetime64[D]")
+            self._days = days[np.is_busday(days)].astype(str)
+        return self._days
+
+    @staticmethod
+    def synthetic_watchlist(n: int) -> Dict[str, str]:
+        """生成 n 只合成股票 {名称: 代码}，代码使用 9xxxxx 号段"""
+        if n > 100000:
+            raise ValueError("合成股票数量不能超过 100000")
+        return {f"合成{i:05d}": f"{900000 + i:06d}" for i in range(n)}
+
+    def default_watchlist(self) -> Optional[Dict[str, str]]:
+        return self.synthetic_watchlist(self.n_symbols) if self.n_symbols else None
+
+    def fetch_trading_days(self) -> List[datetime.date]:
+        return [datetime.date.fromisoformat(d) for d in self._business_days()]
+
+    def _replay(self, symbol: str) -> Optional[pd.DataFrame]:
+        """读取录制的 <代码>.csv，按 LRU 缓存最近使用的文件"""
+        if not self.fixture_dir:
+            return None
+        if symbol in self._replays:
+            self._replays.move_to_end(symbol)
+            return self._replays[symbol]
+        path = os.path.join(self.fixture_dir, f"{symbol}.csv")
+        replay = None
+        if os.path.exists(path):
+            replay = normalize_quote_frame(pd.read_csv(path, dtype={"股票代码": str}, encoding="utf-8"))
+        self._replays[symbol] = replay
+        if len(self._replays) > self.replay_cache_size:
+            self._replays.popitem(last=False)
+        return replay
+
+    @staticmethod
+    def _noise(seed: int, days: np.ndarray, stream: int) -> np.ndarray:
+        """由 (股票, 日期, 用途) 哈希得到 [0, 1) 均匀分布，同一输入始终得到相同结果"""
+        with np.errstate(over="ignore"):
+            x = days.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+            x ^= np.uint64(seed) * np.uint64(0xBF58476D1CE4E5B9) + np.uint64(stream)
+            # splitmix64 混合
+            x ^= x >> np.uint64(30)
+            x *= np.uint64(0xBF58476D1CE4E5B9)
+            x ^= x >> np.uint64(27)
+            x *= np.uint64(0x94D049BB133111EB)
+            x ^= x >> np.uint64(31)
+        return (x >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+    def _log_close(self, symbol: str, days: np.ndarray) -> np.ndarray:
+        """对数收盘价 = 基准价 + 若干周期波动 + 当日扰动，只依赖 (股票, 日期)"""
+        seed = zlib.crc32(symbol.encode("utf-8"))
+        params = np.random.default_rng(seed).random(7)
+        t = days.astype(np.int64).astype(np.float64)
+        level = np.log(5 + params[0] * 95)
+        for i, period in enumerate((60, 250, 1000)):
+            level = level + 0.1 * (i + 1) * np.sin(2 * np.pi * t / period + params[1 + i] * 2 * np.pi)
+        u1, u2 = self._noise(seed, days, 1), self._noise(seed, days, 2)
+        z = np.sqrt(-2 * np.log1p(-u1)) * np.cos(2 * np.pi * u2)
+        return level + 0.015 * z
+
+    def _generate(self, symbol: str, start: datetime.date, end: datetime.date) -> pd.DataFrame:
+        """生成 [start, end] 内工作日的日线"""
+        start, end = max(start, self.origin), min(end, self._last_day())
+        if start > end:
+            return pd.DataFrame(columns=QUOTE_COLUMNS)
+        days = np.arange(np.datetime64(start), np.datetime64(end + datetime.timedelta(days=1)),
+                         dtype="datetime64[D]")
+        days = days[np.is_busday(days)]
+        if len(days) == 0:
+            return pd.DataFrame(columns=QUOTE_COLUMNS)
+        prev_days = np.busday_offset(days, -1, roll="forward")
+
+        seed = zlib.crc32(symbol.encode("utf-8"))
+        close = np.round(np.exp(self._log_close(symbol, days)), 2)
+        prev_close = np.round(np.exp(self._log_close(symbol, prev_days)), 2)
+        n1, n2, n3, n4, n5 = (self._noise(seed, days, stream) for stream in range(3, 8))
+        open_ = np.round(prev_close * (1 + (n1 - 0.5) * 0.01), 2)
+        high = np.round(np.maximum(open_, close) * (1 + n2 * 0.02), 2)
+        low = np.round(np.minimum(open_, close) * (1 - n3 * 0.02), 2)
+        volume = (10_000 + n4 * 1_990_000).astype(np.int64)
+        return pd.DataFrame({
+            "日期": days.astype(str),
+            "股票代码": symbol,
+            "开盘": open_,
+            "收盘": close,
+            "最高": high,
+            "最低": low,
+            "成交量": volume,
+            "成交额": np.round(volume * close * 100, 2),
+            "振幅": np.round((high - low) / prev_close * 100, 2),
+            "涨跌幅": np.round((close / prev_close - 1) * 100, 2),
+            "涨跌额": np.round(close - prev_close, 2),
+            "换手率": np.round(n5 * 10, 2),
+        })
+
+    def fetch_history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        start, end = pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()
+        replay = self._replay(symbol)
+        if replay is None:
+            return self._generate(symbol, start, end)
+        mask = (replay["日期"] >= start.isoformat()) & (replay["日期"] <= end.isoformat())
+        return replay[mask].reset_index(drop=True)
+
+    def fetch_snapshot(self, symbols: Iterable[str]) -> pd.DataFrame:
+        day = snapshot_date()
+        rows = []
+        for symbol in symbols:
+            # 只取最近一周，覆盖周末与短假期
+            df = self.fetch_history(symbol, (day - datetime.timedelta(days=7)).strftime("%Y%m%d"),
+                                    day.strftime("%Y%m%d"))
+            if not df.empty:
+                rows.append(df.iloc[-1])
+        if not rows:
+            return pd.DataFrame(columns=QUOTE_COLUMNS)
+        snapshot = pd.DataFrame(rows).reset_index(drop=True)
+        snapshot["日期"] = day.isoformat()
+        return snapshot
+
+
+_providers: Dict[str, QuoteProvider] = {}
+
+
+def get_provider(name: Optional[str] = None) -> QuoteProvider:
+    """按名称获取数据源（进程内单例），缺省读取 QUOTE_PROVIDER 环境变量"""
+    name = name or DEFAULT_PROVIDER
+    if name not in _providers:
+        if name == "akshare":
+            _providers[name] = AkshareProvider()
+        elif name == "fixture":
+            _providers[name] = FixtureProvider(
+                fixture_dir=os.getenv("FIXTURE_DIR"),
+                n_symbols=int(os.getenv("FIXTURE_SYMBOLS", "0")),
+            )
+        else:
+            raise ValueError(f"未知的行情数据源: {name}")
+    return _providers[name]
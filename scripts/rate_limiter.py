@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+请求速率限制模块
+基于令牌桶算法，控制每秒请求数，避免触发上游限流。
+- RateLimiter: 进程内、线程安全
+- DistributedRateLimiter: 基于 Redis 的跨进程令牌桶，Redis 不可用时退回进程内实现
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+
+class RateLimiter:
+    """线程安全的令牌桶限速器"""
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        # rate_per_second <= 0 表示不限速
+        self.rate = float(rate_per_second)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """阻塞直到获取到一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait_time = self._blocked_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    # 按流逝时间补充令牌，不超过桶容量
+                    self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+    def penalize(self, seconds: float) -> None:
+        """上游返回限流错误后暂停发放令牌"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+# 令牌桶脚本：以 Redis 服务器时间计算补充量，返回需要等待的毫秒数（0 表示已取得令牌）
+_ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local blocked = tonumber(redis.call('GET', key .. ':blocked') or '0')
+if blocked > now then
+    return blocked - now
+end
+
+local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+# 限流惩罚：在服务器时间基础上设置暂停截止时间，并清空令牌
+_PENALIZE_SCRIPT = """
+local key = KEYS[1]
+local ms = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local until_ms = now + ms
+local current = tonumber(redis.call('GET', key .. ':blocked') or '0')
+if until_ms > current then
+    redis.call('SET', key .. ':blocked', until_ms, 'PX', ms)
+end
+redis.call('HSET', key, 'tokens', 0, 'ts', now)
+return until_ms
+"""
+
+RATE_LIMIT_KEY_PREFIX = "feishu_rate_limit"
+
+
+class DistributedRateLimiter:
+    """跨进程令牌桶：同一 Redis 上相同 key 的所有线程与进程共享配额"""
+
+    def __init__(self, key: str, rate_per_second: float, burst: int = 1, redis_client=None):
+        self.key = f"{RATE_LIMIT_KEY_PREFIX}:{key}"
+        self.rate = float(rate_per_second)
+        self.capacity = max(1, int(burst))
+        self.redis_client = redis_client
+        # Redis 不可用或脚本执行失败时使用的进程内令牌桶
+        self.local = RateLimiter(rate_per_second, burst)
+        self._acquire_script = None
+        self._penalize_script = None
+        if redis_client is not None:
+            self._acquire_script = redis_client.register_script(_ACQUIRE_SCRIPT)
+            self._penalize_script = redis_client.register_script(_PENALIZE_SCRIPT)
+
+    def _fallback(self, e: Exception) -> None:
+        print(f"⚠️  限速器 Redis 调用失败，改用进程内限速: {e}")
+        self._acquire_script = None
+        self._penalize_script = None
+
+    def acquire(self) -> None:
+        if self._acquire_script is None or self.rate <= 0:
+            self.local.acquire()
+            return
+        while True:
+            try:
+                wait_ms = int(self._acquire_script(keys=[self.key], args=[self.rate, self.capacity]))
+            except Exception as e:
+                self._fallback(e)
+                self.local.acquire()
+                return
+            if wait_ms <= 0:
+                return
+            time.sleep(wait_ms / 1000)
+
+    def penalize(self, seconds: float) -> None:
+        self.local.penalize(seconds)
+        if self._penalize_script is None:
+            return
+        try:
+            self._penalize_script(keys=[self.key], args=[max(1, int(seconds * 1000))])
+        except Exception as e:
+            self._fallback(e)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+# 飞书开放平台接口的默认频率（次/秒），可通过 FEISHU_RPS_<ENDPOINT> 覆盖
+ENDPOINT_RATES = {
+    "bitable.record.write": float(os.getenv("BITABLE_WRITE_RPS", "5")),
+    "bitable.record.read": float(os.getenv("BITABLE_READ_RPS", "10")),
+    "bitable.meta.read": float(os.getenv("BITABLE_META_RPS", "10")),
+}
+DEFAULT_ENDPOINT_RATE = float(os.getenv("FEISHU_DEFAULT_RPS", "10"))
+
+# 表示触发频率限制的错误码：99991400 开放平台通用限流，1254290 多维表格限流
+RATE_LIMIT_CODES = {99991400, 1254290}
+# 触发限流错误码后的最大重试次数
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+
+_api_limiters: Dict[Tuple[str, str], DistributedRateLimiter] = {}
+_api_limiters_lock = threading.Lock()
+
+
+def is_rate_limited(code: Optional[int]) -> bool:
+    return code in RATE_LIMIT_CODES or code == 429
+
+
+def get_api_limiter(endpoint: str, app_id: Optional[str] = None) -> DistributedRateLimiter:
+    """返回按 (应用, 接口) 共享的限速器；RATE_LIMIT_BACKEND=local 时只在进程内共享"""
+    app_id = app_id or os.getenv("APP_ID") or "default"
+    key = (app_id, endpoint)
+    with _api_limiters_lock:
+        if key not in _api_limiters:
+            env_key = "FEISHU_RPS_" + endpoint.upper().replace(".", "_")
+            rate = float(os.getenv(env_key, ENDPOINT_RATES.get(endpoint, DEFAULT_ENDPOINT_RATE)))
+            redis_client = None
+            if os.getenv("RATE_LIMIT_BACKEND", "redis") == "redis":
+                from redis_client import get_redis
+
+                redis_client = get_redis()
+            _api_limiters[key] = DistributedRateLimiter(f"{app_id}:{endpoint}", rate, redis_client=redis_client)
+        return _api_limiters[key]
+
+
+def call_with_backoff(limiter: Union[str, Any], request: Callable[[], Any],
+                      retries: int = RATE_LIMIT_RETRIES, label: str = "请求"):
+    """在限速器内发起请求，返回最后一次响应
+
+    limiter 可以是限速器实例或接口名；响应为限流错误码时让共享同一配额的所有线程/进程一起暂停后重试
+    """
+    from resilience import backoff_delay
+
+    if isinstance(limiter, str):
+        limiter = get_api_limiter(limiter)
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        resp = request()
+        if not is_rate_limited(resp.code) or attempt == retries:
+            return resp
+        delay = backoff_delay(attempt, base_delay=1.0, max_delay=16.0)
+        print(f"⚠️  {label}触发限流 code={resp.code}，{delay:.1f}s 后重试")
+        limiter.penalize(delay)
+    return resp
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+多维表格记录索引
+分页读取整张表，按键字段（默认 Name）建立 {键值: record_id} 映射并缓存到本地。
+缓存同时记录表格 revision：revision 未变化时直接复用；变化时只对缺失的键做定向查询，
+不必整表重新拉取
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from atomic_file import atomic_write_json, file_lock
+from lazy_import import lazy_module
+from rate_limiter import call_with_backoff
+
+lark = lazy_module("lark_oapi")
+bitable = lazy_module("lark_oapi.api.bitable.v1")
+
+DEFAULT_INDEX_PATH = os.getenv("RECORD_INDEX_PATH", "data/record_index.json")
+# 表格中用于匹配行情的键字段
+DEFAULT_KEY_FIELD = os.getenv("RECORD_KEY_FIELD", "Name")
+# 超过该时长强制整表重建，以发现改名与删除的行
+DEFAULT_MAX_AGE = float(os.getenv("RECORD_INDEX_MAX_AGE", str(7 * 24 * 3600)))
+
+# 记录列表接口单页最多 500 条
+LIST_PAGE_SIZE = 500
+# 定向查询时每个 filter 中包含的键数量，避免公式过长
+LOOKUP_CHUNK = 20
+
+
+class RecordIndexError(Exception):
+    """读取表格记录失败"""
+
+
+def cell_text(value: Any) -> Optional[str]:
+    """将单元格值转为文本：兼容纯文本、富文本分段与数字"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, list):
+        parts = [seg.get("text", "") if isinstance(seg, dict) else str(seg) for seg in value]
+        return "".join(parts).strip()
+    if isinstance(value, dict):
+        return str(value.get("text", "")).strip()
+    return str(value)
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class RecordIndex:
+    """{键值: record_id} 索引，带本地缓存与 revision 校验"""
+
+    def __init__(self, client, option, app_token: str, table_id: str,
+                 key_field: str = DEFAULT_KEY_FIELD, path: str = DEFAULT_INDEX_PATH,
+                 max_age: float = DEFAULT_MAX_AGE):
+        self.client = client
+        self.option = option
+        self.app_token = app_token
+        self.table_id = table_id
+        self.key_field = key_field
+        self.path = path
+        self.max_age = max_age
+        self.records: Dict[str, str] = {}
+        self.revision: Optional[int] = None
+        self.built_at = 0.0
+        self._load()
+
+    @property
+    def _cache_key(self) -> str:
+        return f"{self.app_token}/{self.table_id}"
+
+    def _read_cache(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  记录索引缓存读取失败，将重新构建: {e}")
+            return {}
+
+    def _load(self) -> None:
+        entry = self._read_cache().get(self._cache_key)
+        # 键字段变化后旧索引无效
+        if not entry or entry.get("key_field") != self.key_field:
+            return
+        self.records = entry.get("records", {})
+        self.revision = entry.get("revision")
+        self.built_at = entry.get("built_at", 0.0)
+
+    def save(self) -> None:
+        with file_lock(self.path):
+            data = self._read_cache()
+            data[self._cache_key] = {
+                "key_field": self.key_field,
+                "revision": self.revision,
+                "built_at": self.built_at,
+                "records": self.records,
+            }
+            atomic_write_json(self.path, data)
+
+    def fetch_revision(self) -> Optional[int]:
+        """读取数据表当前 revision，失败时返回 None"""
+        page_token = None
+        while True:
+            builder = bitable.ListAppTableRequest.builder().app_token(self.app_token).page_size(100)
+            if page_token:
+                builder = builder.page_token(page_token)
+            req = builder.build()
+            resp = call_with_backoff(
+                "bitable.meta.read", lambda: self.client.bitable.v1.app_table.list(req, self.option)
+            )
+            if not resp.success():
+                lark.logger.warning(f"获取数据表 revision 失败，code={resp.code}, msg={resp.msg}")
+                return None
+            for table in resp.data.items or []:
+                if table.table_id == self.table_id:
+                    return table.revision
+            if not resp.data.has_more:
+                return None
+            page_token = resp.data.page_token
+
+    def _list(self, filter_formula: Optional[str] = None) -> Dict[str, str]:
+        """分页列出记录，返回 {键值: record_id}"""
+        found: Dict[str, str] = {}
+        page_token = None
+        while True:
+            builder = (
+                bitable.ListAppTableRecordRequest.builder()
+                .app_token(self.app_token)
+                .table_id(self.table_id)
+                .field_names(json.dumps([self.key_field], ensure_ascii=False))
+                .page_size(LIST_PAGE_SIZE)
+            )
+            if filter_formula:
+                builder = builder.filter(filter_formula)
+            if page_token:
+                builder = builder.page_token(page_token)
+            req = builder.build()
+            resp = call_with_backoff(
+                "bitable.record.read", lambda: self.client.bitable.v1.app_table_record.list(req, self.option)
+            )
+            if not resp.success():
+                raise RecordIndexError(f"code={resp.code}, msg={resp.msg}, log_id={resp.get_log_id()}")
+            for record in resp.data.items or []:
+                key = cell_text((record.fields or {}).get(self.key_field))
+                if key:
+                    # 键重复时保留第一条，并提示表格存在重复行
+                    if key in found and found[key] != record.record_id:
+                        lark.logger.warning(f"键 {key} 对应多条记录，使用 {found[key]}")
+                        continue
+                    found[key] = record.record_id
+            if not resp.data.has_more:
+                return found
+            page_token = resp.data.page_token
+
+    def rebuild(self, revision: Optional[int] = None) -> None:
+        """整表分页重建索引"""
+        start = time.perf_counter()
+        self.records = self._list()
+        self.revision = revision if revision is not None else self.fetch_revision()
+        self.built_at = time.time()
+        print(f"📇 记录索引已重建: {len(self.records)} 行，耗时 {time.perf_counter() - start:.2f}s")
+
+    def lookup(self, keys: Iterable[str]) -> Dict[str, str]:
+        """对指定键做定向查询并并入索引"""
+        keys = list(keys)
+        found: Dict[str, str] = {}
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[i:i + LOOKUP_CHUNK]
+            conditions = [f"CurrentValue.[{self.key_field}]={_quote(k)}" for k in chunk]
+            formula = conditions[0] if len(conditions) == 1 else f"OR({','.join(conditions)})"
+            found.update(self._list(formula))
+        self.records.update(found)
+        return found
+
+    def resolve(self, keys: Iterable[str]) -> Dict[str, str]:
+        """返回 {键值: record_id}，必要时刷新索引并写回缓存
+
+        - 无缓存或缓存过期：整表重建
+        - revision 变化且存在未知键：只查询这些键（新增的行）
+        - revision 未变化：直接使用缓存
+        """
+        keys = list(dict.fromkeys(keys))
+        expired = not self.records or time.time() - self.built_at > self.max_age
+        if expired:
+            self.rebuild()
+            self.save()
+        else:
+            missing = [k for k in keys if k not in self.records]
+            if missing:
+                revision = self.fetch_revision()
+                if revision is None or revision != self.revision:
+                    found = self.lookup(missing)
+                    if found:
+                        print(f"📇 记录索引新增 {len(found)} 行: {', '.join(found)}")
+                    self.revision = revision
+                    self.save()
+        return {k: self.records[k] for k in keys if k in self.records}
+
+    def add(self, records: Dict[str, str]) -> None:
+        """并入新建行的 {键值: record_id}"""
+        self.records.update(records)
+        self.save()
+
+    def drop(self, record_ids: Iterable[str]) -> None:
+        """移除已失效的 record_id（如行被删除），下次运行时重新查询"""
+        stale = set(record_ids)
+        self.records = {k: rid for k, rid in self.records.items() if rid not in stale}
+        self.save()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+进程级共享 Redis 客户端
+Token 管理、字段缓存与限速器共用同一个连接池；redis 未安装或连不上时返回 None，
+调用方退回到进程内实现
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from lazy_import import lazy_module, module_available
+
+REDIS_AVAILABLE = module_available("redis")
+redis = lazy_module("redis") if REDIS_AVAILABLE else None
+
+# 连接/读写超时，Redis 不可达时尽快退回内存实现
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+
+_clients: Dict[Tuple[str, int], Optional[object]] = {}
+_clients_lock = threading.Lock()
+
+
+def get_redis(host: Optional[str] = None, port: Optional[int] = None):
+    """返回 (host, port) 对应的共享客户端，首次创建时探测一次连通性，不可用时返回 None"""
+    if not REDIS_AVAILABLE:
+        return None
+    host = host or os.getenv("REDIS_HOST", "localhost")
+    port = int(port or os.getenv("REDIS_PORT", "6379"))
+    key = (host, port)
+    if key in _clients:
+        return _clients[key]
+
+    with _clients_lock:
+        if key not in _clients:
+            client = redis.Redis(
+                host=host,
+                port=port,
+                decode_responses=True,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            )
+            try:
+                client.ping()
+                print(f"✅ Redis连接成功 ({host}:{port})")
+            except Exception as e:
+                print(f"⚠️  Redis连接失败，使用内存实现: {e}")
+                client = None
+            _clients[key] = client
+    return _clients[key]
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+单飞（single-flight）刷新锁
+先取进程内锁，再取 Redis 锁：拿不到时轮询等待而不是直接放行；
+锁值为随机 owner token，释放时用 Lua 比较后删除，避免误删他人的锁；
+每次加锁递增 fencing 计数，写回结果时校验计数，锁过期后的旧持有者无法覆盖新结果。
+Redis 不可用时退化为只有进程内锁
+"""
+
+import itertools
+import random
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+DEFAULT_LOCK_TTL = 10
+DEFAULT_WAIT_TIMEOUT = 15
+DEFAULT_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+# 仅当锁仍由自己持有时删除
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 锁仍由自己持有且 fencing 计数未被后来者推进时，才写入各键
+_GUARDED_SET_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[2]) then
+    return 0
+end
+for i = 3, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[i])
+end
+return 1
+"""
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_fences: Dict[str, "itertools.count"] = {}
+_registry_lock = threading.Lock()
+
+
+class LockTimeout(Exception):
+    """在等待时间内未能获得锁"""
+
+
+def _local_lock(name: str) -> threading.Lock:
+    with _registry_lock:
+        if name not in _local_locks:
+            _local_locks[name] = threading.Lock()
+            _local_fences[name] = itertools.count(1)
+        return _local_locks[name]
+
+
+class DistributedLock:
+    """进程内锁 + Redis 锁，阻塞等待直到获得锁或超时
+
+    用法:
+        with DistributedLock("feishu_token_lock:app", redis_client) as lock:
+            ...  # 再次检查缓存，仍需要时才刷新
+            lock.guarded_set({"key": "value"})
+    """
+
+    def __init__(self, name: str, redis_client=None, ttl: float = DEFAULT_LOCK_TTL,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.name = name
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.owner = uuid.uuid4().hex
+        self.fence: Optional[int] = None
+        self.distributed = False
+        self._local = _local_lock(name)
+        self._local_held = False
+
+    @property
+    def fence_key(self) -> str:
+        return f"{self.name}:fence"
+
+    def acquire(self) -> None:
+        deadline = time.monotonic() + self.wait_timeout
+        if not self._local.acquire(timeout=self.wait_timeout):
+            raise LockTimeout(f"等待进程内锁超时: {self.name}")
+        self._local_held = True
+        try:
+            if self.redis_client is None or not self._acquire_redis(deadline):
+                self.fence = next(_local_fences[self.name])
+        except BaseException:
+            self._release_local()
+            raise
+
+    def _acquire_redis(self, deadline: float) -> bool:
+        """轮询获取 Redis 锁；Redis 出错时返回 False 退化为进程内锁，超时抛出 LockTimeout"""
+        interval = self.poll_interval
+        while True:
+            try:
+                if self.redis_client.set(self.name, self.owner, px=int(self.ttl * 1000), nx=True):
+                    self.fence = int(self.redis_client.incr(self.fence_key))
+                    self.distributed = True
+                    return True
+            except Exception as e:
+                print(f"⚠️  Redis锁不可用，仅使用进程内锁: {e}")
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LockTimeout(f"等待Redis锁超时: {self.name}")
+            time.sleep(min(remaining, interval * (0.5 + random.random())))
+            interval = min(MAX_POLL_INTERVAL, interval * 2)
+
+    def release(self) -> None:
+        try:
+            if self.distributed:
+                try:
+                    self.redis_client.eval(_RELEASE_SCRIPT, 1, self.name, self.owner)
+                except Exception as e:
+                    # 锁带有过期时间，释放失败时等待自然过期
+                    print(f"⚠️  释放Redis锁失败: {e}")
+                self.distributed = False
+        finally:
+            self._release_local()
+
+    def _release_local(self) -> None:
+        if self._local_held:
+            self._local_held = False
+            self._local.release()
+
+    def guarded_set(self, values: Dict[str, object]) -> bool:
+        """在仍持有锁时写入多个键，返回是否写入成功
+
+        未使用 Redis 锁时直接写入；加锁时 Redis 已出错而退化为进程内锁的，写入失败返回 False 而不抛出
+        """
+        if not self.distributed:
+            if self.redis_client is not None:
+                try:
+                    self.redis_client.mset(values)
+                except Exception as e:
+                    print(f"⚠️  Redis写入失败: {e}")
+                    return False
+            return True
+        keys = [self.name, self.fence_key] + list(values)
+        args = [self.owner, self.fence] + list(values.values())
+        return bool(self.redis_client.eval(_GUARDED_SET_SCRIPT, len(keys), *keys, *args))
+
+    def __enter__(self) -> "DistributedLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
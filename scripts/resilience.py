@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+上游调用保护模块
+- 带抖动的指数退避重试
+- AIMD 自适应并发：根据延迟与错误率加性增、乘性减
+- 熔断器：上游持续失败时快速失败，避免长时间挂起
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被拒绝"""
+
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 8.0) -> float:
+    """第 attempt 次重试前的等待时间（full jitter）"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """三态熔断器：closed -> open -> half_open -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """调用前检查，熔断打开时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    raise CircuitOpenError("上游熔断中，快速失败")
+                # 冷却结束，放少量探测请求
+                self.state = self.HALF_OPEN
+                self._half_open_calls = 0
+            if self.state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError("上游熔断探测中，快速失败")
+                self._half_open_calls += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                print("🔌 上游恢复，熔断器关闭")
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🔌 上游连续失败 {self._failures} 次，熔断 {self.recovery_timeout:.0f}s")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 自适应并发限制
+
+    成功且延迟低于目标时并发上限加性增加（每个“窗口”约 +1），
+    失败或超出延迟目标时乘性减少
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int = 1, max_limit: Optional[int] = None,
+                 latency_target: float = 3.0, decrease_factor: float = 0.5):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or initial_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, success: bool) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if success and latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                # 同一延迟窗口内只收缩一次，避免并发失败导致骤降到底
+                now = time.monotonic()
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            self._cond.notify_all()
+
+
+class UpstreamGuard:
+    """组合熔断、自适应并发、速率限制与退避重试的上游调用包装"""
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None,
+                 concurrency: Optional[AdaptiveConcurrencyLimiter] = None,
+                 retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.breaker = breaker or CircuitBreaker()
+        self.concurrency = concurrency
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def call(self, func: Callable, *args, rate_limiter=None, **kwargs):
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            if self.concurrency:
+                self.concurrency.acquire()
+            start = time.monotonic()
+            success = False
+            try:
+                if rate_limiter:
+                    rate_limiter.acquire()
+                    start = time.monotonic()
+                result = func(*args, **kwargs)
+                success = True
+            except Exception:
+                # 熔断器按调用计数：重试耗尽后只记一次失败；半开探测失败时立即记录，不再重试
+                if attempt >= self.retries or self.breaker.state == CircuitBreaker.HALF_OPEN:
+                    self.breaker.record_failure()
+                    raise
+            finally:
+                if self.concurrency:
+                    self.concurrency.release(time.monotonic() - start, success)
+
+            if success:
+                self.breaker.record_success()
+                return result
+            time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
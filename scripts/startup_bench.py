@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+启动耗时分析与基准
+- report: 基于 python -X importtime 输出各模块导入耗时排行
+- bench:  多次冷启动更新链路的入口模块，中位数超过预算时以非零状态退出
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 更新链路入口模块（main.py -> pipeline -> update_all / get_stock_price）
+UPDATE_PATH_MODULES = ["main", "pipeline", "update_all", "get_stock_price"]
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "500"))
+
+
+def _run_python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SCRIPTS_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return subprocess.run([sys.executable, *flags, "-c", code], env=env, capture_output=True, text=True)
+
+
+def import_times(modules: List[str]) -> List[Tuple[str, int, int]]:
+    """返回 [(模块名, 自身耗时us, 累计耗时us)]"""
+    result = _run_python(f"import {', '.join(modules)}", "-X", "importtime")
+    if result.returncode != 0:
+        raise RuntimeError(f"导入失败:\n{result.stderr}")
+
+    rows: List[Tuple[str, int, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def report(modules: List[str], top: int) -> None:
+    rows = import_times(modules)
+    # 顶层依赖按累计耗时排行，能直接看出是哪个第三方包拖慢了启动
+    top_level: Dict[str, int] = {}
+    for name, _, cumulative in rows:
+        if "." not in name:
+            top_level[name] = max(top_level.get(name, 0), cumulative)
+
+    print(f"📦 导入 {', '.join(modules)}: 共 {len(rows)} 个模块")
+    print(f"\n{'累计(ms)':>10}  顶层包")
+    for name, cumulative in sorted(top_level.items(), key=lambda x: -x[1])[:top]:
+        print(f"{cumulative / 1000:>10.1f}  {name}")
+
+    print(f"\n{'自身(ms)':>10}  模块")
+    for name, self_us, _ in sorted(rows, key=lambda x: -x[1])[:top]:
+        print(f"{self_us / 1000:>10.1f}  {name}")
+
+
+def bench(modules: List[str], runs: int, budget_ms: float) -> bool:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = _run_python(f"import {', '.join(modules)}")
+        elapsed = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f"导入失败:\n{result.stderr}")
+        timings.append(elapsed)
+
+    median = statistics.median(timings)
+    print(f"⏱️  冷启动 {', '.join(modules)}: 中位数 {median:.0f}ms "
+          f"(最小 {min(timings):.0f}ms, 最大 {max(timings):.0f}ms, {runs} 次), 预算 {budget_ms:.0f}ms")
+    if median > budget_ms:
+        print("❌ 超出启动耗时预算，请运行 report 子命令定位耗时模块")
+        return False
+    print("✅ 启动耗时在预算内")
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="启动耗时分析与基准")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = sub.add_parser("report", help="输出模块导入耗时排行")
+    report_parser.add_argument("modules", nargs="*", default=UPDATE_PATH_MODULES)
+    report_parser.add_argument("--top", type=int, default=15)
+
+    bench_parser = sub.add_parser("bench", help="冷启动基准，超出预算时失败")
+    bench_parser.add_argument("modules", nargs="*", default=UPDATE_PATH_MODULES)
+    bench_parser.add_argument("--runs", type=int, default=5)
+    bench_parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+
+    args = parser.parse_args()
+    if args.command == "report":
+        report(args.modules, args.top)
+    else:
+        sys.exit(0 if bench(args.modules, args.runs, args.budget_ms) else 1)
+
+
+if __name__ == "__main__":
+    main()
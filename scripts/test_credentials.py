@@ -7,6 +7,8 @@ import os
 import requests
 import json
 
+import http_session
+
 
 def load_env_file(path: str = ".env") -> None:
     """加载环境变量文件"""
@@ -46,7 +48,7 @@ def test_get_app_access_token(app_id: str, app_secret: str) -> None:
     print(f"   请求数据: {json.dumps(data, indent=2, ensure_ascii=False)}")
 
     try:
-        response = requests.post(url, json=data, headers=headers, timeout=10)
+        response = http_session.post(url, json=data, headers=headers, timeout=10)
         print(f"\n📡 响应状态码: {response.status_code}")
         print(f"📡 响应头: {dict(response.headers)}")
 
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+分层 Token 缓存
+L1 进程内 TTL 缓存 -> L2 Redis（共享连接池）-> L3 本地加密文件。
+读取时逐层查找，下层命中后回填上层；写入时同时写入所有可用层。
+L3 文件可通过 GitHub Actions 缓存跨运行保留，没有 Redis 的 CI 也不必每次重新获取 Token
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from atomic_file import atomic_path, file_lock
+from lazy_import import lazy_module, module_available
+
+CRYPTO_AVAILABLE = module_available("cryptography")
+fernet = lazy_module("cryptography.fernet") if CRYPTO_AVAILABLE else None
+
+DEFAULT_TOKEN_CACHE_PATH = os.getenv("TOKEN_CACHE_PATH", "data/token_cache.bin")
+
+TIERS = ("l1", "l2", "l3")
+
+# L1 在进程内所有实例间共享
+_memory: Dict[str, Tuple[str, float]] = {}
+
+
+def derive_key(secret: str) -> bytes:
+    """由应用密钥派生 Fernet 密钥，密钥变化后旧文件自然无法解密"""
+    digest = hashlib.sha256(f"feishu-token-cache:{secret}".encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest)
+
+
+class TieredTokenCache:
+    """三层 Token 缓存，值统一为字符串，各层分别统计命中与未命中次数"""
+
+    def __init__(self, redis_client=None, secret: Optional[str] = None,
+                 path: str = DEFAULT_TOKEN_CACHE_PATH):
+        self.redis_client = redis_client
+        self.path = path
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {tier: {"hit": 0, "miss": 0} for tier in TIERS}
+        # 没有 cryptography 或密钥时不启用 L3，避免明文落盘
+        self._fernet = fernet.Fernet(derive_key(secret)) if (CRYPTO_AVAILABLE and secret and path) else None
+
+    def _count(self, tier: str, hit: bool) -> None:
+        with self._lock:
+            self.counters[tier]["hit" if hit else "miss"] += 1
+
+    # ---- L1 ----
+    def _l1_get(self, key: str) -> Optional[str]:
+        entry = _memory.get(key)
+        if entry and time.time() < entry[1]:
+            return entry[0]
+        _memory.pop(key, None)
+        return None
+
+    def _l1_set(self, key: str, value: str, expire_at: float) -> None:
+        _memory[key] = (value, expire_at)
+
+    # ---- L2 ----
+    def _l2_get(self, key: str) -> Tuple[Optional[str], float]:
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.get(key)
+            pipe.ttl(key)
+            value, ttl = pipe.execute()
+        except Exception:
+            return None, 0.0
+        if value is None or ttl is None or ttl <= 0:
+            return None, 0.0
+        return value, time.time() + ttl
+
+    def _l2_set(self, key: str, value: str, ttl: int) -> None:
+        try:
+            self.redis_client.setex(key, ttl, value)
+        except Exception:
+            pass
+
+    # ---- L3 ----
+    def _l3_read(self) -> Dict[str, list]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(self._fernet.decrypt(f.read()))
+        except Exception:
+            # 文件损坏或密钥已变化，视为空缓存
+            return {}
+
+    def _l3_get(self, key: str) -> Tuple[Optional[str], float]:
+        entry = self._l3_read().get(key)
+        if entry and time.time() < entry[1]:
+            return entry[0], entry[1]
+        return None, 0.0
+
+    def _l3_set(self, key: str, value: str, expire_at: float) -> None:
+        with file_lock(self.path):
+            now = time.time()
+            data = {k: v for k, v in self._l3_read().items() if v[1] > now}
+            data[key] = [value, expire_at]
+            with atomic_path(self.path, file_mode=0o600) as tmp_path:
+                with open(tmp_path, "wb") as f:
+                    f.write(self._fernet.encrypt(json.dumps(data).encode("utf-8")))
+
+    def get(self, key: str, shared_only: bool = False) -> Optional[str]:
+        """逐层读取；shared_only 时跳过 L1，直接读其他进程也能写入的 L2/L3"""
+        if not shared_only:
+            value = self._l1_get(key)
+            self._count("l1", value is not None)
+            if value is not None:
+                return value
+
+        if self.redis_client is not None:
+            value, expire_at = self._l2_get(key)
+            self._count("l2", value is not None)
+            if value is not None:
+                self._l1_set(key, value, expire_at)
+                return value
+
+        if self._fernet is not None:
+            value, expire_at = self._l3_get(key)
+            self._count("l3", value is not None)
+            if value is not None:
+                self._l1_set(key, value, expire_at)
+                remaining = int(expire_at - time.time())
+                if self.redis_client is not None and remaining > 0:
+                    self._l2_set(key, value, remaining)
+                return value
+        return None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        expire_at = time.time() + ttl
+        self._l1_set(key, value, expire_at)
+        if self.redis_client is not None:
+            self._l2_set(key, value, ttl)
+        if self._fernet is not None:
+            try:
+                self._l3_set(key, value, expire_at)
+            except OSError as e:
+                print(f"⚠️  Token 缓存文件写入失败: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各层命中/未命中次数，未启用的层不计数"""
+        with self._lock:
+            return {tier: dict(c) for tier, c in self.counters.items()}
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+A股交易日历模块
+本地缓存交易所交易日历，提供 O(1) 的“是否交易日”“上一交易日”查询，
+避免在周末和节假日发起无效的行情请求
+"""
+
+import datetime
+import os
+from typing import Dict, List, Optional
+
+from atomic_file import atomic_path, file_lock
+
+DEFAULT_CALENDAR_PATH = os.getenv("TRADE_CALENDAR_PATH", "data/trade_calendar.csv")
+
+# A股交易时段（北京时间）
+MORNING_SESSION = (datetime.time(9, 30), datetime.time(11, 30))
+AFTERNOON_SESSION = (datetime.time(13, 0), datetime.time(15, 0))
+MARKET_CLOSE = AFTERNOON_SESSION[1]
+
+
+def _parse_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = str(value).strip().replace("-", "")[:8]
+    return datetime.datetime.strptime(text, "%Y%m%d").date()
+
+
+class TradingCalendar:
+    """交易日历，初始化时预计算逐日索引，查询均为 O(1)"""
+
+    def __init__(self, trading_days: List[datetime.date]):
+        self.days = sorted(set(trading_days))
+        self._trading_set = set(self.days)
+        # 日历范围内每个自然日 -> 严格早于它的最近交易日
+        self._prev_map: Dict[datetime.date, Optional[datetime.date]] = {}
+        if self.days:
+            prev = None
+            cursor = self.days[0]
+            last = self.days[-1] + datetime.timedelta(days=1)
+            while cursor <= last:
+                self._prev_map[cursor] = prev
+                if cursor in self._trading_set:
+                    prev = cursor
+                cursor += datetime.timedelta(days=1)
+
+    @property
+    def first_day(self) -> Optional[datetime.date]:
+        return self.days[0] if self.days else None
+
+    @property
+    def last_day(self) -> Optional[datetime.date]:
+        return self.days[-1] if self.days else None
+
+    def covers(self, day) -> bool:
+        day = _parse_date(day)
+        return bool(self.days) and self.days[0] <= day <= self.days[-1]
+
+    def is_trading_day(self, day) -> bool:
+        return _parse_date(day) in self._trading_set
+
+    def previous_trading_day(self, day) -> Optional[datetime.date]:
+        """严格早于 day 的最近交易日"""
+        day = _parse_date(day)
+        if day in self._prev_map:
+            return self._prev_map[day]
+        if self.days and day > self.days[-1]:
+            return self.days[-1]
+        return None
+
+    def is_session_open(self, now: Optional[datetime.datetime] = None) -> bool:
+        """当前是否处于连续竞价交易时段"""
+        now = now or datetime.datetime.now()
+        if not self.is_trading_day(now.date()):
+            return False
+        t = now.time()
+        return any(start <= t <= end for start, end in (MORNING_SESSION, AFTERNOON_SESSION))
+
+    def as_of_date(self, now: Optional[datetime.datetime] = None) -> Optional[datetime.date]:
+        """最近一个已收盘的交易日：交易日收盘后取当天，否则取上一交易日"""
+        now = now or datetime.datetime.now()
+        today = now.date()
+        if self.is_trading_day(today) and now.time() >= MARKET_CLOSE:
+            return today
+        return self.previous_trading_day(today)
+
+    def quote_date(self, now: Optional[datetime.datetime] = None) -> Optional[datetime.date]:
+        """实时快照中价格所属的交易日：交易日开盘后为当天，否则为最近一个已收盘的交易日"""
+        now = now or datetime.datetime.now()
+        if self.is_trading_day(now.date()) and now.time() >= MORNING_SESSION[0]:
+            return now.date()
+        return self.as_of_date(now)
+
+    def trading_days_between(self, start, end) -> List[datetime.date]:
+        start, end = _parse_date(start), _parse_date(end)
+        return [d for d in self.days if start <= d <= end]
+
+
+def _weekday_calendar(year: int) -> List[datetime.date]:
+    """接口不可用时的兜底：按工作日估算（不含法定节假日）"""
+    cursor = datetime.date(year - 1, 1, 1)
+    end = datetime.date(year, 12, 31)
+    days = []
+    while cursor <= end:
+        if cursor.weekday() < 5:
+            days.append(cursor)
+        cursor += datetime.timedelta(days=1)
+    return days
+
+
+def _load_cached(path: str) -> List[datetime.date]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return [_parse_date(line) for line in lines[1:]]
+
+
+def _save_cached(path: str, days: List[datetime.date]) -> None:
+    with file_lock(path), atomic_path(path) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("trade_date\n")
+            for d in days:
+                f.write(f"{d.isoformat()}\n")
+
+
+_calendar: Optional[TradingCalendar] = None
+
+
+def get_calendar(path: str = DEFAULT_CALENDAR_PATH, today: Optional[datetime.date] = None) -> TradingCalendar:
+    """获取交易日历（进程内单例）
+
+    优先读取本地缓存；缓存缺失或未覆盖今天时才请求一次接口并更新缓存。
+    非线上数据源（如 fixture）直接由数据源生成日历，不读写本地缓存
+    """
+    from quote_providers import get_provider
+
+    global _calendar
+    today = today or datetime.date.today()
+    if _calendar is not None and _calendar.covers(today):
+        return _calendar
+
+    provider = get_provider()
+    if provider.name != "akshare":
+        _calendar = TradingCalendar(provider.fetch_trading_days())
+        return _calendar
+
+    days = _load_cached(path)
+    if not days or days[-1] < today:
+        try:
+            days = provider.fetch_trading_days()
+            _save_cached(path, days)
+            print(f"📅 交易日历已更新: {days[0]} ~ {days[-1]} ({len(days)} 个交易日)")
+        except Exception as e:
+            if not days:
+                print(f"⚠️  交易日历获取失败，按工作日估算: {e}")
+                days = _weekday_calendar(today.year)
+            else:
+                print(f"⚠️  交易日历更新失败，继续使用本地缓存: {e}")
+
+    _calendar = TradingCalendar(days)
+    return _calendar
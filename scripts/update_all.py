@@ -1,10 +1,31 @@
+from __future__ import annotations
+
 import csv
 import json
 import os
-from typing import Dict, List, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import http_session
+from batch_writer import BatchResult, BatchWriter, ChunkResult
+from delta_sync import TableSnapshot, diff_updates, fetch_remote_state, load_tolerances
+from field_mapping import (
+    QUOTE_FIELDS,
+    FieldMapping,
+    build_cells,
+    load_field_mapping,
+    load_quote_rows_from_csv,
+    resolve_mapping,
+)
+from field_schema import FieldSchemaCache, is_schema_error
+from lazy_import import lazy_module
+from record_index import RecordIndex
+from write_confirm import confirm_writes, print_confirm
+from write_outbox import OWNER_TABLE, WriteOutbox, client_token
 
-import lark_oapi as lark
-from lark_oapi.api.bitable.v1 import *
+# lark_oapi 导入耗时较长，延迟到首次使用时再加载
+lark = lazy_module("lark_oapi")
 
 # 导入App Token管理器
 try:
@@ -38,6 +59,17 @@ def load_name_price_from_csv(csv_path: str) -> Dict[str, float]:
     return name_to_price
 
 
+# 从内存中的行情表读取 {股票名称: 收盘价} 映射（进程内流水线使用，无需落盘 CSV）
+def load_name_price_from_frame(df) -> Dict[str, float]:
+    import pandas as pd
+
+    if df is None or df.empty:
+        return {}
+    prices = pd.to_numeric(df["收盘"], errors="coerce")
+    valid = df["股票名称"].notna() & prices.notna()
+    return dict(zip(df.loc[valid, "股票名称"], prices[valid].astype(float)))
+
+
 def load_env_file(path: str = ".env") -> None:
     if not os.path.exists(path):
         return
@@ -60,42 +92,95 @@ def load_env_file(path: str = ".env") -> None:
         pass
 
 
-def build_records(name_to_price: Dict[str, float], field_key: str) -> List[AppTableRecord]:
-    # 建立飞书多维表格中 record_id 与股票名称的映射
-    targets = [
-        {"record_id": "rec25ORoaS06hp", "name": "通富微电"},
-        {"record_id": "rec25ORoaS06yw", "name": "英维克"},
-        {"record_id": "rec25ORoaS06IZ", "name": "拓尔思"},
-        {"record_id": "rec25ORoaS06Sp", "name": "两面针"},
-        {"record_id": "rec25ORoaS0714", "name": "科大讯飞"},
-        {"record_id": "rec25ORoaS078B", "name": "金山办公"},
-        {"record_id": "rec25ORoaS07fT", "name": "中科曙光"},
-        {"record_id": "rec25ORoaS07ns", "name": "科大国创"},
-    ]
-
-    records: List[AppTableRecord] = []
-    for t in targets:
-        name = t["name"]
-        record_id = t["record_id"]
-        price = name_to_price.get(name)
-        if price is None:
-            lark.logger.warning(f"未在 CSV 中找到 {name} 的最新价，跳过该记录: {record_id}")
+# 未启用记录索引或索引不可用时使用的固定映射 {股票名称: record_id}
+LEGACY_TARGETS: Dict[str, str] = {
+    "通富微电": "rec25ORoaS06hp",
+    "英维克": "rec25ORoaS06yw",
+    "拓尔思": "rec25ORoaS06IZ",
+    "两面针": "rec25ORoaS06Sp",
+    "科大讯飞": "rec25ORoaS0714",
+    "金山办公": "rec25ORoaS078B",
+    "中科曙光": "rec25ORoaS07fT",
+    "科大国创": "rec25ORoaS07ns",
+}
+
+# 记录已被删除时 batch_update 返回的错误码
+RECORD_NOT_FOUND_CODE = 1254043
+
+
+def resolve_targets(client, option, app_token: str, table_id: str,
+                    names) -> Tuple[Dict[str, str], Optional[RecordIndex]]:
+    """通过记录索引获取 {股票名称: record_id}，索引不可用时退回固定映射（索引返回 None）"""
+    if os.getenv("RECORD_INDEX", "1") != "1":
+        return dict(LEGACY_TARGETS), None
+    try:
+        index = RecordIndex(client, option, app_token, table_id)
+        targets = index.resolve(names)
+    except Exception as e:
+        lark.logger.warning(f"记录索引不可用，使用固定映射: {e}")
+        return dict(LEGACY_TARGETS), None
+    unmatched = len(set(names)) - len(targets)
+    if unmatched:
+        print(f"[INFO] {unmatched} 只股票在表格中没有对应行")
+    return targets, index
+
+
+def build_row_updates(rows: Dict[str, Dict[str, Any]], mappings: List[FieldMapping],
+                      targets: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """按字段映射生成 {record_id: {字段名: 值}}，rows 为 {股票名称: {列: 值}}"""
+    updates: Dict[str, Dict[str, Any]] = {}
+    for name, record_id in targets.items():
+        row = rows.get(name)
+        if row is None:
+            lark.logger.warning(f"未在 CSV 中找到 {name} 的行情，跳过该记录: {record_id}")
             continue
-        rec = (
-            AppTableRecord.builder()
-            .record_id(record_id)
-            # 仅更新价格字段，避免无意义覆盖名称
-            .fields({field_key: price})
-            .build()
-        )
-        records.append(rec)
-    return records
+        # 只写入映射中的字段，避免无意义覆盖名称
+        cells = build_cells(row, mappings)
+        if cells:
+            updates[record_id] = cells
+    return updates
+
+
+def build_row_creates(rows: Dict[str, Dict[str, Any]], mappings: List[FieldMapping],
+                      existing: Dict[str, str], key_field: str) -> Dict[str, Dict[str, Any]]:
+    """为表格中尚不存在的股票生成 {股票名称: 新行字段}，键字段写入股票名称"""
+    creates: Dict[str, Dict[str, Any]] = {}
+    for name, row in rows.items():
+        if name in existing:
+            continue
+        cells = build_cells(row, mappings)
+        if cells:
+            creates[name] = {key_field: name, **cells}
+    return creates
+
+
+def filter_changed(client, option, app_token: str, table_id: str,
+                   updates: Dict[str, Dict[str, float]], snapshot: TableSnapshot) -> Dict[str, Dict[str, float]]:
+    """增量同步：与已知表格状态比较，只保留变化的单元格
+
+    DELTA_SOURCE=snapshot 使用本地快照（默认，无额外请求）；
+    DELTA_SOURCE=remote 批量读取表格当前值，读取失败时退回本地快照
+    """
+    known = None
+    if os.getenv("DELTA_SOURCE", "snapshot") == "remote":
+        known = fetch_remote_state(client, option, app_token, table_id, list(updates))
+    if known is None:
+        known = snapshot.get(app_token, table_id)
+
+    default_tolerance = float(os.getenv("DELTA_TOLERANCE", "1e-6"))
+    changed = diff_updates(updates, known, load_tolerances(), default_tolerance)
+    skipped = len(updates) - len(changed)
+    if skipped:
+        print(f"[INFO] 增量同步: {skipped} 条记录无变化已跳过，{len(changed)} 条需要写入")
+    return changed
 
 
 # SDK 使用说明: https://open.feishu.cn/document/uAjLw4CM/ukTMukTMukTM/server-side-sdk/python--sdk/preparations-before-development
 def main():
     # 尝试加载 .env 文件中的配置（若存在）
     load_env_file()
+    # lark SDK 与 Token 获取共用进程级连接池
+    http_session.install_global_session()
     # 读取 CSV（注意文件名中包含单引号）
     csv_path = "data/'all_stock.csv"
     if not os.path.exists(csv_path):
@@ -105,22 +190,85 @@ def main():
     if not name_to_price:
         raise RuntimeError("CSV 未解析到任何价格数据，请检查文件格式与编码")
 
-    # 读取字段配置，优先使用 ID -> 映射到字段名（避免使用 field_key 参数）
-    target_field_id = os.getenv("TARGET_FIELD_ID")
+    rows = load_quote_rows_from_csv(csv_path, QUOTE_FIELDS)
+    update_table(name_to_price, rows)
+
+
+class BitableTarget:
+    """一个写入目标：多维表格 app + 数据表 + 字段映射"""
+
+    def __init__(self, app_token: str, table_id: str, name: Optional[str] = None,
+                 field_id: Optional[str] = None, field_name: str = "Current Price",
+                 field_mapping: Optional[Dict[str, Any]] = None):
+        self.app_token = app_token
+        self.table_id = table_id
+        self.name = name or f"{app_token[:8]}/{table_id}"
+        self.field_id = field_id
+        self.field_name = field_name
+        self.field_mapping = field_mapping
+
+    def __repr__(self) -> str:
+        return f"<BitableTarget {self.name}>"
+
+
+def check_target_names(targets: List[BitableTarget]) -> List[BitableTarget]:
+    """目标名称用作结果报告的键，重名时报错，避免某个目标的结果被覆盖"""
+    seen = set()
+    duplicates = []
+    for target in targets:
+        if target.name in seen:
+            duplicates.append(target.name)
+        seen.add(target.name)
+    if duplicates:
+        raise ValueError(f"写入目标名称重复: {', '.join(sorted(set(duplicates)))}")
+    return targets
+
+
+def load_targets() -> List[BitableTarget]:
+    """读取写入目标
+
+    BITABLE_TARGETS 为 JSON 列表，每项包含 app_token、table_id，可选 name、field_id、
+    field_name、field_mapping（格式同 FIELD_MAPPING）；未配置时使用 APP_TOKEN/TABLE_ID
+    """
     default_field_name = os.getenv("TARGET_FIELD_NAME", "Current Price")
+    raw = os.getenv("BITABLE_TARGETS")
+    if raw:
+        try:
+            items = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"BITABLE_TARGETS 不是合法的 JSON: {e}")
+        return check_target_names([
+            BitableTarget(
+                item["app_token"],
+                item["table_id"],
+                name=item.get("name"),
+                field_id=item.get("field_id"),
+                field_name=item.get("field_name", default_field_name),
+                field_mapping=item.get("field_mapping"),
+            )
+            for item in items
+        ])
+
+    # 从环境变量读取配置，若不存在则退回到默认值（与原脚本一致）
+    return [BitableTarget(
+        os.getenv("APP_TOKEN", "U3iYbe8cGaBrLEso6jMctMVgnVb"),
+        os.getenv("TABLE_ID", "tbl29O0osz3dn74L"),
+        field_id=os.getenv("TARGET_FIELD_ID"),
+        field_name=default_field_name,
+    )]
+
 
+def build_client_option():
+    """创建 client 并按 App Token -> 预设 Token -> User Token 的顺序构建请求选项"""
     # 创建 client（沿用现有 user_access_token 方案）
     client = (
         lark.Client.builder()
         .enable_set_token(True)
+        .timeout(http_session.DEFAULT_TIMEOUT)
         .log_level(lark.LogLevel.DEBUG)
         .build()
     )
 
-    # 从环境变量读取配置，若不存在则退回到默认值（与原脚本一致）
-    app_token = os.getenv("APP_TOKEN", "U3iYbe8cGaBrLEso6jMctMVgnVb")
-    table_id = os.getenv("TABLE_ID", "tbl29O0osz3dn74L")
-
     # 优先使用App Access Token，若不可用则回退到User Access Token
     access_token = None
     use_app_token = False
@@ -137,6 +285,7 @@ def main():
                 token_manager = FeishuAppTokenManager(app_id, app_secret, redis_host, redis_port)
                 access_token = token_manager.get_app_access_token()
                 use_app_token = True
+                lark.logger.info(f"Token缓存命中: {token_manager.cache_stats()}")
                 lark.logger.info("成功获取动态App Access Token")
                 print(f"[SUCCESS] 获取到新的App Access Token: {access_token[:20]}...")
             except Exception as e:
@@ -179,66 +328,167 @@ def main():
         lark.logger.info(f"使用user_access_token: {access_token[:15]}...")
 
     lark.logger.info(f"使用Token类型: {'App Access Token' if use_app_token else 'User Access Token'}")
+    return client, option
 
-    def resolve_field_name_by_id(client: lark.Client, app_token: str, table_id: str, field_id: str) -> Optional[str]:
+
+def update_target(client, option, target: BitableTarget,
+                  rows: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """将行情写入单个目标，返回 {"success", "written", "error"}"""
+    app_token, table_id = target.app_token, target.table_id
+    report: Dict[str, Any] = {"success": True, "written": 0}
+
+    # 字段 ID -> 字段名 通过本地/Redis 缓存解析，避免每次运行都请求字段列表
+    schema = FieldSchemaCache(client, option, app_token, table_id)
+    field_name_for_update = target.field_name
+    if target.field_id:
         try:
-            req = ListAppTableFieldRequest.builder().app_token(app_token).table_id(table_id).build()
-            resp: ListAppTableFieldResponse = client.bitable.v1.app_table_field.list(req, option)
-            if not resp.success():
-                lark.logger.warning(
-                    f"获取字段列表失败，使用默认字段名。code={resp.code}, msg={resp.msg}, log_id={resp.get_log_id()}"
-                )
-                return None
-            items = []
-            try:
-                items = resp.data.items or []
-            except Exception:
-                pass
-            for it in items:
-                fid = getattr(it, "field_id", None) or getattr(it, "id", None)
-                fname = getattr(it, "field_name", None) or getattr(it, "name", None)
-                if fid == field_id:
-                    return fname
-            lark.logger.warning(f"未在字段列表中找到字段ID: {field_id}，使用默认字段名")
-            return None
+            resolved = schema.resolve(target.field_id)
         except Exception as e:
             lark.logger.warning(f"解析字段名异常: {e}")
-            return None
-
-    field_name_for_update = default_field_name
-    if target_field_id:
-        resolved = resolve_field_name_by_id(client, app_token, table_id, target_field_id)
+            resolved = None
         if resolved:
             field_name_for_update = resolved
+        else:
+            lark.logger.warning(f"未在字段列表中找到字段ID: {target.field_id}，使用默认字段名")
 
-    records = build_records(name_to_price, field_name_for_update)
-    if not records:
-        lark.logger.warning("没有可更新的记录，可能所有目标名称都未在 CSV 中找到")
-        return
+    mappings = resolve_mapping(load_field_mapping(field_name_for_update, target.field_mapping), schema)
+    record_targets, index = resolve_targets(client, option, app_token, table_id, list(rows))
+    updates = build_row_updates(rows, mappings, record_targets)
+    creates: Dict[str, Dict[str, Any]] = {}
+    if os.getenv("UPDATE_MODE", "update") == "upsert":
+        if index is None:
+            # 没有索引时无法确认行是否存在，不新建以免产生重复行
+            lark.logger.warning(f"[{target.name}] 记录索引不可用，upsert 仅执行更新")
+        else:
+            creates = build_row_creates(rows, mappings, record_targets, index.key_field)
+    if not updates and not creates:
+        lark.logger.warning(f"[{target.name}] 没有可更新的记录，可能所有目标名称都未在 CSV 中找到")
+        return report
 
-    request: BatchUpdateAppTableRecordRequest = (
-        BatchUpdateAppTableRecordRequest.builder()
-        .app_token(app_token)
-        .table_id(table_id)
-        .user_id_type("user_id")
-        .request_body(
-            BatchUpdateAppTableRecordRequestBody.builder()
-            .records(records)
-            .build()
-        )
-        .build()
-    )
+    snapshot = TableSnapshot()
+    if updates and os.getenv("DELTA_SYNC", "1") == "1":
+        updates = filter_changed(client, option, app_token, table_id, updates, snapshot)
+        if not updates and not creates:
+            print(f"[INFO] [{target.name}] 所有价格与表格一致，无需写入")
+            return report
 
-    # 发起请求（保留原来的 user_access_token 用法）
-    response: BatchUpdateAppTableRecordResponse = client.bitable.v1.app_table_record.batch_update(request, option)
+    writer = BatchWriter(client, option, app_token, table_id)
+    # 发送前先落盘到发件箱，失败的分块可通过 write_outbox.py replay 单独重发
+    outbox = WriteOutbox() if os.getenv("OUTBOX_ENABLED", "1") == "1" else None
+    failed: List[ChunkResult] = []
+    written: Dict[str, Dict[str, Any]] = {}
+    started_at = time.monotonic()
 
-    if not response.success():
-        lark.logger.error(
-            f"client.bitable.v1.app_table_record.batch_update failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}"
-        )
-        return
+    if updates:
+        result = send_chunks(writer, outbox, "update", updates)
+        failed.extend(result.failed)
+        report["written"] += len(result.succeeded)
+        written.update(result.succeeded)
+        # 记录成功写入的值（含部分成功的分块），作为下次增量比较的基准
+        snapshot.apply(app_token, table_id, result.succeeded)
+
+    if creates:
+        result = send_chunks(writer, outbox, "create", creates)
+        failed.extend(result.failed)
+        report["created"] = len(result.created)
+        if result.created:
+            # 新建的 record_id 写回索引，下次运行无需再查询
+            index.add(result.created)
+            created = {rid: creates[key] for key, rid in result.created.items()}
+            written.update(created)
+            snapshot.apply(app_token, table_id, created)
+
+    snapshot.save()
+    if written and os.getenv("CONFIRM_WRITES", "0") == "1":
+        # 写后读确认：轮询直到写入值可见，记录可见延迟
+        confirmation = confirm_writes(client, option, app_token, table_id, written, started_at=started_at)
+        print_confirm(confirmation, prefix=f"[{target.name}] ")
+        report["confirm"] = confirmation.summary()
+        if not confirmation.success:
+            snapshot.invalidate(app_token, table_id, confirmation.unconfirmed)
+            snapshot.save()
+            report["success"] = False
+            report["error"] = f"{len(confirmation.unconfirmed)} 条记录写入后未确认"
+    if failed:
+        # 字段被改名或改类型时清除字段缓存，下次运行重新拉取
+        if any(is_schema_error(c.code) for c in failed):
+            schema.invalidate()
+        # 行已被删除时从索引中移除，下次运行会重新查询
+        stale = [rid for c in failed if c.code == RECORD_NOT_FOUND_CODE for rid in c.record_ids]
+        if stale and index is not None:
+            index.drop(stale)
+        report["success"] = False
+        report["error"] = f"{len(failed)} 个分块写入失败"
+    return report
+
+
+def send_chunks(writer: BatchWriter, outbox: Optional[WriteOutbox], op: str,
+                payload: Dict[str, Dict[str, Any]], owner: str = OWNER_TABLE) -> BatchResult:
+    """分块、登记发件箱并提交，create 时以幂等键作为 client_token
+
+    owner 标记分块归属，重放新建行后据此更新对应的本地索引
+    """
+    chunks = writer.chunk(payload)
+    keys = outbox.enqueue(writer.app_token, writer.table_id, op, chunks, owner) if outbox else None
+    tokens = [client_token(key) for key in keys] if keys and op == "create" else None
+    result = writer.write_chunks(chunks, op, tokens)
+    if outbox:
+        outbox.mark_done([keys[c.index] for c in result.chunks if c.success])
+        for c in result.failed:
+            outbox.mark_failed(keys[c.index], f"code={c.code}, msg={c.msg}")
+
+    summary = result.summary()
+    action = "新建" if op == "create" else "写入"
+    print(f"[INFO] {writer.app_token[:8]}/{writer.table_id} 批量{action}: "
+          f"{summary['written']}/{summary['records']} 条成功，分块 {summary['chunks']} 个，"
+          f"失败 {summary['failed_chunks']} 个")
+    return result
+
+
+def update_tables(name_to_price: Dict[str, float], rows: Optional[Dict[str, Dict[str, Any]]] = None,
+                  targets: Optional[List[BitableTarget]] = None) -> Dict[str, Dict[str, Any]]:
+    """用同一份行情并发写入所有目标，返回 {目标名: 结果}
+
+    各目标相互隔离：单个目标异常只记录在自己的结果中，不影响其他目标
+    """
+    targets = check_target_names(targets) if targets is not None else load_targets()
+    client, option = build_client_option()
+    if rows is None:
+        rows = {name: {"收盘": price} for name, price in name_to_price.items()}
+
+    def run(target: BitableTarget) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            report = update_target(client, option, target, rows)
+        except Exception as e:
+            lark.logger.error(f"[{target.name}] 写入异常: {e}")
+            report = {"success": False, "written": 0, "error": str(e)}
+        report["elapsed"] = round(time.perf_counter() - start, 2)
+        return report
+
+    workers = max(1, min(int(os.getenv("BITABLE_TARGET_WORKERS", "4")), len(targets)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        reports = dict(zip([t.name for t in targets], executor.map(run, targets)))
+
+    if len(targets) > 1:
+        print(f"\n📊 多目标写入结果 ({sum(r['success'] for r in reports.values())}/{len(targets)} 成功):")
+        for name, report in reports.items():
+            status = "✅" if report["success"] else "❌"
+            detail = f"写入 {report['written']} 条" if report["success"] else report.get("error", "")
+            if report.get("created"):
+                detail += f"，新建 {report['created']} 行"
+            print(f"   {status} {name}: {detail}，耗时 {report['elapsed']}s")
+    http_session.print_connection_stats()
+    return reports
+
+
+def update_table(name_to_price: Dict[str, float], rows: Optional[Dict[str, Dict[str, Any]]] = None) -> bool:
+    """将行情写入所有目标多维表格，全部成功（或无需更新）返回 True
 
-    lark.logger.info(lark.JSON.marshal(response.data, indent=4))
+    rows 为 {股票名称: {列: 值}}，按字段映射写入多列；未提供时只写入价格
+    """
+    reports = update_tables(name_to_price, rows)
+    return all(r["success"] for r in reports.values())
 
 
 if __name__ == "__main__":
@@ -3,12 +3,22 @@
 验证飞书表格更新结果
 """
 
+import argparse
 import os
 import json
+import sys
 import time
-import lark_oapi as lark
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
 from lark_oapi.api.bitable.v1 import *
 
+import http_session
+from rate_limiter import call_with_backoff
+from record_index import cell_text
+from write_confirm import confirm_writes, print_confirm
+
 
 def load_env_file(path: str = ".env") -> None:
     if not os.path.exists(path):
@@ -30,86 +40,277 @@ def load_env_file(path: str = ".env") -> None:
         print(f"加载.env文件失败: {e}")
 
 
-def verify_table_data():
-    """验证表格中的实际数据"""
-    load_env_file()
+# 批量读取接口单次最多 100 条
+BATCH_GET_LIMIT = 100
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "4"))
+# 最后修改时间早于该小时数的记录视为未及时更新
+STALE_HOURS = float(os.getenv("VERIFY_STALE_HOURS", "24"))
+DEFAULT_REPORT_PATH = os.getenv("VERIFY_REPORT_PATH", "data/verify_report.json")
+
+
+def _batch_get(client, option, app_token: str, table_id: str, record_ids: List[str]):
+    req = (
+        BatchGetAppTableRecordRequest.builder()
+        .app_token(app_token)
+        .table_id(table_id)
+        .request_body(
+            BatchGetAppTableRecordRequestBody.builder().record_ids(record_ids).automatic_fields(True).build()
+        )
+        .build()
+    )
+    resp = call_with_backoff(
+        "bitable.record.read", lambda: client.bitable.v1.app_table_record.batch_get(req, option)
+    )
+    if not resp.success():
+        raise RuntimeError(f"批量读取记录失败: {resp.code} - {resp.msg}")
+    return resp.data.records or [], resp.data.absent_record_ids or []
+
+
+def fetch_table_records(client, option, app_token: str, table_id: str, record_ids: List[str]):
+    """按 100 条一组并发批量读取指定记录，返回 (记录列表, 不存在的 record_id 列表)"""
+    chunks = [record_ids[i:i + BATCH_GET_LIMIT] for i in range(0, len(record_ids), BATCH_GET_LIMIT)]
+    records, absent = [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(VERIFY_WORKERS, len(chunks) or 1))) as executor:
+        for chunk_records, chunk_absent in executor.map(
+            lambda chunk: _batch_get(client, option, app_token, table_id, chunk), chunks
+        ):
+            records.extend(chunk_records)
+            absent.extend(chunk_absent)
+    return records, absent
+
+
+def records_to_frame(records, fields: List[str]):
+    """记录 -> 以 record_id 为索引的 DataFrame，含期望字段与 last_modified_time"""
+    import pandas as pd
+
+    rows = []
+    for record in records:
+        values = record.fields or {}
+        row = {f: values.get(f) for f in fields}
+        row["record_id"] = record.record_id
+        row["last_modified_time"] = record.last_modified_time
+        rows.append(row)
+    return pd.DataFrame(rows, columns=fields + ["record_id", "last_modified_time"]).set_index("record_id")
+
+
+def _plain(value: Any) -> Any:
+    """报告中的缺失值统一为 None，保证输出合法 JSON"""
+    import pandas as pd
+
+    if isinstance(value, (list, dict)):
+        return value
+    return None if pd.isna(value) else value
+
+
+def compute_drift(expected, actual, tolerances: Dict[str, float], default_tolerance: float):
+    """逐字段向量化比较期望值与表格值，返回不一致明细列表"""
+    import numpy as np
+    import pandas as pd
+
+    actual = actual.reindex(expected.index)
+    mismatches = []
+    for field in expected.columns:
+        exp_col, act_col = expected[field], actual[field] if field in actual else pd.Series(index=expected.index)
+        has_expected = exp_col.notna()
+        exp_num = pd.to_numeric(exp_col, errors="coerce")
+        act_num = pd.to_numeric(act_col, errors="coerce")
+        numeric = exp_num.notna()
+        drift = (act_num - exp_num).abs()
+        tolerance = tolerances.get(field, default_tolerance)
+        # 数值字段按容差比较（表格为空视为不一致），其他字段按值比较
+        bad_numeric = numeric & ~(drift <= tolerance)
+        # 文本单元格读回时为富文本分段，先转为纯文本再比较
+        act_text = act_col.map(cell_text)
+        bad_other = has_expected & ~numeric & (act_text != exp_col.astype(str))
+        bad = bad_numeric | bad_other
+        for record_id in expected.index[bad.to_numpy()]:
+            value = drift.get(record_id)
+            mismatches.append({
+                "record_id": record_id,
+                "field": field,
+                "expected": _plain(exp_col[record_id]),
+                "actual": _plain(act_col[record_id]),
+                "drift": None if value is None or np.isnan(value) else float(value),
+            })
+    return mismatches
+
+
+def expected_from_rows(client, option, target, rows: Dict[str, Dict[str, Any]]):
+    """由行情生成期望值，返回 (期望值表, {record_id: 股票名称}, 表格中没有对应行的股票)"""
+    import pandas as pd
+
+    from field_mapping import build_cells, load_field_mapping, resolve_mapping
+    from field_schema import FieldSchemaCache
+    from update_all import resolve_targets
+
+    schema = FieldSchemaCache(client, option, target.app_token, target.table_id)
+    field_name = target.field_name
+    if target.field_id:
+        field_name = schema.resolve(target.field_id) or field_name
+    mappings = resolve_mapping(load_field_mapping(field_name, target.field_mapping), schema)
+
+    record_targets, _ = resolve_targets(client, option, target.app_token, target.table_id, list(rows))
+    expected = pd.DataFrame.from_dict(
+        {rid: build_cells(rows[name], mappings) for name, rid in record_targets.items() if name in rows},
+        orient="index",
+        columns=[m.field for m in mappings],
+    )
+    unmatched = [name for name in rows if name not in record_targets]
+    return expected, {rid: name for name, rid in record_targets.items()}, unmatched
+
+
+def expected_from_snapshot(client, option, target, snapshot):
+    """以本地快照中最近一次成功写入的值作为期望值，避免与之后变动的实时行情比较"""
+    import pandas as pd
+
+    from record_index import RecordIndex
+
+    written = snapshot.get(target.app_token, target.table_id)
+    if not written:
+        raise RuntimeError("本地快照中没有该目标的写入记录，请使用 --csv 指定写入时的行情")
+    fields = list(dict.fromkeys(field for cells in written.values() for field in cells))
+    expected = pd.DataFrame.from_dict(written, orient="index", columns=fields)
+    # 只读取本地索引缓存，用于在报告中显示股票名称
+    index = RecordIndex(client, option, target.app_token, target.table_id)
+    return expected, {rid: name for name, rid in index.records.items()}, []
+
+
+def verify_target(client, option, target, rows: Optional[Dict[str, Dict[str, Any]]] = None,
+                  stale_hours: float = STALE_HOURS, snapshot=None) -> Dict[str, Any]:
+    """校验单个目标：返回包含 mismatches / missing / stale 的报告
+
+    提供 rows 时与该行情比较，否则与本地快照中记录的已写入值比较
+    """
+    import pandas as pd
+
+    from delta_sync import TableSnapshot, load_tolerances
+
+    if rows is not None:
+        expected, names_by_id, unmatched = expected_from_rows(client, option, target, rows)
+    else:
+        expected, names_by_id, unmatched = expected_from_snapshot(
+            client, option, target, snapshot if snapshot is not None else TableSnapshot())
+    expected = expected.astype(object).where(expected.notna(), None)
+
+    records, absent = fetch_table_records(client, option, target.app_token, target.table_id, list(expected.index))
+    actual = records_to_frame(records, list(expected.columns))
+
+    default_tolerance = float(os.getenv("DELTA_TOLERANCE", "1e-6"))
+    # 已不存在的记录只计入 missing，不再重复计为不一致
+    present = expected.drop(index=[rid for rid in absent if rid in expected.index])
+    mismatches = compute_drift(present, actual, load_tolerances(), default_tolerance)
+    for item in mismatches:
+        item["name"] = names_by_id.get(item["record_id"])
+
+    # 行情中有、表格中没有对应行，或 record_id 已不存在
+    missing = [{"name": name, "record_id": None} for name in unmatched]
+    missing += [{"name": names_by_id.get(rid), "record_id": rid} for rid in absent]
+
+    stale = []
+    if not actual.empty:
+        cutoff_ms = (time.time() - stale_hours * 3600) * 1000
+        modified = pd.to_numeric(actual["last_modified_time"], errors="coerce")
+        for record_id, ts in modified[modified < cutoff_ms].items():
+            stale.append({
+                "name": names_by_id.get(record_id),
+                "record_id": record_id,
+                "last_modified_time": datetime.fromtimestamp(ts / 1000).isoformat(timespec="seconds"),
+            })
+
+    return {
+        "target": target.name,
+        "app_token": target.app_token,
+        "table_id": target.table_id,
+        "fields": list(expected.columns),
+        "checked": int(len(actual)),
+        "mismatches": mismatches,
+        "missing": missing,
+        "stale": stale,
+        "ok": not mismatches and not missing,
+    }
 
-    app_token = os.getenv("APP_TOKEN", "U3iYbe8cGaBrLEso6jMctMVgnVb")
-    table_id = os.getenv("TABLE_ID", "tbl29O0osz3dn74L")
-    access_token = os.getenv("APP_ACCESS_TOKEN")
 
-    print(f"🔍 验证飞书表格数据...")
-    print(f"   APP_TOKEN: {app_token}")
-    print(f"   TABLE_ID: {table_id}")
-    print(f"   当前时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-
-    client = lark.Client.builder().enable_set_token(True).log_level(lark.LogLevel.INFO).build()
-    option = lark.RequestOption.builder().tenant_access_token(access_token).build()
-
-    # 目标记录ID和股票名称映射
-    target_records = {
-        "rec25ORoaS06hp": "通富微电",
-        "rec25ORoaS06yw": "英维克",
-        "rec25ORoaS06IZ": "拓尔思",
-        "rec25ORoaS06Sp": "两面针",
-        "rec25ORoaS0714": "科大讯飞",
-        "rec25ORoaS078B": "金山办公",
-        "rec25ORoaS07fT": "中科曙光",
-        "rec25ORoaS07ns": "科大国创"
+def verify_all(rows: Optional[Dict[str, Dict[str, Any]]],
+               report_path: Optional[str] = DEFAULT_REPORT_PATH) -> Dict[str, Any]:
+    """校验所有写入目标并输出 JSON 报告，rows 为 None 时与本地快照比较"""
+    from delta_sync import TableSnapshot
+    from update_all import build_client_option, load_targets
+
+    client, option = build_client_option()
+    snapshot = TableSnapshot() if rows is None else None
+    reports = []
+    for target in load_targets():
+        try:
+            reports.append(verify_target(client, option, target, rows, snapshot=snapshot))
+        except Exception as e:
+            reports.append({"target": target.name, "ok": False, "error": str(e)})
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "ok": all(r["ok"] for r in reports),
+        "targets": reports,
     }
+    if report_path:
+        os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    return report
 
-    print(f"\n📊 读取表格当前数据...")
 
-    try:
-        # 获取所有记录
-        req = ListAppTableRecordRequest.builder().app_token(app_token).table_id(table_id).build()
-        resp = client.bitable.v1.app_table_record.list(req, option)
+def print_report(report: Dict[str, Any]) -> None:
+    for r in report["targets"]:
+        if "error" in r:
+            print(f"❌ {r['target']}: 校验失败 {r['error']}")
+            continue
+        status = "✅" if r["ok"] else "❌"
+        print(f"{status} {r['target']}: 检查 {r['checked']} 行，字段 {', '.join(r['fields'])}")
+        print(f"   不一致 {len(r['mismatches'])} 处，缺失 {len(r['missing'])} 行，"
+              f"超过 {STALE_HOURS:g} 小时未更新 {len(r['stale'])} 行")
+        for item in r["mismatches"][:10]:
+            print(f"   - {item['name']} {item['field']}: 表格 {item['actual']}，期望 {item['expected']}")
 
-        if resp.success():
-            records = resp.data.items if hasattr(resp.data, 'items') else []
-            print(f"✅ 成功读取 {len(records)} 条记录")
 
-            print(f"\n📋 目标股票当前价格:")
-            found_records = 0
+def load_rows(csv_path: Optional[str] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+    """读取期望行情：指定 CSV 时从文件读取，否则返回 None，改为与本地快照中的已写入值比较
 
-            for record in records:
-                record_id = record.record_id
-                if record_id in target_records:
-                    found_records += 1
-                    stock_name = target_records[record_id]
+    不再重新抓取实时行情：盘中价格在写入与校验之间会变化，会把每次运行都报告为不一致
+    """
+    from field_mapping import QUOTE_FIELDS, load_quote_rows_from_csv
 
-                    # 获取字段数据
-                    fields = record.fields
-                    current_price = fields.get("Current Price", "N/A")
-                    name_field = fields.get("Name", fields.get("名称", "N/A"))
+    if csv_path:
+        return load_quote_rows_from_csv(csv_path, QUOTE_FIELDS)
+    return None
 
-                    print(f"   {stock_name} ({record_id}): {current_price}")
-                    print(f"     表格中名称: {name_field}")
 
-            print(f"\n📈 统计: 找到 {found_records}/{len(target_records)} 个目标股票记录")
-
-            if found_records < len(target_records):
-                print(f"⚠️  部分记录未找到，可能是record_id不匹配")
+def verify_table_data(csv_path: Optional[str] = None, report_path: Optional[str] = DEFAULT_REPORT_PATH) -> bool:
+    """验证表格中的实际数据与行情是否一致"""
+    load_env_file()
 
-        else:
-            print(f"❌ 读取记录失败: {resp.code} - {resp.msg}")
+    print(f"🔍 验证飞书表格数据...")
+    print(f"   期望值来源: {csv_path or '本地写入快照'}")
+    print(f"   当前时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
-    except Exception as e:
-        print(f"❌ 验证过程异常: {e}")
+    rows = load_rows(csv_path)
+    report = verify_all(rows, report_path)
+    print_report(report)
+    if report_path:
+        print(f"\n📄 报告已写入 {report_path}")
+    return report["ok"]
 
 
 def test_single_update():
     """测试单条记录更新"""
+    from update_all import build_client_option
+
     load_env_file()
 
     app_token = os.getenv("APP_TOKEN")
     table_id = os.getenv("TABLE_ID")
-    access_token = os.getenv("APP_ACCESS_TOKEN")
 
     print(f"\n🧪 测试单条记录更新...")
 
-    client = lark.Client.builder().enable_set_token(True).log_level(lark.LogLevel.INFO).build()
-    option = lark.RequestOption.builder().tenant_access_token(access_token).build()
+    # 与写入流程共用 client 与 Token 获取逻辑（含默认超时）
+    client, option = build_client_option()
 
     # 测试更新第一条记录（通富微电）
     test_record_id = "rec25ORoaS06hp"
@@ -136,34 +337,20 @@ def test_single_update():
                 .build()
             ).build()
 
+        started_at = time.monotonic()
         resp = client.bitable.v1.app_table_record.batch_update(req, option)
 
         if resp.success():
             print(f"✅ 测试更新成功")
 
-            # 等待几秒后验证
-            print(f"   等待5秒后验证...")
-            time.sleep(5)
-
-            # 读取验证
-            req = GetAppTableRecordRequest.builder() \
-                .app_token(app_token) \
-                .table_id(table_id) \
-                .record_id(test_record_id) \
-                .build()
-
-            resp = client.bitable.v1.app_table_record.get(req, option)
-
-            if resp.success():
-                current_price = resp.data.record.fields.get("Current Price", "N/A")
-                print(f"   验证结果: Current Price = {current_price}")
-
-                if current_price == test_price:
-                    print(f"✅ 更新验证成功！表格已实际更新")
-                else:
-                    print(f"❌ 更新验证失败！表格显示: {current_price}，期望: {test_price}")
+            # 按指数退避轮询读取，直到写入值可见或超过截止时间
+            result = confirm_writes(client, option, app_token, table_id,
+                                    {test_record_id: {"Current Price": test_price}}, started_at=started_at)
+            print_confirm(result, prefix="   ")
+            if result.success:
+                print(f"✅ 更新验证成功！表格已实际更新")
             else:
-                print(f"❌ 验证读取失败: {resp.code} - {resp.msg}")
+                print(f"❌ 更新验证失败！期望: Current Price = {test_price}")
 
         else:
             print(f"❌ 测试更新失败: {resp.code} - {resp.msg}")
@@ -173,5 +360,16 @@ def test_single_update():
 
 
 if __name__ == "__main__":
-    verify_table_data()
-    test_single_update()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="验证飞书表格更新结果")
+    parser.add_argument("--csv", help="写入时使用的行情 CSV 路径，默认与本地写入快照比较")
+    parser.add_argument("--report", default=DEFAULT_REPORT_PATH, help="JSON 报告输出路径")
+    parser.add_argument("--test-update", action="store_true", help="额外执行单条记录写入测试")
+    args = parser.parse_args()
+    # 行情抓取与 lark SDK 内部的 requests 调用同样复用共享连接池并带默认超时
+    http_session.install_global_session()
+
+    ok = verify_table_data(args.csv, args.report)
+    if args.test_update:
+        test_single_update()
+    http_session.print_connection_stats("\n")
+    sys.exit(0 if ok else 1)
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+写后读确认
+写入后按指数退避批量读取刚写入的记录，直到所有单元格与写入值一致或超过截止时间，
+并统计写入可见延迟；取代固定 sleep 后单次读取的做法
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from delta_sync import diff_updates, fetch_remote_state, load_tolerances
+from record_index import cell_text
+
+# 整体截止时间与首次/最大轮询间隔（秒）
+DEFAULT_DEADLINE = float(os.getenv("CONFIRM_DEADLINE", "30"))
+DEFAULT_INITIAL_DELAY = float(os.getenv("CONFIRM_INITIAL_DELAY", "0.2"))
+DEFAULT_MAX_DELAY = float(os.getenv("CONFIRM_MAX_DELAY", "4"))
+
+Updates = Dict[str, Dict[str, Any]]
+
+
+def _normalize(expected: Updates, state: Updates) -> Updates:
+    """文本单元格读回时为富文本分段，按写入值的类型转为纯文本再比较"""
+    normalized: Updates = {}
+    for record_id, fields in state.items():
+        wanted = expected.get(record_id, {})
+        normalized[record_id] = {
+            name: cell_text(value) if isinstance(wanted.get(name), str) else value
+            for name, value in fields.items()
+        }
+    return normalized
+
+
+class ConfirmResult:
+    """确认结果：已可见的记录及其延迟、超时仍未一致的单元格"""
+
+    def __init__(self, latencies: Dict[str, float], unconfirmed: Updates, polls: int, elapsed: float):
+        self.latencies = latencies
+        self.unconfirmed = unconfirmed
+        self.polls = polls
+        self.elapsed = elapsed
+
+    @property
+    def success(self) -> bool:
+        return not self.unconfirmed
+
+    def summary(self) -> Dict[str, Any]:
+        values = sorted(self.latencies.values())
+        return {
+            "confirmed": len(values),
+            "unconfirmed": len(self.unconfirmed),
+            "polls": self.polls,
+            "latency_p50": round(values[len(values) // 2], 3) if values else None,
+            "latency_max": round(values[-1], 3) if values else None,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+def confirm_writes(client, option, app_token: str, table_id: str, written: Updates,
+                   started_at: Optional[float] = None, deadline: float = DEFAULT_DEADLINE,
+                   initial_delay: float = DEFAULT_INITIAL_DELAY, max_delay: float = DEFAULT_MAX_DELAY,
+                   tolerances: Optional[Dict[str, float]] = None,
+                   default_tolerance: float = 1e-6) -> ConfirmResult:
+    """轮询确认 written 中的 {record_id: {字段: 值}} 已可读
+
+    started_at 为写入开始时间（time.monotonic），用于计算可见延迟，默认取调用时刻
+    """
+    started_at = started_at if started_at is not None else time.monotonic()
+    tolerances = tolerances if tolerances is not None else load_tolerances()
+    stop_at = time.monotonic() + deadline
+    pending: Updates = dict(written)
+    latencies: Dict[str, float] = {}
+    polls = 0
+    delay = initial_delay
+
+    while pending:
+        polls += 1
+        state = fetch_remote_state(client, option, app_token, table_id, list(pending))
+        if state is not None:
+            remaining = diff_updates(pending, _normalize(pending, state), tolerances, default_tolerance)
+            now = time.monotonic()
+            for record_id in pending:
+                if record_id not in remaining:
+                    latencies[record_id] = now - started_at
+            pending = {rid: written[rid] for rid in remaining}
+        if not pending:
+            break
+        left = stop_at - time.monotonic()
+        if left <= 0:
+            break
+        time.sleep(min(delay, left))
+        delay = min(max_delay, delay * 2)
+
+    return ConfirmResult(latencies, pending, polls, time.monotonic() - started_at)
+
+
+def print_confirm(result: ConfirmResult, prefix: str = "") -> None:
+    s = result.summary()
+    if result.success:
+        print(f"{prefix}✅ 写入已确认: {s['confirmed']} 条，可见延迟 p50 {s['latency_p50']}s / "
+              f"最大 {s['latency_max']}s，轮询 {s['polls']} 次")
+    else:
+        sample: List[str] = list(result.unconfirmed)[:5]
+        print(f"{prefix}⚠️  {s['unconfirmed']} 条记录在 {s['elapsed']}s 内未确认 (已确认 {s['confirmed']} 条): "
+              f"{', '.join(sample)}")
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+持久化写入发件箱
+每个待写入的分块在发送前先落到本地 SQLite，并带有幂等键；
+写入成功后标记为 done，失败的分块保留为 pending，可通过 replay 只重发未落地的部分，
+无需重新抓取行情
+
+用法:
+    python scripts/write_outbox.py status
+    python scripts/write_outbox.py replay [--max-attempts 5]
+    python scripts/write_outbox.py purge [--days 7]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_OUTBOX_PATH = os.getenv("OUTBOX_PATH", "data/outbox.sqlite3")
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+# 幂等键命名空间：相同目标、操作、日期与内容的分块得到相同的键
+OUTBOX_NAMESPACE = uuid.UUID("6f1c2a4e-5b7d-4c1e-9a3f-2d8e0b6c7a15")
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+# 同一单元格已有更新的写入登记，旧值不再重放
+STATUS_SUPERSEDED = "superseded"
+
+# 分块归属：决定重放 create 后更新哪个本地索引
+OWNER_TABLE = "table"
+OWNER_HISTORY = "history"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    key TEXT PRIMARY KEY,
+    app_token TEXT NOT NULL,
+    table_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    owner TEXT NOT NULL DEFAULT 'table',
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, created_at);
+"""
+
+def idempotency_key(app_token: str, table_id: str, op: str, payload: Any,
+                    batch_date: Optional[str] = None) -> str:
+    """由目标、操作、日期与分块内容生成确定性的 uuid5"""
+    batch_date = batch_date or date.today().isoformat()
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return str(uuid.uuid5(OUTBOX_NAMESPACE, f"{app_token}/{table_id}/{op}/{batch_date}/{body}"))
+
+
+def client_token(key: str) -> str:
+    """batch_create 的 client_token 要求 uuidv4 格式，由幂等键的同一哈希改写版本位得到"""
+    return str(uuid.UUID(bytes=uuid.UUID(key).bytes, version=4))
+
+
+class OutboxEntry:
+    """发件箱中的一个分块"""
+
+    def __init__(self, key: str, app_token: str, table_id: str, op: str, payload: Any,
+                 status: str, attempts: int, last_error: Optional[str], owner: str = OWNER_TABLE):
+        self.key = key
+        self.app_token = app_token
+        self.table_id = table_id
+        self.op = op
+        self.owner = owner
+        self.payload = payload
+        self.status = status
+        self.attempts = attempts
+        self.last_error = last_error
+
+    def __repr__(self) -> str:
+        return f"<OutboxEntry {self.key[:8]} {self.op} {self.app_token[:8]}/{self.table_id} {self.status}>"
+
+
+class WriteOutbox:
+    """基于 SQLite 的发件箱，多线程共用时每次操作使用独立连接"""
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "owner" not in columns:
+                conn.execute(f"ALTER TABLE outbox ADD COLUMN owner TEXT NOT NULL DEFAULT '{OWNER_TABLE}'")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, app_token: str, table_id: str, op: str, chunks: List[Any],
+                owner: str = OWNER_TABLE) -> List[str]:
+        """登记待发送的分块，返回幂等键
+
+        已存在的键恢复完整分块并重新置为 pending（本次会重新发送）；update 分块登记时，
+        更早仍未落地的分块中相同记录的相同字段被视为已过时，重放时不再发送
+        """
+        now = time.time()
+        keys = [idempotency_key(app_token, table_id, op, chunk) for chunk in chunks]
+        rows = [
+            (key, app_token, table_id, op, owner, json.dumps(chunk, ensure_ascii=False, default=str),
+             STATUS_PENDING, now, now)
+            for key, chunk in zip(keys, chunks)
+        ]
+        with self._lock, self._connect() as conn:
+            if op == "update":
+                self._supersede(conn, app_token, table_id, chunks, keys, now)
+            conn.executemany(
+                "INSERT INTO outbox (key, app_token, table_id, op, owner, payload, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, owner = excluded.owner, "
+                "status = excluded.status, attempts = 0, last_error = NULL, "
+                "created_at = excluded.created_at, updated_at = excluded.updated_at",
+                rows,
+            )
+        return keys
+
+    @staticmethod
+    def _supersede(conn: sqlite3.Connection, app_token: str, table_id: str, chunks: List[Any],
+                   keys: List[str], now: float) -> None:
+        """从更早的 pending update 分块中剔除被新分块覆盖的单元格，剔除后为空的标记为 superseded"""
+        newer: Dict[str, set] = {}
+        for chunk in chunks:
+            for record_id, fields in chunk.items():
+                newer.setdefault(record_id, set()).update(fields)
+        placeholders = ",".join("?" * len(keys))
+        older = conn.execute(
+            "SELECT key, payload FROM outbox WHERE app_token = ? AND table_id = ? AND op = 'update' "
+            f"AND status = ? AND key NOT IN ({placeholders})",
+            (app_token, table_id, STATUS_PENDING, *keys),
+        ).fetchall()
+        for key, raw in older:
+            payload = json.loads(raw)
+            remaining = {}
+            for record_id, fields in payload.items():
+                kept = {name: value for name, value in fields.items() if name not in newer.get(record_id, ())}
+                if kept:
+                    remaining[record_id] = kept
+            if remaining == payload:
+                continue
+            if remaining:
+                conn.execute("UPDATE outbox SET payload = ?, updated_at = ? WHERE key = ?",
+                             (json.dumps(remaining, ensure_ascii=False, default=str), now, key))
+            else:
+                conn.execute("UPDATE outbox SET status = ?, updated_at = ? WHERE key = ?",
+                             (STATUS_SUPERSEDED, now, key))
+
+    def mark_done(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE key = ?",
+                [(STATUS_DONE, now, key) for key in keys],
+            )
+
+    def mark_superseded(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE key = ?",
+                [(STATUS_SUPERSEDED, now, key) for key in keys],
+            )
+
+    def mark_failed(self, key: str, error: str) -> None:
+        """记录失败并保持 pending，之前已完成的键重发失败时也会回到待重放状态"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE key = ?",
+                (STATUS_PENDING, error, time.time(), key),
+            )
+
+    def pending(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, since: float = 0) -> List[OutboxEntry]:
+        """按登记顺序返回未落地且未超过重试次数的分块；since 只保留该时间戳之后登记的分块"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, app_token, table_id, op, payload, status, attempts, last_error, owner FROM outbox "
+                "WHERE status = ? AND attempts < ? AND created_at >= ? ORDER BY created_at",
+                (STATUS_PENDING, max_attempts, since),
+            ).fetchall()
+        return [OutboxEntry(r[0], r[1], r[2], r[3], json.loads(r[4]), r[5], r[6], r[7], r[8]) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    def purge(self, older_than_days: float = 7) -> int:
+        """删除早于指定天数的已完成或已过时分块"""
+        cutoff = time.time() - older_than_days * 86400
+        with self._lock, self._connect() as conn:
+            cur = conn.execute(
+                "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_DONE, STATUS_SUPERSEDED, cutoff),
+            )
+        return cur.rowcount
+
+
+def latest_updates(entries: List[OutboxEntry]) -> Tuple[List[OutboxEntry], List[str]]:
+    """同一单元格出现在多个 pending update 分块中时只保留最新登记的值
+
+    返回 (需要重放的分块, 已被完全覆盖的分块键)；entries 按登记顺序排列
+    """
+    seen: Dict[str, set] = {}
+    kept: List[OutboxEntry] = []
+    superseded: List[str] = []
+    for entry in reversed(entries):
+        payload = {}
+        for record_id, fields in entry.payload.items():
+            cells = {name: value for name, value in fields.items() if name not in seen.get(record_id, ())}
+            seen.setdefault(record_id, set()).update(fields)
+            if cells:
+                payload[record_id] = cells
+        if payload:
+            entry.payload = payload
+            kept.append(entry)
+        else:
+            superseded.append(entry.key)
+    kept.reverse()
+    return kept, superseded
+
+
+def replay(outbox: Optional[WriteOutbox] = None, client=None, option=None,
+           max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Tuple[int, int]:
+    """重发所有 pending 分块，返回 (成功数, 失败数)"""
+    from batch_writer import BatchWriter
+    from delta_sync import TableSnapshot
+    from history_append import HistoryIndex
+    from record_index import RecordIndex
+
+    outbox = outbox or WriteOutbox()
+    entries = outbox.pending(max_attempts)
+    if not entries:
+        return 0, 0
+    if client is None:
+        from update_all import build_client_option
+
+        client, option = build_client_option()
+
+    groups: Dict[Tuple[str, str, str, str], List[OutboxEntry]] = {}
+    for entry in entries:
+        groups.setdefault((entry.app_token, entry.table_id, entry.op, entry.owner), []).append(entry)
+
+    snapshot = TableSnapshot()
+    ok = failed = 0
+    for (app_token, table_id, op, owner), group in groups.items():
+        if op == "update":
+            group, superseded = latest_updates(group)
+            outbox.mark_superseded(superseded)
+            if not group:
+                continue
+        writer = BatchWriter(client, option, app_token, table_id)
+        # create 分块沿用登记时的幂等键作为 client_token，避免重复建行
+        tokens = [client_token(e.key) for e in group] if op == "create" else None
+        result = writer.write_chunks([e.payload for e in group], op, tokens)
+        for chunk in result.chunks:
+            entry = group[chunk.index]
+            if chunk.success:
+                outbox.mark_done([entry.key])
+                ok += 1
+            else:
+                outbox.mark_failed(entry.key, f"code={chunk.code}, msg={chunk.msg}")
+                failed += 1
+        if op == "update" and result.succeeded:
+            snapshot.apply(app_token, table_id, result.succeeded)
+        if result.created:
+            # 按分块归属更新对应的本地索引
+            if owner == OWNER_HISTORY:
+                HistoryIndex(app_token, table_id).add(result.created)
+            else:
+                RecordIndex(client, option, app_token, table_id).add(result.created)
+    snapshot.save()
+    print(f"📮 发件箱重放: 成功 {ok} 个分块，失败 {failed} 个")
+    return ok, failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="写入发件箱：查看状态、重放未落地的分块")
+    parser.add_argument("--path", default=DEFAULT_OUTBOX_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="按状态统计分块数量")
+    replay_parser = sub.add_parser("replay", help="重发未落地的分块")
+    replay_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    purge_parser = sub.add_parser("purge", help="清理已完成的旧分块")
+    purge_parser.add_argument("--days", type=float, default=7)
+    args = parser.parse_args()
+
+    outbox = WriteOutbox(args.path)
+    if args.command == "status":
+        counts = outbox.counts()
+        print(f"📮 发件箱 {args.path}: " + (", ".join(f"{k} {v}" for k, v in counts.items()) or "空"))
+        for entry in outbox.pending(max_attempts=sys.maxsize):
+            print(f"   {entry.key}  {entry.app_token}/{entry.table_id}  {len(entry.payload)} 条  "
+                  f"尝试 {entry.attempts} 次  {entry.last_error or ''}")
+    elif args.command == "replay":
+        from update_all import load_env_file
+        import http_session
+
+        load_env_file()
+        http_session.install_global_session()
+        _, failed = replay(outbox, max_attempts=args.max_attempts)
+        sys.exit(1 if failed else 0)
+    else:
+        print(f"🧹 已清理 {outbox.purge(args.days)} 个已完成的分块")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import sys
+
+import pytest
+
+# scripts/ 下的模块以平铺方式互相导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import redis_lock  # noqa: E402
+
+
+class FakeClock:
+    """可替换模块中 time 的假时钟，sleep 直接推进时间"""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeRedis:
+    """只实现锁与 Token 缓存用到的命令，eval 按脚本内容在 Python 中模拟"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        self.ttls[key] = ttl
+        return True
+
+    def delete(self, key):
+        self.ttls.pop(key, None)
+        return 1 if self.data.pop(key, None) is not None else 0
+
+    def ttl(self, key):
+        return self.ttls.get(key, -1) if key in self.data else -2
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def mset(self, values):
+        self.data.update(values)
+        return True
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == redis_lock._RELEASE_SCRIPT:
+            if self.data.get(keys[0]) == argv[0]:
+                del self.data[keys[0]]
+                return 1
+            return 0
+        if script == redis_lock._GUARDED_SET_SCRIPT:
+            if self.data.get(keys[0]) != argv[0]:
+                return 0
+            if int(self.data.get(keys[1]) or 0) != int(argv[1]):
+                return 0
+            for key, value in zip(keys[2:], argv[2:]):
+                self.data[key] = value
+            return 1
+        raise NotImplementedError(script)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append(lambda: self.redis.get(key))
+
+    def ttl(self, key):
+        self.calls.append(lambda: self.redis.ttl(key))
+
+    def execute(self):
+        return [call() for call in self.calls]
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
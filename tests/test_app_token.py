@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+import app_token
+import token_cache
+from app_token import FeishuAppTokenManager
+
+
+@pytest.fixture
+def managers(monkeypatch, tmp_path, fake_redis):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_token, "get_redis", lambda host, port: fake_redis)
+    monkeypatch.setattr(token_cache, "_memory", {})
+    return FeishuAppTokenManager("app", "secret"), FeishuAppTokenManager("app", "secret")
+
+
+def test_waiter_adopts_token_refreshed_by_another_process(managers):
+    winner, waiter = managers
+    key = waiter._cache_key("tenant")
+    now = int(time.time())
+    # 本进程 L1 中是已进入刷新窗口的旧令牌
+    token_cache._memory[key] = (f"stale|{now + 100}", now + 100)
+
+    winner._fetch_token = lambda kind: ("fresh", 7200)
+    winner.cache._l1_set = lambda *args: None  # 模拟另一个进程：结果只写入 Redis
+    assert winner.get_tenant_access_token() == "fresh"
+
+    def fail(kind):
+        raise AssertionError("等待方不应再次调用刷新接口")
+
+    waiter._fetch_token = fail
+    assert waiter.get_tenant_access_token() == "fresh"
+    # 共享层的结果回填到 L1
+    assert token_cache._memory[key][0].startswith("fresh|")
+
+
+def test_refresher_adopts_newer_shared_token(managers):
+    winner, waiter = managers
+    now = time.time()
+    waiter._remember("app", "old", now + 600)
+    winner._fetch_token = lambda kind: ("newer", 7200)
+    winner.get_app_access_token()
+    key = waiter._cache_key("app")
+    token_cache._memory[key] = (f"old|{int(now) + 600}", now + 600)
+
+    waiter._fetch_token = lambda kind: ("refetched", 7200)
+    hot = waiter._hot["app"]
+    token, expire_time = waiter._load_or_fetch("app", min_remaining=hot[1] - now + 1)
+    assert token == "newer"
+
+
+@pytest.fixture
+def manager(managers, monkeypatch, clock):
+    monkeypatch.setattr(app_token, "time", clock)
+    monkeypatch.setattr(app_token.random, "random", lambda: 0.0)
+    return managers[0]
+
+
+def test_refresh_point_follows_actual_expiry(manager, clock):
+    manager._remember("app", "t", clock.now + 7200)
+    assert manager._hot["app"][2] == clock.now + 7200 * app_token.TOKEN_REFRESH_FRACTION
+    # 从缓存读到的令牌只剩 40 分钟：按剩余时间计算，而不是按完整有效期立即刷新
+    manager._remember("app", "t", clock.now + 2400)
+    assert manager._hot["app"][2] == clock.now + 2400 * app_token.TOKEN_REFRESH_FRACTION
+
+
+def test_refresh_point_respects_buffer_and_min_interval(manager, clock):
+    manager._remember("app", "t", clock.now + 1000)
+    assert manager._hot["app"][2] == clock.now + 1000 - manager.buffer_time
+    manager._remember("app", "t", clock.now + 10)
+    assert manager._hot["app"][2] == clock.now + app_token.TOKEN_REFRESH_MIN_INTERVAL
+
+
+def test_unchanged_expiry_backs_off_until_reissue_window(manager, clock):
+    expire = clock.now + 3000
+    manager._hot["app"] = ("t", expire, clock.now)
+    fetches = []
+
+    def fetch(kind):
+        fetches.append(kind)
+        return "t", int(expire - clock.now)
+
+    manager._fetch_token = fetch
+    manager._refresh_kind("app")
+    assert fetches == ["app"]
+    assert manager._hot["app"][2] == expire - app_token.TOKEN_REISSUE_WINDOW
+
+    manager._hot["app"] = ("t", expire, clock.now)
+    clock.now = expire - 1000
+    manager._refresh_kind("app")
+    assert manager._hot["app"][2] == clock.now + app_token.TOKEN_REFRESH_MIN_INTERVAL
+
+
+def test_failed_refresh_retries_later(manager, clock):
+    manager._hot["app"] = ("t", clock.now + 600, clock.now)
+
+    def fail(kind):
+        raise RuntimeError("boom")
+
+    manager._fetch_token = fail
+    manager._refresh_kind("app")
+    assert manager._hot["app"] == ("t", clock.now + 600, clock.now + app_token.TOKEN_REFRESH_RETRY)
@@ -0,0 +1,38 @@
+import os
+
+from atomic_file import atomic_path, atomic_write_json
+
+
+def test_concurrent_writers_use_distinct_temp_files(tmp_path):
+    path = str(tmp_path / "cache.json")
+    with atomic_path(path) as first, atomic_path(path) as second:
+        assert first != second
+        for tmp, text in ((first, "first"), (second, "second")):
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "first"
+    assert os.listdir(tmp_path) == ["cache.json"]
+
+
+def test_failed_write_removes_temp_file_and_keeps_target(tmp_path):
+    path = str(tmp_path / "cache.json")
+    atomic_write_json(path, {"a": 1})
+    try:
+        with atomic_path(path) as tmp:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("partial")
+            raise RuntimeError("interrupted")
+    except RuntimeError:
+        pass
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == '{"a": 1}'
+    assert os.listdir(tmp_path) == ["cache.json"]
+
+
+def test_existing_file_mode_is_preserved(tmp_path):
+    path = str(tmp_path / "token.bin")
+    with atomic_path(path, file_mode=0o600) as tmp:
+        open(tmp, "w").close()
+    atomic_write_json(path, {})
+    assert os.stat(path).st_mode & 0o777 == 0o600
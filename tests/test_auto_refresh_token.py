@@ -0,0 +1,54 @@
+import pytest
+
+import auto_refresh_token
+import write_outbox
+from write_outbox import WriteOutbox
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    """临时发件箱；假的 replay 把 fail 中的分块标记为失败，其余标记为已落地"""
+    path = str(tmp_path / "outbox.sqlite3")
+    monkeypatch.setattr(write_outbox, "WriteOutbox", lambda: WriteOutbox(path))
+    box = WriteOutbox(path)
+    box.replayed = []
+    box.fail = set()
+
+    def fake_replay(outbox):
+        for entry in outbox.pending():
+            box.replayed.append(entry.key)
+            if entry.key in box.fail:
+                outbox.mark_failed(entry.key, "boom")
+            else:
+                outbox.mark_done([entry.key])
+
+    monkeypatch.setattr(write_outbox, "replay", fake_replay)
+    return box
+
+
+def enqueue_at(monkeypatch, outbox, at, code):
+    monkeypatch.setattr(write_outbox.time, "time", lambda: at)
+    [key] = outbox.enqueue("app", "tbl", "create", [[{"代码": code}]])
+    return key
+
+
+def test_replay_of_only_stale_chunks_is_not_success(outbox, monkeypatch):
+    stale = enqueue_at(monkeypatch, outbox, 100.0, "000001")
+    assert not auto_refresh_token.replay_outbox(since=150.0)
+    assert outbox.replayed == []
+    assert [e.key for e in outbox.pending()] == [stale]
+
+
+def test_replay_succeeds_when_current_run_chunks_land(outbox, monkeypatch):
+    stale = enqueue_at(monkeypatch, outbox, 100.0, "000001")
+    current = enqueue_at(monkeypatch, outbox, 200.0, "000002")
+    outbox.fail = {stale}
+    assert auto_refresh_token.replay_outbox(since=150.0)
+    assert outbox.replayed == [stale, current]
+
+
+def test_replay_fails_when_current_run_chunk_still_pending(outbox, monkeypatch):
+    enqueue_at(monkeypatch, outbox, 100.0, "000001")
+    current = enqueue_at(monkeypatch, outbox, 200.0, "000002")
+    outbox.fail = {current}
+    assert not auto_refresh_token.replay_outbox(since=150.0)
@@ -0,0 +1,51 @@
+import datetime
+
+import backfill
+from backfill import Checkpoint, split_windows, window_key
+from quote_providers import FixtureProvider
+
+D = datetime.date
+
+
+def test_split_windows_covers_range_per_symbol():
+    windows = split_windows(["000001", "000002"], D(2026, 1, 1), D(2026, 1, 10), window_days=4)
+    assert [window_key(w) for w in windows] == [
+        "000001:20260101:20260104", "000001:20260105:20260108", "000001:20260109:20260110",
+        "000002:20260101:20260104", "000002:20260105:20260108", "000002:20260109:20260110",
+    ]
+
+
+def test_split_windows_single_day_and_empty_range():
+    assert split_windows(["000001"], D(2026, 1, 5), D(2026, 1, 5), 365) == [("000001", D(2026, 1, 5), D(2026, 1, 5))]
+    assert split_windows(["000001"], D(2026, 1, 6), D(2026, 1, 5), 365) == []
+
+
+def test_checkpoint_ignores_truncated_last_line(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.mark_done(("000001", D(2026, 1, 1), D(2026, 1, 4)), 2)
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"key": "000001:2026')
+    assert checkpoint.load() == {"000001:20260101:20260104"}
+
+
+def test_run_backfill_resumes_from_checkpoint(monkeypatch, tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    done = ("000001", D(2026, 1, 1), D(2026, 1, 4))
+    Checkpoint(path).mark_done(done, 2)
+    processed = []
+
+    def fake_window(window, names, store, limiter, guard):
+        if window[0] == "000002":
+            raise RuntimeError("上游失败")
+        processed.append(window_key(window))
+        return 1
+
+    monkeypatch.setattr(backfill, "get_provider", lambda: FixtureProvider())
+    monkeypatch.setattr(backfill, "backfill_window", fake_window)
+    monkeypatch.setattr(backfill, "PriceStore", lambda root: None)
+    ok = backfill.run_backfill(["000001", "000002"], D(2026, 1, 1), D(2026, 1, 8), window_days=4,
+                               max_workers=2, checkpoint_path=path)
+    assert not ok
+    assert processed == ["000001:20260105:20260108"]
+    # 失败的窗口未记录，重新运行时只处理它们
+    assert Checkpoint(path).load() == {"000001:20260101:20260104", "000001:20260105:20260108"}
@@ -0,0 +1,104 @@
+import json
+from types import SimpleNamespace
+
+from batch_writer import BatchResult, BatchWriter, ChunkResult, chunk_updates
+from rate_limiter import RateLimiter
+
+
+def updates_of(n: int):
+    return {f"rec{i}": {"价格": float(i)} for i in range(n)}
+
+
+def test_chunk_by_record_count_keeps_order():
+    chunks = chunk_updates(updates_of(5), batch_size=2)
+    assert [list(c) for c in chunks] == [["rec0", "rec1"], ["rec2", "rec3"], ["rec4"]]
+
+
+def test_batch_size_is_capped_at_api_limit():
+    chunks = chunk_updates(updates_of(1200), batch_size=10_000)
+    assert [len(c) for c in chunks] == [500, 500, 200]
+
+
+def test_chunk_by_payload_bytes():
+    size = len(json.dumps({"record_id": "rec0", "fields": {"价格": 0.0}}, ensure_ascii=False).encode("utf-8"))
+    chunks = chunk_updates(updates_of(4), batch_size=500, max_payload_bytes=size * 2)
+    assert [len(c) for c in chunks] == [2, 2]
+
+
+def test_oversized_record_gets_its_own_chunk():
+    updates = {"small": {"名称": "a"}, "big": {"名称": "x" * 1000}, "tail": {"名称": "b"}}
+    chunks = chunk_updates(updates, max_payload_bytes=200)
+    assert [list(c) for c in chunks] == [["small"], ["big"], ["tail"]]
+
+
+def test_empty_updates_produce_no_chunks():
+    assert chunk_updates({}) == []
+
+
+def test_batch_result_partial_success():
+    result = BatchResult([
+        ChunkResult(1, {"rec2": {"价格": 2.0}}, False, code=1254290, elapsed=0.5),
+        ChunkResult(0, {"rec0": {"价格": 0.0}, "rec1": {"价格": 1.0}}, True, elapsed=0.2),
+    ])
+    assert not result.success
+    assert [c.index for c in result.chunks] == [0, 1]
+    assert result.succeeded == {"rec0": {"价格": 0.0}, "rec1": {"价格": 1.0}}
+    assert [c.record_ids for c in result.failed] == [["rec2"]]
+    assert result.summary() == {"chunks": 2, "failed_chunks": 1, "records": 3, "written": 2, "elapsed_max": 0.5}
+
+
+def test_batch_result_collects_created_ids():
+    result = BatchResult([
+        ChunkResult(0, {"000001": {}}, True, created={"000001": "recA"}),
+        ChunkResult(1, {"000002": {}}, True, created={"000002": "recB"}),
+    ])
+    assert result.created == {"000001": "recA", "000002": "recB"}
+    assert BatchResult([]).success
+
+
+class FakeResponse:
+    def __init__(self, code, records=None):
+        self.code = code
+        self.msg = "ok" if code == 0 else "failed"
+        self.data = SimpleNamespace(records=records)
+
+    def success(self):
+        return self.code == 0
+
+    def get_log_id(self):
+        return "log"
+
+
+class FakeTableRecord:
+    """含 rec2 的分块返回错误，其余成功"""
+
+    def __init__(self):
+        self.requests = []
+
+    def batch_update(self, req, option):
+        ids = [r.record_id for r in req.request_body.records]
+        self.requests.append(ids)
+        return FakeResponse(1254001 if "rec2" in ids else 0)
+
+    def batch_create(self, req, option):
+        records = req.request_body.records
+        return FakeResponse(0, [SimpleNamespace(record_id=f"new{i}") for i in range(len(records))])
+
+
+def fake_client(table_record):
+    return SimpleNamespace(bitable=SimpleNamespace(v1=SimpleNamespace(app_table_record=table_record)))
+
+
+def test_write_reports_failed_chunks_without_dropping_successes():
+    table_record = FakeTableRecord()
+    writer = BatchWriter(fake_client(table_record), None, "app", "tbl", batch_size=2, limiter=RateLimiter(0))
+    result = writer.write(updates_of(5))
+    assert sorted(map(tuple, table_record.requests)) == [("rec0", "rec1"), ("rec2", "rec3"), ("rec4",)]
+    assert set(result.succeeded) == {"rec0", "rec1", "rec4"}
+    assert [(c.index, c.code) for c in result.failed] == [(1, 1254001)]
+
+
+def test_write_create_maps_keys_to_new_record_ids():
+    writer = BatchWriter(fake_client(FakeTableRecord()), None, "app", "tbl", limiter=RateLimiter(0))
+    result = writer.write({"000001": {"代码": "000001"}, "000002": {"代码": "000002"}}, op="create")
+    assert result.created == {"000001": "new0", "000002": "new1"}
@@ -0,0 +1,57 @@
+import math
+
+from delta_sync import TableSnapshot, diff_updates, load_tolerances, values_equal
+
+
+def test_unchanged_records_are_dropped():
+    updates = {"rec1": {"价格": 10.0}, "rec2": {"价格": 5.0}}
+    known = {"rec1": {"价格": 10.0}, "rec2": {"价格": 4.0}}
+    assert diff_updates(updates, known) == {"rec2": {"价格": 5.0}}
+
+
+def test_only_changed_cells_are_kept():
+    updates = {"rec1": {"价格": 10.0, "涨跌幅": 1.5, "名称": "平安银行"}}
+    known = {"rec1": {"价格": 10.0, "涨跌幅": 1.2, "名称": "平安银行"}}
+    assert diff_updates(updates, known) == {"rec1": {"涨跌幅": 1.5}}
+
+
+def test_unknown_records_and_fields_are_sent():
+    updates = {"rec1": {"价格": 10.0, "成交量": 100}, "rec2": {"价格": 1.0}}
+    known = {"rec1": {"价格": 10.0}}
+    assert diff_updates(updates, known) == {"rec1": {"成交量": 100}, "rec2": {"价格": 1.0}}
+
+
+def test_per_field_tolerance_overrides_default():
+    updates = {"rec1": {"价格": 10.004, "涨跌幅": 1.0000001}}
+    known = {"rec1": {"价格": 10.0, "涨跌幅": 1.0}}
+    assert diff_updates(updates, known, {"价格": 0.01}) == {}
+    assert diff_updates(updates, known) == {"rec1": {"价格": 10.004}}
+
+
+def test_values_equal_handles_types():
+    assert values_equal(10, "10.0", 1e-6)
+    assert not values_equal(10.0, "n/a", 1e-6)
+    assert not values_equal(10.0, None, 1e-6)
+    assert not values_equal(math.nan, math.nan, 1e-6)
+    assert values_equal("abc", "abc", 0)
+
+
+def test_load_tolerances(monkeypatch):
+    monkeypatch.setenv("DELTA_FIELD_TOLERANCES", '{"价格": "0.01"}')
+    assert load_tolerances() == {"价格": 0.01}
+    monkeypatch.setenv("DELTA_FIELD_TOLERANCES", "[1, 2]")
+    assert load_tolerances() == {}
+    monkeypatch.delenv("DELTA_FIELD_TOLERANCES")
+    assert load_tolerances() == {}
+
+
+def test_snapshot_save_keeps_other_tables(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    first, second = TableSnapshot(path), TableSnapshot(path)
+    first.apply("app", "t1", {"rec1": {"价格": 1.0}})
+    second.apply("app", "t2", {"rec2": {"价格": 2.0}})
+    first.save()
+    second.save()
+    merged = TableSnapshot(path)
+    assert merged.get("app", "t1") == {"rec1": {"价格": 1.0}}
+    assert merged.get("app", "t2") == {"rec2": {"价格": 2.0}}
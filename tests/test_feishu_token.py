@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+import feishu_token
+import token_cache
+from feishu_token import FeishuUserTokenManager
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path, fake_redis):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(token_cache, "_memory", {})
+    monkeypatch.setattr(feishu_token, "get_redis", lambda host, port: fake_redis)
+    mgr = FeishuUserTokenManager("app", "secret")
+    keys = mgr._get_keys("u1")
+    # 已过期的 Token，需要刷新
+    fake_redis.data.update({
+        keys["access_token"]: "old_access",
+        keys["refresh_token"]: "old_refresh",
+        keys["expire_time"]: int(time.time()) - 1,
+    })
+    return mgr
+
+
+def test_refresh_writes_new_tokens(manager, fake_redis):
+    manager._refresh_user_token = lambda refresh: ("new_access", "new_refresh", int(time.time()) + 7200)
+    assert manager.get_user_access_token("u1") == "new_access"
+    assert fake_redis.get(manager._get_keys("u1")["refresh_token"]) == "new_refresh"
+
+
+def test_rejected_guarded_set_keeps_new_token_in_memory(manager, fake_redis):
+    keys = manager._get_keys("u1")
+    calls = []
+
+    def refresh(refresh_token):
+        calls.append(refresh_token)
+        # 刷新期间锁过期，被另一个进程取得
+        fake_redis.data[keys["lock"]] = "other-owner"
+        return "new_access", "new_refresh", int(time.time()) + 7200
+
+    manager._refresh_user_token = refresh
+    assert manager.get_user_access_token("u1") == "new_access"
+    assert fake_redis.get(keys["refresh_token"]) == "old_refresh"
+    # 再次获取直接使用内存中的新Token，不再调用刷新接口
+    assert manager.get_user_access_token("u1") == "new_access"
+    assert calls == ["old_refresh"]
+
+
+def test_redis_failure_mid_refresh_keeps_rotated_token_locally(manager, fake_redis, monkeypatch):
+    keys = manager._get_keys("u1")
+    calls = []
+
+    def down(*args, **kwargs):
+        raise ConnectionError("redis down")
+
+    def refresh(refresh_token):
+        calls.append(refresh_token)
+        return "new_access", "new_refresh", int(time.time()) + 7200
+
+    # 加锁时 Redis 出错，退化为进程内锁；写回时 Redis 仍不可用
+    monkeypatch.setattr(fake_redis, "set", down)
+    monkeypatch.setattr(fake_redis, "mset", down)
+    manager._refresh_user_token = refresh
+    assert manager.get_user_access_token("u1") == "new_access"
+    assert fake_redis.get(keys["refresh_token"]) == "old_refresh"
+
+    # 新进程（空的进程内缓存）从加密文件中读到轮换后的Token，不再用已作废的refresh_token刷新
+    token_cache._memory.clear()
+    restarted = FeishuUserTokenManager("app", "secret")
+    restarted._refresh_user_token = refresh
+    assert restarted.get_user_access_token("u1") == "new_access"
+    assert restarted._local_refresh_token("u1") == "new_refresh"
+    assert calls == ["old_refresh"]
+
+
+def test_lock_outlives_refresh_request(manager, monkeypatch):
+    timeouts = []
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"code": 0, "access_token": "a", "refresh_token": "r", "expires_in": 7200}
+
+    def post(url, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        return Response()
+
+    monkeypatch.setattr(feishu_token.http_session, "post", post)
+    manager._refresh_user_token("old_refresh")
+    lock = manager._redis_lock("lock")
+    # 连接与读取各自可能用满超时
+    assert lock.ttl > 2 * timeouts[0]
@@ -0,0 +1,114 @@
+import datetime
+import math
+
+import pytest
+
+from field_mapping import FieldMapping, build_cells, coerce, load_field_mapping, resolve_mapping
+
+
+@pytest.mark.parametrize("value, kind, expected", [
+    (None, "number", None),
+    ("  ", "number", None),
+    ("12.34", "number", 12.34),
+    (12, "number", 12.0),
+    ("2.35%", "percent", 0.0235),
+    (-1.5, "percent", -0.015),
+    (12.345, "currency", 12.35),
+    ("1234.6", "integer", 1235),
+    ("n/a", "number", None),
+    (math.nan, "number", None),
+    (math.inf, "number", None),
+    (600519, "text", "600519"),
+    (" 平安银行 ", "text", "平安银行"),
+])
+def test_coerce(value, kind, expected):
+    assert coerce(value, kind) == expected
+
+
+def test_coerce_datetime_to_millisecond_timestamp():
+    expected = int(datetime.datetime(2026, 1, 5).timestamp() * 1000)
+    assert coerce("2026-01-05", "datetime") == expected
+    assert coerce("2026-01-05 15:00:00", "datetime") == expected
+    assert coerce(datetime.datetime(2026, 1, 5), "datetime") == expected
+    assert coerce("not a date", "datetime") is None
+
+
+def test_load_field_mapping_defaults_to_close_price(monkeypatch):
+    monkeypatch.delenv("FIELD_MAPPING", raising=False)
+    [m] = load_field_mapping("Current Price")
+    assert (m.column, m.field, m.kind) == ("收盘", "Current Price", "number")
+
+
+def test_load_field_mapping_from_env(monkeypatch):
+    monkeypatch.setenv("FIELD_MAPPING", '{"收盘": "Current Price", "涨跌幅": {"field": "Change", "type": "percent"}}')
+    mappings = load_field_mapping("ignored")
+    assert [(m.column, m.field, m.kind) for m in mappings] == [
+        ("收盘", "Current Price", None),
+        ("涨跌幅", "Change", "percent"),
+    ]
+    monkeypatch.setenv("FIELD_MAPPING", "{bad")
+    with pytest.raises(ValueError):
+        load_field_mapping("ignored")
+
+
+class StubSchema:
+    def __init__(self, fields):
+        self._fields = fields
+        self.resolved = []
+
+    def resolve_many(self, ids):
+        self.resolved.extend(ids)
+
+    def fields(self):
+        return self._fields
+
+
+SCHEMA_FIELDS = [
+    {"field_id": "fldPrice", "field_name": "Current Price", "type": 2, "ui_type": "Currency"},
+    {"field_id": "fldChange", "field_name": "Change", "type": 2, "formatter": "0.00%"},
+    {"field_id": "fldDate", "field_name": "Date", "type": 5},
+    {"field_id": "fldNote", "field_name": "Note", "type": 1},
+]
+
+
+def test_resolve_mapping_infers_kinds_and_names_from_schema():
+    schema = StubSchema(SCHEMA_FIELDS)
+    mappings = [
+        FieldMapping("收盘", "Current Price"),
+        FieldMapping("涨跌幅", "fldChange"),
+        FieldMapping("日期", "Date"),
+        FieldMapping("股票名称", "Note"),
+    ]
+    resolved = resolve_mapping(mappings, schema)
+    assert [(m.column, m.field, m.kind) for m in resolved] == [
+        ("收盘", "Current Price", "currency"),
+        ("涨跌幅", "Change", "percent"),
+        ("日期", "Date", "datetime"),
+        ("股票名称", "Note", "text"),
+    ]
+    assert schema.resolved == ["fldChange"]
+
+
+def test_resolve_mapping_drops_unknown_field_ids_and_keeps_declared_kind():
+    resolved = resolve_mapping([FieldMapping("成交额", "fldMissing"), FieldMapping("收盘", "Current Price", "number")],
+                               StubSchema(SCHEMA_FIELDS))
+    assert [(m.field, m.kind) for m in resolved] == [("Current Price", "number")]
+
+
+def test_resolve_mapping_without_schema_uses_column_defaults():
+    resolved = resolve_mapping([FieldMapping("成交量", "Volume"), FieldMapping("收盘", "Close")])
+    assert [m.kind for m in resolved] == ["integer", "number"]
+
+
+def test_resolve_mapping_skips_schema_when_fully_declared():
+    class Exploding:
+        def fields(self):
+            raise AssertionError("不应读取字段结构")
+
+    [m] = resolve_mapping([FieldMapping("收盘", "Close", "number")], Exploding())
+    assert m.kind == "number"
+
+
+def test_build_cells_skips_invalid_values():
+    mappings = [FieldMapping("收盘", "Close", "number"), FieldMapping("涨跌幅", "Change", "percent")]
+    assert build_cells({"收盘": "10.5", "涨跌幅": "-"}, mappings) == {"Close": 10.5}
@@ -0,0 +1,88 @@
+import json
+import time
+
+import pytest
+
+from field_schema import REDIS_KEY_PREFIX, FieldSchemaCache, is_schema_error
+
+FIELDS = [{"field_id": "fld1", "field_name": "价格", "type": 2, "ui_type": "Number", "formatter": None}]
+
+
+class StubSchema(FieldSchemaCache):
+    """以固定字段列表代替字段列表接口，并统计调用次数"""
+
+    def __init__(self, path, redis_client=None, **kwargs):
+        self.fetches = 0
+        super().__init__(None, None, "app", "tbl", path=path, redis_client=redis_client, **kwargs)
+
+    def fetch(self):
+        self.fetches += 1
+        return list(FIELDS)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "field_schema.json")
+
+
+def test_memory_hit_after_first_fetch(path):
+    schema = StubSchema(path)
+    assert schema.resolve("fld1") == "价格"
+    assert schema.field_types() == {"价格": 2}
+    assert schema.fetches == 1
+
+
+def test_file_hit_across_instances(path):
+    StubSchema(path).fields()
+    schema = StubSchema(path)
+    assert schema.fields() == FIELDS
+    assert schema.fetches == 0
+
+
+def test_redis_hit_skips_file_and_fetch(path, fake_redis):
+    StubSchema(path, redis_client=fake_redis).fields()
+    schema = StubSchema(str(path) + ".other", redis_client=fake_redis)
+    assert schema.fields() == FIELDS
+    assert schema.fetches == 0
+
+
+def test_file_hit_backfills_redis(path, fake_redis):
+    StubSchema(path).fields()
+    StubSchema(path, redis_client=fake_redis).fields()
+    assert json.loads(fake_redis.get(f"{REDIS_KEY_PREFIX}:app/tbl"))["fields"] == FIELDS
+
+
+def test_expired_entry_is_refetched(path):
+    StubSchema(path, ttl=60).fields()
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["app/tbl"]["fetched_at"] = time.time() - 61
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    schema = StubSchema(path, ttl=60)
+    schema.fields()
+    assert schema.fetches == 1
+
+
+def test_unknown_field_id_refreshes_once(path):
+    schema = StubSchema(path)
+    schema.fields()
+    assert schema.resolve("fld_missing") is None
+    assert schema.fetches == 2
+
+
+def test_invalidate_clears_every_tier(path, fake_redis):
+    schema = StubSchema(path, redis_client=fake_redis)
+    schema.fields()
+    schema.invalidate()
+    assert fake_redis.get(f"{REDIS_KEY_PREFIX}:app/tbl") is None
+    with open(path, encoding="utf-8") as f:
+        assert "app/tbl" not in json.load(f)
+    schema.fields()
+    assert schema.fetches == 2
+
+
+def test_schema_error_codes():
+    assert is_schema_error(1254045)
+    assert not is_schema_error(1254290)
+    assert not is_schema_error(None)
@@ -0,0 +1,77 @@
+import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import get_stock_price
+from get_stock_price import fetch_snapshot, get_stock_prices
+
+STOCKS = {"平安银行": "000001", "万科A": "000002", "浦发银行": "600000"}
+
+
+def quotes(codes, close, names=None):
+    df = pd.DataFrame({"日期": "2026-01-05", "股票代码": codes, "收盘": close})
+    if names is not None:
+        df["名称"] = names
+    return df
+
+
+class FakeProvider:
+    """快照只包含部分股票，逐只拉取记录被请求的代码"""
+
+    default_watchlist = staticmethod(lambda: None)
+    store_dir = None
+
+    def __init__(self, spot=None, error=None):
+        self.spot = spot
+        self.error = error
+        self.history_calls = []
+
+    def fetch_snapshot(self, symbols):
+        if self.error:
+            raise self.error
+        return self.spot
+
+    def fetch_history(self, symbol, start_date, end_date):
+        self.history_calls.append(symbol)
+        return quotes([symbol], [99.0])
+
+
+@pytest.fixture
+def use_provider(monkeypatch):
+    monkeypatch.setattr(get_stock_price, "UPSTREAM_RETRIES", 0)
+    monkeypatch.setattr(get_stock_price, "get_calendar",
+                        lambda: SimpleNamespace(as_of_date=lambda: datetime.date(2026, 1, 5)))
+
+    def install(provider):
+        monkeypatch.setattr(get_stock_price, "get_provider", lambda: provider)
+        monkeypatch.setattr(get_stock_price.http_session, "print_connection_stats", lambda: None)
+        return provider
+    return install
+
+
+def test_snapshot_left_join_keeps_watchlist_names(use_provider):
+    # 快照含观察列表以外的股票，且名称列与观察列表不同
+    use_provider(FakeProvider(quotes(["000002", "000001", "000999"], [20.0, 10.0, 1.0], ["万 科Ａ", "平安", "x"])))
+    matched, missing = fetch_snapshot(STOCKS)
+    assert matched[["股票名称", "股票代码", "收盘"]].values.tolist() == [
+        ["平安银行", "000001", 10.0], ["万科A", "000002", 20.0],
+    ]
+    assert list(matched.columns) == get_stock_price.OUTPUT_COLUMNS
+    assert missing == {"浦发银行": "600000"}
+
+
+def test_snapshot_missing_symbols_fall_back_to_history(use_provider):
+    provider = use_provider(FakeProvider(quotes(["000001", "000002"], [10.0, 20.0])))
+    df = get_stock_prices(STOCKS, mode="snapshot", use_store=False, output_path=None)
+    assert provider.history_calls == ["600000"]
+    assert df[["股票名称", "收盘"]].values.tolist() == [["平安银行", 10.0], ["万科A", 20.0], ["浦发银行", 99.0]]
+
+
+def test_snapshot_failure_falls_back_for_whole_list(use_provider):
+    provider = use_provider(FakeProvider(error=RuntimeError("接口超时")))
+    assert fetch_snapshot(STOCKS) == (None, STOCKS)
+    df = get_stock_prices(STOCKS, mode="snapshot", use_store=False, output_path=None, max_workers=1)
+    assert provider.history_calls == ["000001", "000002", "600000"]
+    assert df["股票名称"].tolist() == list(STOCKS)
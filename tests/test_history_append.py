@@ -0,0 +1,96 @@
+import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import trading_calendar
+import update_all
+from batch_writer import BatchResult, ChunkResult
+from history_append import HistoryAppender, HistoryIndex, append_daily, closed_bars
+
+D = datetime.date
+# 类型均已声明，构造时无需读取字段结构
+MAPPING = {
+    "股票代码": {"field": "代码", "type": "text"},
+    "日期": {"field": "日期", "type": "datetime"},
+    "收盘": {"field": "收盘", "type": "number"},
+}
+
+
+def bars(rows):
+    return pd.DataFrame(rows, columns=["股票代码", "日期", "收盘"])
+
+
+@pytest.fixture
+def index(tmp_path):
+    return HistoryIndex("app", "tbl", path=str(tmp_path / "history_index.sqlite3"))
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """以假的 send_chunks 代替接口调用，按顺序分配 record_id"""
+    calls = []
+
+    def fake_send(writer, outbox, op, payload, owner):
+        calls.append((op, dict(payload)))
+        created = {key: f"rec{i}" for i, key in enumerate(payload)}
+        return BatchResult([ChunkResult(0, payload, True, created=created)])
+
+    monkeypatch.setenv("OUTBOX_ENABLED", "0")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "local")
+    monkeypatch.setattr(update_all, "send_chunks", fake_send)
+    return calls
+
+
+@pytest.fixture
+def appender(index, sent):
+    return HistoryAppender(None, None, "app", "tbl", MAPPING, index=index)
+
+
+def test_closed_bars_drops_rows_after_as_of():
+    df = bars([("000001", "2026-01-05", 1.0), ("000001", "2026-01-06", 2.0)])
+    assert closed_bars(df, D(2026, 1, 5))["日期"].tolist() == ["2026-01-05"]
+
+
+def test_closed_bars_without_closed_day_is_empty(monkeypatch):
+    monkeypatch.setattr(trading_calendar, "get_calendar", lambda: SimpleNamespace(as_of_date=lambda: None))
+    assert closed_bars(bars([("000001", "2026-01-05", 1.0)])).empty
+
+
+def test_index_existing_filters_by_code_and_date(index):
+    index.add({"000001|2026-01-05": "rec1", "000001|2026-01-06": "rec2", "000002|2026-01-05": "rec3"})
+    assert index.existing(["000001"], "2026-01-06", "2026-01-06") == {"000001|2026-01-06"}
+    assert index.existing(["000001", "000002"], "2026-01-05", "2026-01-05") == {
+        "000001|2026-01-05", "000002|2026-01-05",
+    }
+    assert HistoryIndex("app", "other", path=index.path).existing(["000001"]) == set()
+
+
+def test_append_skips_rows_already_in_index(appender, index, sent):
+    index.add({"000001|2026-01-05": "rec_old"})
+    df = bars([(1, "2026-01-05", 1.0), ("000001", "2026-01-06", 2.0), ("000002", "2026-01-06", 3.0)])
+    assert appender.append(df) == (2, 1, 0)
+    assert [sorted(payload) for _, payload in sent] == [["000001|2026-01-06", "000002|2026-01-06"]]
+    assert index.count() == 3
+
+
+def test_append_without_valid_keys_returns_zero(appender, sent):
+    df = bars([(None, "2026-01-05", 1.0), ("000001", None, 2.0)])
+    assert appender.append(df) == (0, 0, 0)
+    assert sent == []
+
+
+def test_append_daily_writes_only_closed_bars(monkeypatch):
+    monkeypatch.setattr(trading_calendar, "get_calendar", lambda: SimpleNamespace(as_of_date=lambda: D(2026, 1, 5)))
+    frames = []
+    appender = SimpleNamespace(append=lambda df: frames.append(df) or (1, 0, 0))
+    df = bars([("000001", "2026-01-05", 1.0), ("000001", "2026-01-06", 2.0)])
+    assert append_daily(df, appender)
+    assert [f["日期"].tolist() for f in frames] == [["2026-01-05"]]
+
+
+def test_append_daily_reports_failed_rows(monkeypatch):
+    monkeypatch.setattr(trading_calendar, "get_calendar", lambda: SimpleNamespace(as_of_date=lambda: D(2026, 1, 5)))
+    appender = SimpleNamespace(append=lambda df: (0, 0, 1))
+    assert not append_daily(bars([("000001", "2026-01-05", 1.0)]), appender)
@@ -0,0 +1,34 @@
+import pytest
+
+import http_session
+
+
+class StubSession:
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(kwargs)
+        return "response"
+
+
+@pytest.fixture
+def session(monkeypatch):
+    stub = StubSession()
+    monkeypatch.setattr(http_session, "get_session", lambda: stub)
+    return stub
+
+
+@pytest.mark.parametrize("kwargs, expected", [
+    ({}, http_session.DEFAULT_TIMEOUT),
+    ({"timeout": None}, http_session.DEFAULT_TIMEOUT),   # lark_oapi 未配置超时时的传参
+    ({"timeout": 3}, 3),
+])
+def test_pooled_request_always_has_timeout(session, kwargs, expected):
+    assert http_session._pooled_request("GET", "https://example.com", **kwargs) == "response"
+    assert session.calls[0]["timeout"] == expected
+
+
+def test_module_helpers_default_timeout(session):
+    http_session.post("https://example.com", json={})
+    assert session.calls[0]["timeout"] == http_session.DEFAULT_TIMEOUT
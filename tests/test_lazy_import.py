@@ -0,0 +1,60 @@
+import sys
+import threading
+import time
+import types
+
+import lazy_import
+from lazy_import import LazyModule, lazy_module, module_available
+
+
+def test_proxy_imports_on_first_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / "lazy_target.py").write_text("LOADS = []\nLOADS.append(1)\nVALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_target", raising=False)
+
+    proxy = lazy_module("lazy_target")
+    assert isinstance(proxy, LazyModule)
+    assert "lazy_target" not in sys.modules
+    assert "not loaded" in repr(proxy)
+
+    assert proxy.VALUE == 42
+    assert "lazy_target" in sys.modules
+    assert proxy.LOADS == [1]
+    assert "(loaded)" in repr(proxy)
+
+
+def test_lazy_module_returns_already_imported_module():
+    assert lazy_module("json") is sys.modules["json"]
+
+
+def test_concurrent_first_access_imports_once(monkeypatch):
+    calls = []
+    real = types.SimpleNamespace(VALUE=1)
+
+    def slow_import(name):
+        calls.append(name)
+        time.sleep(0.05)  # 放大竞争窗口
+        return real
+
+    monkeypatch.setattr(lazy_import.importlib, "import_module", slow_import)
+    proxy = LazyModule("heavy_dependency")
+    barrier = threading.Barrier(8)
+    results = []
+
+    def access():
+        barrier.wait()
+        results.append(proxy.VALUE)
+
+    threads = [threading.Thread(target=access) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["heavy_dependency"]
+    assert results == [1] * 8
+
+
+def test_module_available():
+    assert module_available("json")
+    assert not module_available("no_such_module_xyz")
+    assert not module_available("")
@@ -0,0 +1,15 @@
+import pytest
+
+import main
+import trading_calendar
+
+
+def test_env_file_is_loaded_before_calendar_check(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("FORCE_RUN", raising=False)
+    (tmp_path / ".env").write_text("FORCE_RUN=1\n", encoding="utf-8")
+    monkeypatch.setattr(trading_calendar, "get_calendar", lambda: pytest.fail("FORCE_RUN 时不应查询日历"))
+    runs = []
+    monkeypatch.setattr(main, "run_pipeline", lambda: runs.append(True))
+    main.main()
+    assert runs == [True]
@@ -0,0 +1,64 @@
+import pytest
+
+import pipeline
+from pipeline import Pipeline, PipelineContext, PipelineError
+
+
+def recorder(events, label):
+    def record(ctx, stage=None):
+        events.append(f"{label}:{stage}" if stage else label)
+    return record
+
+
+def test_hooks_run_around_matching_stages_in_registration_order():
+    events = []
+    p = Pipeline([("fetch", recorder(events, "fetch")), ("write", recorder(events, "write"))])
+    p.add_hook("before", recorder(events, "before"))
+    p.add_hook("after", recorder(events, "after"))
+    p.add_hook("after", recorder(events, "write-only"), stage="write")
+    ctx = p.run()
+    assert events == [
+        "before:fetch", "fetch", "after:fetch",
+        "before:write", "write", "after:write", "write-only:write",
+    ]
+    assert set(ctx.timings) == {"fetch", "write"}
+
+
+def test_stage_error_stops_pipeline_and_records_timing():
+    events = []
+
+    def fail(ctx):
+        raise PipelineError("抓取失败")
+
+    p = Pipeline([("fetch", fail), ("write", recorder(events, "write"))])
+    p.add_hook("after", recorder(events, "after"))
+    ctx = PipelineContext()
+    with pytest.raises(PipelineError, match="抓取失败"):
+        p.run(ctx)
+    assert events == []
+    assert "fetch" in ctx.timings
+
+
+def test_unknown_hook_time_is_rejected():
+    with pytest.raises(ValueError):
+        Pipeline().add_hook("during", recorder([], "x"))
+
+
+def test_history_hook_failure_does_not_fail_pipeline(monkeypatch):
+    import history_append
+
+    def boom(frame):
+        raise RuntimeError("历史表不可用")
+
+    monkeypatch.setattr(history_append, "append_daily", boom)
+    ctx = PipelineContext(frame=None)
+    pipeline.history_hook(ctx, "write")
+    assert ctx.results["history"] is False
+
+
+def test_default_pipeline_hooks_follow_env(monkeypatch):
+    monkeypatch.setenv("PIPELINE_WRITE_CSV", "1")
+    monkeypatch.delenv("HISTORY_TABLE_ID", raising=False)
+    p = pipeline.build_default_pipeline()
+    assert [name for name, _ in p.stages] == ["fetch", "transform", "write"]
+    assert [hook for _, hook in p._hooks["after"]] == [pipeline.timing_hook, pipeline.save_csv_hook]
@@ -0,0 +1,56 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from price_store import PriceStore
+
+D = datetime.date
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / "history"), use_parquet=False)
+
+
+def bars(*dates):
+    return pd.DataFrame({"日期": list(dates), "股票代码": ["000001"] * len(dates), "收盘": [1.0] * len(dates)})
+
+
+def test_empty_store_is_missing_every_business_day(store):
+    # 2026-01-02 为周五，1 月 3、4 日为周末
+    assert store.missing_ranges("000001", "20260102", "20260106") == [(D(2026, 1, 2), D(2026, 1, 6))]
+
+
+def test_gaps_are_split_into_contiguous_ranges(store):
+    store.write(bars("2026-01-06", "2026-01-07"))
+    assert store.missing_ranges("000001", "2026-01-05", "2026-01-09") == [
+        (D(2026, 1, 5), D(2026, 1, 5)),
+        (D(2026, 1, 8), D(2026, 1, 9)),
+    ]
+
+
+def test_fully_stored_range_has_nothing_missing(store):
+    store.write(bars("2026-01-05", "2026-01-06"))
+    assert store.missing_ranges("000001", "2026-01-03", "2026-01-06") == []
+
+
+def test_trading_days_skip_holidays(store):
+    store.write(bars("2025-12-31"))
+    trading_days = [D(2025, 12, 30), D(2025, 12, 31), D(2026, 1, 5), D(2026, 1, 6), D(2026, 1, 7)]
+    # 元旦休市的 1 月 1、2 日不算缺失；范围外的交易日被忽略
+    assert store.missing_ranges("000001", "2025-12-31", "2026-01-06", trading_days) == [(D(2026, 1, 5), D(2026, 1, 6))]
+
+
+def test_ranges_span_year_partitions(store):
+    store.write(bars("2025-12-31", "2026-01-05"))
+    trading_days = ["2025-12-30", "2025-12-31", "2026-01-05", "2026-01-06"]
+    assert store.missing_ranges("000001", "2025-12-30", "2026-01-06", trading_days) == [
+        (D(2025, 12, 30), D(2025, 12, 30)),
+        (D(2026, 1, 6), D(2026, 1, 6)),
+    ]
+
+
+def test_other_codes_do_not_count(store):
+    store.write(bars("2026-01-05"))
+    assert store.missing_ranges("600519", "2026-01-05", "2026-01-05") == [(D(2026, 1, 5), D(2026, 1, 5))]
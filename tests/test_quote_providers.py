@@ -0,0 +1,82 @@
+import datetime
+import resource
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import quote_providers
+import trading_calendar
+from quote_providers import QUOTE_COLUMNS, FixtureProvider, get_provider
+
+
+def test_fixture_history_is_deterministic_across_instances():
+    first = FixtureProvider().fetch_history("000001", "20260105", "20260116")
+    second = FixtureProvider().fetch_history("000001", "2026-01-05", "2026-01-16")
+    pd.testing.assert_frame_equal(first, second)
+    assert list(first.columns) == QUOTE_COLUMNS
+    # 2026-01-05 ~ 01-16 共 10 个工作日
+    assert first["日期"].tolist()[0] == "2026-01-05" and len(first) == 10
+
+
+def test_fixture_sub_range_matches_full_range():
+    provider = FixtureProvider()
+    full = provider.fetch_history("000001", "20260101", "20260131")
+    part = FixtureProvider().fetch_history("000001", "20260112", "20260116")
+    expected = full[(full["日期"] >= "2026-01-12") & (full["日期"] <= "2026-01-16")].reset_index(drop=True)
+    pd.testing.assert_frame_equal(part, expected)
+
+
+def test_fixture_symbols_get_different_series():
+    provider = FixtureProvider()
+    a = provider.fetch_history("000001", "20260105", "20260109")
+    b = provider.fetch_history("000002", "20260105", "20260109")
+    assert a["收盘"].tolist() != b["收盘"].tolist()
+
+
+def test_fixture_change_is_relative_to_previous_close():
+    df = FixtureProvider().fetch_history("000001", "20260105", "20260116")
+    prev_close = (df["收盘"] - df["涨跌额"]).round(2)
+    assert prev_close.iloc[1:].tolist() == df["收盘"].iloc[:-1].tolist()
+    assert (df["最高"] >= df[["开盘", "收盘"]].max(axis=1)).all()
+    assert (df["最低"] <= df[["开盘", "收盘"]].min(axis=1)).all()
+
+
+def test_fixture_memory_is_bounded_for_thousands_of_symbols():
+    provider = FixtureProvider(n_symbols=3000)
+    codes = list(provider.default_watchlist().values())
+    provider.fetch_history(codes[0], "20260105", "20260109")
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for code in codes:
+        provider.fetch_history(code, "20260105", "20260109")
+    # ru_maxrss 单位为 KB；缓存完整序列时每只股票约 640KB，3000 只会增长近 2GB
+    assert resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before < 64 * 1024
+
+
+def test_snapshot_is_stamped_with_calendar_quote_date(monkeypatch):
+    # 周六运行时快照价格属于周五，不能标成当天
+    monkeypatch.setattr(trading_calendar, "get_calendar",
+                        lambda: SimpleNamespace(quote_date=lambda: datetime.date(2026, 1, 9)))
+    snapshot = FixtureProvider().fetch_snapshot(["000001", "000002"])
+    assert snapshot["日期"].tolist() == ["2026-01-09", "2026-01-09"]
+    history = FixtureProvider().fetch_history("000001", "20260109", "20260109")
+    assert snapshot["收盘"].iloc[0] == history["收盘"].iloc[0]
+
+
+def test_fixture_replays_recorded_csv(tmp_path):
+    pd.DataFrame({"日期": ["2026-01-05"], "股票代码": ["1"], "收盘": [12.5]}).to_csv(
+        tmp_path / "000001.csv", index=False)
+    df = FixtureProvider(fixture_dir=str(tmp_path)).fetch_history("000001", "20260101", "20260131")
+    assert df[["日期", "股票代码", "收盘"]].values.tolist() == [["2026-01-05", "000001", 12.5]]
+
+
+def test_synthetic_watchlist():
+    assert FixtureProvider(n_symbols=2).default_watchlist() == {"合成00000": "900000", "合成00001": "900001"}
+    assert FixtureProvider().default_watchlist() is None
+
+
+def test_get_provider_rejects_unknown_name(monkeypatch):
+    monkeypatch.setattr(quote_providers, "_providers", {})
+    with pytest.raises(ValueError):
+        get_provider("nope")
+    assert isinstance(get_provider("fixture"), FixtureProvider)
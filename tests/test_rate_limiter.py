@@ -0,0 +1,66 @@
+import pytest
+
+import rate_limiter
+import resilience
+from rate_limiter import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(rate_limiter, "time", clock)
+
+
+def test_burst_is_served_without_waiting(clock):
+    limiter = RateLimiter(2, burst=3)
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_waits_for_refill_when_bucket_empty(clock):
+    limiter = RateLimiter(4)
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == [0.25]
+
+
+def test_refill_is_capped_at_capacity(clock):
+    limiter = RateLimiter(8, burst=2)
+    clock.now += 60
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == [0.125]
+
+
+def test_non_positive_rate_is_unlimited(clock):
+    limiter = RateLimiter(0)
+    for _ in range(100):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_penalize_blocks_and_drains_bucket(clock):
+    limiter = RateLimiter(4, burst=2)
+    limiter.penalize(2.0)
+    limiter.acquire()
+    assert clock.sleeps == [2.0]
+    # 惩罚期间不发放令牌，结束后再按速率补充
+    limiter.penalize(0.5)
+    limiter.acquire()
+    assert clock.sleeps == [2.0, 0.5]
+
+
+def test_call_with_backoff_retries_rate_limited_responses(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt, base_delay, max_delay: 0.5)
+    limiter = RateLimiter(0)
+    penalties = []
+    limiter.penalize = penalties.append
+    codes = iter([99991400, 1254290, 0])
+
+    class Response:
+        def __init__(self, code):
+            self.code = code
+
+    response = rate_limiter.call_with_backoff(limiter, lambda: Response(next(codes)), retries=3)
+    assert response.code == 0
+    assert penalties == [0.5, 0.5]
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from record_index import RecordIndex, cell_text
+
+
+class StubIndex(RecordIndex):
+    """以内存中的表格行代替接口调用，并记录调用情况"""
+
+    def __init__(self, rows, revision, path, **kwargs):
+        self.rows = rows
+        self.table_revision = revision
+        self.list_calls = []
+        super().__init__(None, None, "app", "tbl", path=path, **kwargs)
+
+    def fetch_revision(self):
+        return self.table_revision
+
+    def _list(self, filter_formula=None):
+        self.list_calls.append(filter_formula)
+        return {k: rid for k, rid in self.rows.items() if filter_formula is None or f'"{k}"' in filter_formula}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "record_index.json")
+
+
+def test_first_resolve_rebuilds_whole_table(path):
+    index = StubIndex({"平安银行": "rec1", "万科A": "rec2"}, 1, path)
+    assert index.resolve(["平安银行"]) == {"平安银行": "rec1"}
+    assert index.list_calls == [None]
+    assert index.revision == 1
+
+
+def test_cached_index_is_reused_across_instances(path):
+    StubIndex({"平安银行": "rec1"}, 1, path).resolve(["平安银行"])
+    index = StubIndex({"平安银行": "rec1"}, 1, path)
+    assert index.resolve(["平安银行"]) == {"平安银行": "rec1"}
+    assert index.list_calls == []
+
+
+def test_unknown_key_with_unchanged_revision_is_not_queried(path):
+    StubIndex({"平安银行": "rec1"}, 1, path).resolve(["平安银行"])
+    index = StubIndex({"平安银行": "rec1", "万科A": "rec2"}, 1, path)
+    assert index.resolve(["平安银行", "万科A"]) == {"平安银行": "rec1"}
+    assert index.list_calls == []
+
+
+def test_revision_change_looks_up_only_missing_keys(path):
+    StubIndex({"平安银行": "rec1"}, 1, path).resolve(["平安银行"])
+    index = StubIndex({"平安银行": "rec1", "万科A": "rec2"}, 2, path)
+    assert index.resolve(["平安银行", "万科A", "万科A"]) == {"平安银行": "rec1", "万科A": "rec2"}
+    assert index.list_calls == ['CurrentValue.[Name]="万科A"']
+    assert index.revision == 2
+
+
+def test_expired_cache_is_rebuilt(path):
+    StubIndex({"平安银行": "rec1"}, 1, path, max_age=60).resolve(["平安银行"])
+    index = StubIndex({"平安银行": "rec9"}, 1, path, max_age=60)
+    index.built_at = time.time() - 61
+    assert index.resolve(["平安银行"]) == {"平安银行": "rec9"}
+    assert index.list_calls == [None]
+
+
+def test_key_field_change_invalidates_cache(path):
+    StubIndex({"平安银行": "rec1"}, 1, path).resolve(["平安银行"])
+    index = StubIndex({"000001": "rec1"}, 1, path, key_field="代码")
+    assert index.records == {}
+
+
+def test_drop_removes_stale_record_ids_and_persists(path):
+    index = StubIndex({"平安银行": "rec1", "万科A": "rec2"}, 1, path)
+    index.resolve(["平安银行", "万科A"])
+    index.drop(["rec2"])
+    assert index.records == {"平安银行": "rec1"}
+    assert StubIndex({}, 1, path).records == {"平安银行": "rec1"}
+
+
+def test_cell_text_handles_rich_text_and_numbers():
+    assert cell_text([{"text": "平安", "type": "text"}, {"text": "银行 "}]) == "平安银行"
+    assert cell_text({"text": " 万科A"}) == "万科A"
+    assert cell_text(12.5) == "12.5"
+    assert cell_text(None) is None
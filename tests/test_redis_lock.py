@@ -0,0 +1,119 @@
+import threading
+import uuid
+
+import pytest
+
+from redis_lock import DistributedLock, LockTimeout
+
+
+def lock_name() -> str:
+    # 进程内锁与 fencing 计数按名称全局登记，每个用例使用独立名称
+    return f"test_lock:{uuid.uuid4().hex}"
+
+
+def test_fence_increases_on_each_acquire(fake_redis):
+    name = lock_name()
+    with DistributedLock(name, fake_redis) as first:
+        assert first.distributed
+    with DistributedLock(name, fake_redis) as second:
+        pass
+    assert (first.fence, second.fence) == (1, 2)
+    assert fake_redis.get(name) is None
+
+
+def test_local_fence_without_redis():
+    name = lock_name()
+    with DistributedLock(name) as first:
+        assert not first.distributed
+    with DistributedLock(name) as second:
+        pass
+    assert second.fence == first.fence + 1
+
+
+def test_guarded_set_writes_while_held(fake_redis):
+    with DistributedLock(lock_name(), fake_redis) as lock:
+        assert lock.guarded_set({"token": "new"})
+    assert fake_redis.get("token") == "new"
+
+
+def test_guarded_set_rejected_after_lock_taken_over(fake_redis):
+    name = lock_name()
+    with DistributedLock(name, fake_redis) as stale:
+        # 锁过期后被另一个进程取得
+        fake_redis.data[name] = "other-owner"
+        fake_redis.incr(stale.fence_key)
+        assert not stale.guarded_set({"token": "stale"})
+    assert "token" not in fake_redis.data
+    # 不能删除他人持有的锁
+    assert fake_redis.get(name) == "other-owner"
+
+
+def test_guarded_set_rejected_when_fence_advanced(fake_redis):
+    with DistributedLock(lock_name(), fake_redis) as lock:
+        fake_redis.incr(lock.fence_key)
+        assert not lock.guarded_set({"token": "stale"})
+    assert "token" not in fake_redis.data
+
+
+def test_guarded_set_without_distributed_lock_writes_directly(fake_redis):
+    with DistributedLock(lock_name()) as lock:
+        assert lock.guarded_set({"token": "x"})
+    lock.redis_client = fake_redis
+    assert lock.guarded_set({"token": "y"})
+    assert fake_redis.get("token") == "y"
+
+
+def test_timeout_waiting_for_redis_lock(fake_redis):
+    name = lock_name()
+    fake_redis.data[name] = "other-owner"
+    lock = DistributedLock(name, fake_redis, wait_timeout=0.1, poll_interval=0.01)
+    with pytest.raises(LockTimeout):
+        lock.acquire()
+    # 超时后进程内锁已释放，不影响后续加锁
+    del fake_redis.data[name]
+    with DistributedLock(name, fake_redis, wait_timeout=0.1):
+        pass
+
+
+def test_timeout_waiting_for_local_lock():
+    name = lock_name()
+    holder = DistributedLock(name)
+    holder.acquire()
+    try:
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(_try_acquire(name)))
+        waiter.start()
+        waiter.join()
+        assert result == ["timeout"]
+    finally:
+        holder.release()
+
+
+def _try_acquire(name: str) -> str:
+    try:
+        with DistributedLock(name, wait_timeout=0.05):
+            return "acquired"
+    except LockTimeout:
+        return "timeout"
+
+
+class BrokenRedis:
+    def set(self, *args, **kwargs):
+        raise ConnectionError("down")
+
+
+def test_falls_back_to_local_lock_when_redis_errors():
+    with DistributedLock(lock_name(), BrokenRedis()) as lock:
+        assert not lock.distributed
+        assert lock.fence == 1
+
+
+def test_guarded_set_in_fallback_mode_reports_redis_failure(fake_redis, monkeypatch):
+    def down(*args, **kwargs):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(fake_redis, "set", down)
+    monkeypatch.setattr(fake_redis, "mset", down)
+    with DistributedLock(lock_name(), fake_redis) as lock:
+        assert not lock.distributed
+        assert lock.guarded_set({"token": "new"}) is False
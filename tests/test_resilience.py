@@ -0,0 +1,168 @@
+import pytest
+
+import resilience
+from resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError, UpstreamGuard
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(resilience, "time", clock)
+
+
+# ---- CircuitBreaker ----
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_limited_probes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, half_open_max_calls=1)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 5
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+# ---- AdaptiveConcurrencyLimiter ----
+
+def test_additive_increase_on_fast_success():
+    limiter = AdaptiveConcurrencyLimiter(2, max_limit=4, latency_target=1.0)
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release(0.1, True)
+    # 每个窗口约 +1：2 -> 2.5 -> 2.9
+    assert limiter.limit == pytest.approx(2.9)
+
+
+def test_increase_capped_at_max_limit():
+    limiter = AdaptiveConcurrencyLimiter(3, max_limit=3)
+    limiter.acquire()
+    limiter.release(0.1, True)
+    assert limiter.limit == 3
+
+
+def test_multiplicative_decrease_on_failure_or_slow_call(clock):
+    limiter = AdaptiveConcurrencyLimiter(8, latency_target=1.0)
+    limiter.acquire()
+    limiter.release(0.1, False)
+    assert limiter.limit == 4
+    clock.now += 1.0
+    limiter.acquire()
+    limiter.release(5.0, True)
+    assert limiter.limit == 2
+
+
+def test_decrease_once_per_latency_window(clock):
+    limiter = AdaptiveConcurrencyLimiter(8, latency_target=1.0)
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(3):
+        limiter.release(0.1, False)
+    assert limiter.limit == 4
+
+
+def test_decrease_floored_at_min_limit(clock):
+    limiter = AdaptiveConcurrencyLimiter(2, min_limit=2, latency_target=1.0)
+    limiter.acquire()
+    limiter.release(0.1, False)
+    assert limiter.limit == 2
+
+
+def test_in_flight_tracks_acquire_release():
+    limiter = AdaptiveConcurrencyLimiter(2)
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter._in_flight == 2
+    limiter.release(0.1, True)
+    assert limiter._in_flight == 1
+
+
+# ---- UpstreamGuard ----
+
+def flaky(failures):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError("upstream error")
+        return "ok"
+
+    return func, calls
+
+
+def test_guard_counts_one_failure_per_exhausted_call():
+    guard = UpstreamGuard(CircuitBreaker(failure_threshold=5), retries=2)
+    for _ in range(2):
+        func, calls = flaky(99)
+        with pytest.raises(RuntimeError):
+            guard.call(func)
+        assert len(calls) == 3
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.breaker._failures == 2
+
+
+def test_guard_retry_success_records_no_failure(clock):
+    guard = UpstreamGuard(CircuitBreaker(failure_threshold=1), retries=2)
+    func, calls = flaky(2)
+    assert guard.call(func) == "ok"
+    assert len(calls) == 3
+    assert len(clock.sleeps) == 2
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_guard_failed_probe_reopens_without_retrying(clock):
+    guard = UpstreamGuard(CircuitBreaker(failure_threshold=1, recovery_timeout=10), retries=2)
+    with pytest.raises(RuntimeError):
+        guard.call(flaky(99)[0])
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    clock.now += 10
+    func, calls = flaky(99)
+    with pytest.raises(RuntimeError):
+        guard.call(func)
+    assert len(calls) == 1
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        guard.call(func)
@@ -0,0 +1,35 @@
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+import startup_bench
+
+
+@pytest.fixture
+def timed_runs(monkeypatch):
+    """每次冷启动耗时固定为 elapsed_ms，不真正启动子进程"""
+    def install(elapsed_ms):
+        ticks = iter(i * elapsed_ms / 1000 for i in range(100))
+        monkeypatch.setattr(startup_bench, "time", SimpleNamespace(perf_counter=lambda: next(ticks)))
+        monkeypatch.setattr(startup_bench, "_run_python",
+                            lambda code, *flags: subprocess.CompletedProcess([], 0, "", ""))
+    return install
+
+
+def test_bench_fails_when_over_budget(timed_runs, capsys):
+    timed_runs(800)
+    assert not startup_bench.bench(["main"], runs=3, budget_ms=500)
+    assert "超出启动耗时预算" in capsys.readouterr().out
+
+
+def test_bench_passes_within_budget(timed_runs):
+    timed_runs(200)
+    assert startup_bench.bench(["main"], runs=3, budget_ms=500)
+
+
+def test_bench_raises_on_import_failure(monkeypatch):
+    monkeypatch.setattr(startup_bench, "_run_python",
+                        lambda code, *flags: subprocess.CompletedProcess([], 1, "", "ModuleNotFoundError"))
+    with pytest.raises(RuntimeError, match="导入失败"):
+        startup_bench.bench(["main"], runs=1, budget_ms=500)
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import token_cache
+from token_cache import TieredTokenCache
+
+
+@pytest.fixture(autouse=True)
+def empty_memory(monkeypatch):
+    monkeypatch.setattr(token_cache, "_memory", {})
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "token_cache.bin")
+
+
+def test_miss_on_every_enabled_tier(path, fake_redis):
+    cache = TieredTokenCache(fake_redis, "secret", path)
+    assert cache.get("k") is None
+    assert cache.stats() == {"l1": {"hit": 0, "miss": 1}, "l2": {"hit": 0, "miss": 1}, "l3": {"hit": 0, "miss": 1}}
+
+
+def test_l2_hit_backfills_l1(path, fake_redis):
+    TieredTokenCache(fake_redis).set("k", "v", 600)
+    token_cache._memory.clear()
+    cache = TieredTokenCache(fake_redis, "secret", path)
+    assert cache.get("k") == "v"
+    assert "k" in token_cache._memory
+    assert cache.get("k") == "v"
+    assert cache.stats() == {"l1": {"hit": 1, "miss": 1}, "l2": {"hit": 1, "miss": 0}, "l3": {"hit": 0, "miss": 0}}
+
+
+def test_l3_hit_backfills_l1_and_l2(path, fake_redis):
+    TieredTokenCache(None, "secret", path).set("k", "v", 600)
+    token_cache._memory.clear()
+    cache = TieredTokenCache(fake_redis, "secret", path)
+    assert cache.get("k") == "v"
+    assert fake_redis.get("k") == "v" and 0 < fake_redis.ttl("k") <= 600
+    assert "k" in token_cache._memory
+    assert cache.stats()["l3"] == {"hit": 1, "miss": 0}
+
+
+def test_l3_file_is_encrypted_and_private(path):
+    TieredTokenCache(None, "secret", path).set("k", "token-value", 600)
+    with open(path, "rb") as f:
+        assert b"token-value" not in f.read()
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_l3_with_other_secret_is_a_miss(path):
+    TieredTokenCache(None, "secret", path).set("k", "v", 600)
+    token_cache._memory.clear()
+    assert TieredTokenCache(None, "other", path).get("k") is None
+
+
+def test_expired_entries_are_misses(path, clock, monkeypatch):
+    monkeypatch.setattr(token_cache, "time", clock)
+    cache = TieredTokenCache(None, "secret", path)
+    cache.set("k", "v", 60)
+    clock.now += 61
+    assert cache.get("k") is None
+    assert cache.stats()["l1"] == {"hit": 0, "miss": 1}
+    assert cache.stats()["l3"] == {"hit": 0, "miss": 1}
+
+
+def test_shared_only_skips_l1(path, fake_redis):
+    cache = TieredTokenCache(fake_redis, "secret", path)
+    cache.set("k", "v", 600)
+    fake_redis.data["k"] = "from-other-process"
+    assert cache.get("k") == "v"
+    assert cache.get("k", shared_only=True) == "from-other-process"
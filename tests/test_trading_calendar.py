@@ -0,0 +1,92 @@
+import datetime
+
+import pytest
+
+import quote_providers
+import trading_calendar
+from trading_calendar import TradingCalendar, get_calendar
+
+D = datetime.date
+
+
+@pytest.fixture
+def calendar():
+    # 2025-12-29 ~ 2026-01-09 的工作日，元旦 1 月 1 日、2 日休市
+    days = [D(2025, 12, 29) + datetime.timedelta(days=i) for i in range(12)]
+    holidays = {D(2026, 1, 1), D(2026, 1, 2)}
+    return TradingCalendar([d for d in days if d.weekday() < 5 and d not in holidays])
+
+
+@pytest.mark.parametrize("day, expected", [
+    (D(2025, 12, 30), D(2025, 12, 29)),
+    (D(2026, 1, 5), D(2025, 12, 31)),   # 周一，前面是节假日与周末
+    (D(2026, 1, 3), D(2025, 12, 31)),   # 周六
+    (D(2026, 1, 1), D(2025, 12, 31)),   # 节假日
+    ("20260106", D(2026, 1, 5)),
+    ("2026-01-11", D(2026, 1, 9)),      # 超出日历范围，取最后一个交易日
+    (D(2025, 12, 29), None),            # 日历第一天之前没有交易日
+    (D(2025, 12, 1), None),
+])
+def test_previous_trading_day(calendar, day, expected):
+    assert calendar.previous_trading_day(day) == expected
+
+
+@pytest.mark.parametrize("now, expected", [
+    (datetime.datetime(2026, 1, 5, 14, 59), D(2025, 12, 31)),  # 交易日收盘前
+    (datetime.datetime(2026, 1, 5, 15, 0), D(2026, 1, 5)),     # 收盘时刻
+    (datetime.datetime(2026, 1, 5, 20, 0), D(2026, 1, 5)),
+    (datetime.datetime(2026, 1, 6, 9, 0), D(2026, 1, 5)),      # 开盘前
+    (datetime.datetime(2026, 1, 4, 16, 0), D(2025, 12, 31)),   # 周日
+    (datetime.datetime(2026, 1, 2, 16, 0), D(2025, 12, 31)),   # 节假日收盘后
+])
+def test_as_of_date(calendar, now, expected):
+    assert calendar.as_of_date(now) == expected
+
+
+@pytest.mark.parametrize("now, expected", [
+    (datetime.datetime(2026, 1, 5, 10, 0), D(2026, 1, 5)),     # 盘中快照为当天价格
+    (datetime.datetime(2026, 1, 5, 9, 0), D(2025, 12, 31)),    # 开盘前仍是上一交易日收盘价
+    (datetime.datetime(2026, 1, 3, 10, 0), D(2025, 12, 31)),   # 周六
+    (datetime.datetime(2026, 1, 1, 16, 0), D(2025, 12, 31)),   # 节假日
+])
+def test_quote_date(calendar, now, expected):
+    assert calendar.quote_date(now) == expected
+
+
+def test_is_session_open(calendar):
+    assert calendar.is_session_open(datetime.datetime(2026, 1, 5, 10, 0))
+    assert not calendar.is_session_open(datetime.datetime(2026, 1, 5, 12, 0))
+    assert not calendar.is_session_open(datetime.datetime(2026, 1, 2, 10, 0))
+
+
+def test_trading_days_between(calendar):
+    assert calendar.trading_days_between("20251231", "2026-01-05") == [D(2025, 12, 31), D(2026, 1, 5)]
+
+
+def test_empty_calendar():
+    calendar = TradingCalendar([])
+    assert calendar.previous_trading_day(D(2026, 1, 5)) is None
+    assert calendar.as_of_date(datetime.datetime(2026, 1, 5, 16, 0)) is None
+    assert not calendar.covers(D(2026, 1, 5))
+
+
+def test_cache_round_trip(tmp_path, calendar):
+    path = str(tmp_path / "trade_calendar.csv")
+    trading_calendar._save_cached(path, calendar.days)
+    assert trading_calendar._load_cached(path) == calendar.days
+
+
+def test_get_calendar_uses_provider_days_for_fixture(monkeypatch, tmp_path):
+    monkeypatch.setattr(quote_providers, "DEFAULT_PROVIDER", "fixture")
+    monkeypatch.setattr(trading_calendar, "_calendar", None)
+    calendar = get_calendar(str(tmp_path / "unused.csv"))
+    assert calendar.days == sorted(quote_providers.get_provider("fixture").fetch_trading_days())
+    assert not (tmp_path / "unused.csv").exists()
+
+
+def test_get_stock_prices_without_closed_day_returns_none(monkeypatch):
+    import get_stock_price
+
+    monkeypatch.setattr(quote_providers, "DEFAULT_PROVIDER", "fixture")
+    monkeypatch.setattr(get_stock_price, "get_calendar", lambda: TradingCalendar([]))
+    assert get_stock_price.get_stock_prices(use_store=False, output_path=None) is None
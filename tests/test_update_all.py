@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+import update_all
+from batch_writer import BatchResult, ChunkResult
+from delta_sync import TableSnapshot
+from field_mapping import FieldMapping
+from update_all import BitableTarget, build_row_creates, check_target_names, load_targets
+
+MAPPINGS = [FieldMapping("收盘", "价格", "number")]
+ROWS = {"平安银行": {"收盘": 10.0}, "万科A": {"收盘": 20.0}, "茅台": {"收盘": None}}
+
+
+def test_load_targets_rejects_duplicate_names(monkeypatch):
+    monkeypatch.setenv("BITABLE_TARGETS", json.dumps([
+        {"app_token": "app1", "table_id": "tbl1", "name": "行情"},
+        {"app_token": "app2", "table_id": "tbl2", "name": "行情"},
+    ]))
+    with pytest.raises(ValueError, match="行情"):
+        load_targets()
+
+
+def test_load_targets_default_names_are_unique(monkeypatch):
+    monkeypatch.setenv("BITABLE_TARGETS", json.dumps([
+        {"app_token": "app1", "table_id": "tbl1"},
+        {"app_token": "app1", "table_id": "tbl2"},
+    ]))
+    assert [t.name for t in load_targets()] == ["app1/tbl1", "app1/tbl2"]
+
+
+def test_update_tables_rejects_duplicate_explicit_targets(monkeypatch):
+    monkeypatch.setattr(update_all, "build_client_option", lambda: pytest.fail("不应开始写入"))
+    targets = [BitableTarget("app1", "tbl1", name="x"), BitableTarget("app2", "tbl2", name="x")]
+    with pytest.raises(ValueError):
+        update_all.update_tables({}, targets=targets)
+
+
+def test_check_target_names_passes_unique_targets():
+    targets = [BitableTarget("app1", "tbl1"), BitableTarget("app1", "tbl2")]
+    assert check_target_names(targets) is targets
+
+
+def test_update_tables_isolates_a_failing_target(monkeypatch):
+    written = []
+
+    def fake_update_target(client, option, target, rows):
+        if target.name == "broken":
+            raise RuntimeError("boom")
+        written.append(target.name)
+        return {"success": True, "written": len(rows)}
+
+    monkeypatch.setattr(update_all, "build_client_option", lambda: (None, None))
+    monkeypatch.setattr(update_all, "update_target", fake_update_target)
+    targets = [BitableTarget("app1", "tbl1", name="a"), BitableTarget("app2", "tbl2", name="broken"),
+               BitableTarget("app3", "tbl3", name="c")]
+    reports = update_all.update_tables({"平安银行": 10.0}, targets=targets)
+    assert sorted(written) == ["a", "c"]
+    assert reports["a"]["success"] and reports["a"]["written"] == 1
+    assert reports["c"]["success"]
+    assert reports["broken"]["success"] is False
+    assert reports["broken"]["error"] == "boom"
+
+
+def test_build_row_creates_only_includes_missing_rows_with_key_field():
+    creates = build_row_creates(ROWS, MAPPINGS, {"平安银行": "rec1"}, "Name")
+    # 茅台没有有效取值，不新建空行
+    assert creates == {"万科A": {"Name": "万科A", "价格": 20.0}}
+
+
+class FakeIndex:
+    key_field = "Name"
+
+    def __init__(self):
+        self.added = {}
+
+    def add(self, records):
+        self.added.update(records)
+
+
+@pytest.fixture
+def upsert(monkeypatch, tmp_path):
+    """update_target 的 upsert 路径，记录索引与分块发送均为假实现"""
+    sent = []
+
+    def fake_send(writer, outbox, op, payload, owner="table"):
+        sent.append((op, dict(payload)))
+        created = {key: f"new_{key}" for key in payload} if op == "create" else None
+        return BatchResult([ChunkResult(0, payload, True, created=created)])
+
+    monkeypatch.setenv("UPDATE_MODE", "upsert")
+    monkeypatch.setenv("OUTBOX_ENABLED", "0")
+    monkeypatch.setenv("DELTA_SYNC", "0")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "local")
+    monkeypatch.setattr(update_all, "send_chunks", fake_send)
+    monkeypatch.setattr(update_all, "TableSnapshot", lambda: TableSnapshot(str(tmp_path / "snapshot.json")))
+    return sent
+
+
+def run_target(monkeypatch, index, targets):
+    monkeypatch.setattr(update_all, "resolve_targets", lambda *args: (targets, index))
+    target = BitableTarget("app", "tbl", name="t", field_mapping={"收盘": {"field": "价格", "type": "number"}})
+    return update_all.update_target(None, None, target, ROWS)
+
+
+def test_upsert_updates_existing_rows_and_creates_missing(monkeypatch, upsert):
+    index = FakeIndex()
+    report = run_target(monkeypatch, index, {"平安银行": "rec1"})
+    assert upsert == [
+        ("update", {"rec1": {"价格": 10.0}}),
+        ("create", {"万科A": {"Name": "万科A", "价格": 20.0}}),
+    ]
+    assert index.added == {"万科A": "new_万科A"}
+    assert report["success"] and report["written"] == 1 and report["created"] == 1
+
+
+def test_upsert_without_index_only_updates(monkeypatch, upsert):
+    report = run_target(monkeypatch, None, {"平安银行": "rec1"})
+    assert [op for op, _ in upsert] == ["update"]
+    assert "created" not in report
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import verify_update
+from delta_sync import TableSnapshot
+from update_all import BitableTarget
+from verify_update import compute_drift, load_rows, records_to_frame, verify_target
+
+FIELDS = ["Current Price", "Name"]
+
+
+def frame(rows):
+    return pd.DataFrame.from_dict(rows, orient="index", columns=FIELDS).astype(object)
+
+
+@pytest.fixture
+def expected():
+    return frame({
+        "rec1": {"Current Price": 10.0, "Name": "平安银行"},
+        "rec2": {"Current Price": 20.0, "Name": "万科A"},
+    })
+
+
+def drift_of(expected, actual, tolerances=None):
+    return {(m["record_id"], m["field"]): m for m in compute_drift(expected, actual, tolerances or {}, 1e-6)}
+
+
+def test_matching_values_report_nothing(expected):
+    actual = frame({
+        "rec1": {"Current Price": 10.0, "Name": "平安银行"},
+        "rec2": {"Current Price": "20", "Name": "万科A"},
+    })
+    assert compute_drift(expected, actual, {}, 1e-6) == []
+
+
+def test_numeric_drift_respects_tolerance(expected):
+    actual = frame({
+        "rec1": {"Current Price": 10.004, "Name": "平安银行"},
+        "rec2": {"Current Price": 20.5, "Name": "万科A"},
+    })
+    drift = drift_of(expected, actual, {"Current Price": 0.01})
+    assert list(drift) == [("rec2", "Current Price")]
+    assert drift[("rec2", "Current Price")]["drift"] == pytest.approx(0.5)
+
+
+def test_rich_text_cells_are_compared_as_plain_text(expected):
+    actual = frame({
+        "rec1": {"Current Price": 10.0, "Name": [{"type": "text", "text": "平安银行"}]},
+        "rec2": {"Current Price": 20.0, "Name": [{"type": "text", "text": "万科"}]},
+    })
+    drift = drift_of(expected, actual)
+    assert list(drift) == [("rec2", "Name")]
+    assert drift[("rec2", "Name")]["actual"] == [{"type": "text", "text": "万科"}]
+    assert drift[("rec2", "Name")]["drift"] is None
+
+
+def test_empty_or_missing_actual_counts_as_mismatch(expected):
+    actual = frame({"rec1": {"Current Price": None, "Name": "平安银行"}})
+    drift = drift_of(expected, actual)
+    assert set(drift) == {("rec1", "Current Price"), ("rec2", "Current Price"), ("rec2", "Name")}
+    assert drift[("rec1", "Current Price")]["actual"] is None
+
+
+def test_field_absent_from_table_is_reported(expected):
+    actual = frame({"rec1": {"Current Price": 10.0}, "rec2": {"Current Price": 20.0}})[["Current Price"]]
+    assert set(drift_of(expected, actual)) == {("rec1", "Name"), ("rec2", "Name")}
+
+
+def test_records_to_frame_indexes_by_record_id():
+    records = [SimpleNamespace(record_id="rec1", fields={"Current Price": 1.5, "Other": 1}, last_modified_time=123)]
+    df = records_to_frame(records, ["Current Price"])
+    assert list(df.columns) == ["Current Price", "last_modified_time"]
+    assert df.loc["rec1", "Current Price"] == 1.5
+
+
+def test_without_csv_rows_are_not_refetched():
+    assert load_rows(None) is None
+
+
+def test_verify_target_compares_against_written_snapshot(monkeypatch, tmp_path):
+    snapshot = TableSnapshot(str(tmp_path / "snapshot.json"))
+    snapshot.apply("app", "tbl", {"rec1": {"Current Price": 10.0}, "rec2": {"Current Price": 20.0}})
+    now_ms = 1e13
+    records = [
+        SimpleNamespace(record_id="rec1", fields={"Current Price": 10.0}, last_modified_time=now_ms),
+        SimpleNamespace(record_id="rec2", fields={"Current Price": 21.0}, last_modified_time=now_ms),
+    ]
+    requested = []
+
+    def fake_fetch(client, option, app_token, table_id, record_ids):
+        requested.append(sorted(record_ids))
+        return records, []
+
+    monkeypatch.setattr(verify_update, "fetch_table_records", fake_fetch)
+    report = verify_target(None, None, BitableTarget("app", "tbl", name="t"), snapshot=snapshot)
+    assert requested == [["rec1", "rec2"]]
+    assert [(m["record_id"], m["expected"], m["actual"]) for m in report["mismatches"]] == [("rec2", 20.0, 21.0)]
+    assert report["missing"] == [] and not report["ok"]
+
+
+def test_verify_target_without_snapshot_entry_fails(tmp_path):
+    snapshot = TableSnapshot(str(tmp_path / "snapshot.json"))
+    with pytest.raises(RuntimeError, match="--csv"):
+        verify_target(None, None, BitableTarget("app", "tbl"), snapshot=snapshot)
@@ -0,0 +1,68 @@
+import pytest
+
+import write_confirm
+from write_confirm import confirm_writes
+
+WRITTEN = {"rec1": {"价格": 10.0}, "rec2": {"价格": 20.0, "名称": "万科A"}}
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(write_confirm, "time", clock)
+
+
+class StubTable:
+    """按轮询次数返回预设的表格状态，None 表示读取失败"""
+
+    def __init__(self, monkeypatch, states):
+        self.states = list(states)
+        self.requested = []
+        monkeypatch.setattr(write_confirm, "fetch_remote_state", self.fetch)
+
+    def fetch(self, client, option, app_token, table_id, record_ids):
+        self.requested.append(list(record_ids))
+        return self.states.pop(0) if len(self.states) > 1 else self.states[0]
+
+
+def confirm(clock, **kwargs):
+    kwargs.setdefault("deadline", 10)
+    return confirm_writes(None, None, "app", "tbl", WRITTEN, started_at=clock.now, tolerances={}, **kwargs)
+
+
+def test_confirmed_on_first_poll(monkeypatch, clock):
+    StubTable(monkeypatch, [{"rec1": {"价格": 10.0}, "rec2": {"价格": 20.0, "名称": [{"text": "万科A"}]}}])
+    result = confirm(clock)
+    assert result.success
+    assert result.polls == 1
+    assert clock.sleeps == []
+    assert result.latencies == {"rec1": 0, "rec2": 0}
+
+
+def test_polls_with_exponential_backoff_until_visible(monkeypatch, clock):
+    stale = {"rec1": {"价格": 9.0}, "rec2": {"价格": 19.0, "名称": "万科A"}}
+    table = StubTable(monkeypatch, [stale, {"rec1": {"价格": 10.0}, "rec2": stale["rec2"]},
+                                    {"rec2": {"价格": 20.0, "名称": "万科A"}}])
+    result = confirm(clock, initial_delay=0.5, max_delay=4)
+    assert result.success
+    assert clock.sleeps == [0.5, 1.0]
+    # 已确认的记录不再重复读取
+    assert table.requested == [["rec1", "rec2"], ["rec1", "rec2"], ["rec2"]]
+    assert result.latencies == {"rec1": 0.5, "rec2": 1.5}
+    assert result.summary()["latency_max"] == 1.5
+
+
+def test_delay_is_capped_and_deadline_reports_unconfirmed(monkeypatch, clock):
+    StubTable(monkeypatch, [{"rec1": {"价格": 10.0}, "rec2": {"价格": 19.0}}])
+    result = confirm(clock, deadline=10, initial_delay=1, max_delay=4)
+    assert not result.success
+    assert clock.sleeps == [1, 2, 4, 3]
+    assert result.unconfirmed == {"rec2": WRITTEN["rec2"]}
+    assert result.summary()["confirmed"] == 1
+    assert result.elapsed == 10
+
+
+def test_failed_reads_are_retried(monkeypatch, clock):
+    StubTable(monkeypatch, [None, {"rec1": {"价格": 10.0}, "rec2": {"价格": 20.0, "名称": "万科A"}}])
+    result = confirm(clock, initial_delay=0.25)
+    assert result.success
+    assert result.polls == 2
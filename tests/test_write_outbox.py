@@ -0,0 +1,136 @@
+import uuid
+
+import pytest
+
+from write_outbox import (
+    OWNER_HISTORY,
+    OWNER_TABLE,
+    OutboxEntry,
+    STATUS_PENDING,
+    STATUS_SUPERSEDED,
+    WriteOutbox,
+    client_token,
+    idempotency_key,
+    latest_updates,
+)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return WriteOutbox(str(tmp_path / "outbox.sqlite3"))
+
+
+def test_enqueue_is_idempotent(outbox):
+    chunk = {"rec1": {"价格": 10.0}}
+    first = outbox.enqueue("app", "tbl", "update", [chunk])
+    second = outbox.enqueue("app", "tbl", "update", [chunk])
+    assert first == second
+    assert outbox.counts() == {STATUS_PENDING: 1}
+
+
+def test_client_token_is_a_stable_uuid4():
+    key = idempotency_key("app", "tbl", "create", {"000001": {"代码": "000001"}}, "2026-01-05")
+    token = client_token(key)
+    assert uuid.UUID(token).version == 4
+    assert str(uuid.UUID(token)) == token
+    assert client_token(key) == token != key
+
+
+def test_done_then_failed_resend_returns_to_pending(outbox):
+    keys = outbox.enqueue("app", "tbl", "create", [[{"代码": "000001"}]])
+    outbox.mark_done(keys)
+    assert outbox.pending() == []
+    # 同一批次再次发送：重新登记后发送失败，应保留待重放
+    outbox.enqueue("app", "tbl", "create", [[{"代码": "000001"}]])
+    outbox.mark_failed(keys[0], "timeout")
+    [entry] = outbox.pending()
+    assert (entry.key, entry.status, entry.last_error) == (keys[0], STATUS_PENDING, "timeout")
+
+
+def test_pending_skips_entries_over_max_attempts(outbox):
+    [key] = outbox.enqueue("app", "tbl", "create", [[{"代码": "000001"}]])
+    for _ in range(3):
+        outbox.mark_failed(key, "boom")
+    assert outbox.pending(max_attempts=3) == []
+    assert len(outbox.pending(max_attempts=4)) == 1
+
+
+def test_pending_since_keeps_entries_registered_later(outbox, monkeypatch):
+    import write_outbox
+
+    monkeypatch.setattr(write_outbox.time, "time", lambda: 100.0)
+    outbox.enqueue("app", "tbl", "create", [[{"代码": "000001"}]])
+    monkeypatch.setattr(write_outbox.time, "time", lambda: 200.0)
+    [new] = outbox.enqueue("app", "tbl", "create", [[{"代码": "000002"}]])
+    assert [e.key for e in outbox.pending(since=150.0)] == [new]
+    assert len(outbox.pending()) == 2
+
+
+def test_newer_update_supersedes_overlapping_cells(outbox):
+    [old] = outbox.enqueue("app", "tbl", "update", [{"rec1": {"价格": 10.0, "涨跌幅": 1.0}, "rec2": {"价格": 5.0}}])
+    outbox.enqueue("app", "tbl", "update", [{"rec1": {"价格": 11.0}}])
+    entries = {e.key: e for e in outbox.pending()}
+    assert entries[old].payload == {"rec1": {"涨跌幅": 1.0}, "rec2": {"价格": 5.0}}
+
+
+def test_fully_covered_update_is_superseded(outbox):
+    outbox.enqueue("app", "tbl", "update", [{"rec1": {"价格": 10.0}}])
+    [new] = outbox.enqueue("app", "tbl", "update", [{"rec1": {"价格": 11.0}}])
+    assert [e.key for e in outbox.pending()] == [new]
+    assert outbox.counts() == {STATUS_PENDING: 1, STATUS_SUPERSEDED: 1}
+
+
+def test_reenqueued_chunk_restores_pruned_payload(outbox):
+    first = {"rec1": {"价格": 10.0, "涨跌幅": 1.0}}
+    [key] = outbox.enqueue("app", "tbl", "update", [first])
+    outbox.enqueue("app", "tbl", "update", [{"rec1": {"价格": 11.0}}])
+    # 当天价格回到 10.0，同一分块再次登记
+    outbox.enqueue("app", "tbl", "update", [first])
+    [entry] = outbox.pending()
+    assert (entry.key, entry.payload) == (key, first)
+
+
+def test_supersede_is_scoped_to_table(outbox):
+    outbox.enqueue("app", "tbl_a", "update", [{"rec1": {"价格": 10.0}}])
+    outbox.enqueue("app", "tbl_b", "update", [{"rec1": {"价格": 11.0}}])
+    assert len(outbox.pending()) == 2
+
+
+def test_purge_removes_done_and_superseded(outbox):
+    [done] = outbox.enqueue("app", "tbl", "create", [[{"代码": "000001"}]])
+    outbox.mark_done([done])
+    [old] = outbox.enqueue("app", "tbl", "update", [{"rec1": {"价格": 10.0}}])
+    outbox.mark_superseded([old])
+    outbox.enqueue("app", "tbl", "update", [{"rec2": {"价格": 1.0}}])
+    assert outbox.purge(older_than_days=-1) == 2
+    assert outbox.counts() == {STATUS_PENDING: 1}
+
+
+def test_owner_is_stored_and_defaults_to_table(outbox):
+    outbox.enqueue("app", "tbl", "create", [[{"代码": "000001"}]])
+    outbox.enqueue("app", "hist", "create", [[{"代码": "000001", "日期": 1}]], owner=OWNER_HISTORY)
+    owners = {e.table_id: e.owner for e in outbox.pending()}
+    assert owners == {"tbl": OWNER_TABLE, "hist": OWNER_HISTORY}
+
+
+def update_entry(key, payload):
+    return OutboxEntry(key, "app", "tbl", "update", payload, STATUS_PENDING, 0, None)
+
+
+def test_latest_updates_keeps_newest_value_per_cell():
+    older = update_entry("older", {"rec1": {"价格": 10.0, "涨跌幅": 1.0}})
+    newer = update_entry("newer", {"rec1": {"价格": 11.0}})
+    kept, superseded = latest_updates([older, newer])
+    assert superseded == []
+    assert [(e.key, e.payload) for e in kept] == [
+        ("older", {"rec1": {"涨跌幅": 1.0}}),
+        ("newer", {"rec1": {"价格": 11.0}}),
+    ]
+
+
+def test_latest_updates_reports_fully_covered_entries():
+    older = update_entry("older", {"rec1": {"价格": 10.0}})
+    newer = update_entry("newer", {"rec1": {"价格": 11.0}, "rec2": {"价格": 3.0}})
+    kept, superseded = latest_updates([older, newer])
+    assert superseded == ["older"]
+    assert kept == [newer]